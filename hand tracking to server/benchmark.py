@@ -0,0 +1,210 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import socket
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import framing
+import recording
+from metrics import RollingHistogram
+from tracker import HandTracker, ENCODINGS
+
+# Repeatable end-to-end benchmark of the check.py pipeline.
+#
+# Every clip is run through HandTracker once per configuration (max hands x
+# model complexity x encoding x ROI mode) and the packets are sent to a local UDP sink,
+# exactly like check.py does. Results go to a JSON file; pass an earlier
+# results file as --baseline to compare against it.
+#
+# Clips are recording directories (recording.py record-frames), video files,
+# or "synthetic:WIDTHxHEIGHT:FRAMES" for a generated clip. Synthetic clips
+# contain no hands, so they only measure the palm-detection path; use
+# recorded clips for the landmark path.
+#
+#   python benchmark.py --clip synthetic:640x480:200 --clip recordings/two_hands \
+#       --max-hands 1 2 --model-complexity 0 1 --encoding float32 json \
+#       --output results.json --baseline baseline.json
+
+DEFAULT_CLIP = "synthetic:640x480:200"
+
+# Metrics compared against the baseline and whether higher is better
+COMPARED = {"fps": True, "cpu_ms_per_frame": False, "capture_to_send_p99_ms": False, "bytes_per_frame": False}
+
+
+# Function to load every frame of a clip into memory so disk and decode time stay out of the numbers
+def load_clip(spec):
+    if spec.startswith("synthetic:"):
+        _, size, count = spec.split(":")
+        width, height = (int(v) for v in size.split("x"))
+        rng = np.random.default_rng(0)
+        background = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+        frames = []
+        for i in range(int(count)):
+            frame = np.roll(background, i * 4, axis=1)
+            cv2.circle(frame, (width // 2, height // 2), 40 + i % 40, (200, 180, 160), -1)
+            frames.append(frame)
+        return frames
+
+    if recording.is_recording(spec):
+        source = recording.FrameReplay(spec, realtime=False)
+    else:
+        source = cv2.VideoCapture(spec)
+    frames = []
+    while True:
+        success, frame = source.read()
+        if not success:
+            break
+        frames.append(frame)
+    source.release()
+    if not frames:
+        raise ValueError(f"No frames in clip {spec}")
+    return frames
+
+
+# Function to run one clip through one tracker configuration
+def run_case(frames, config, sink_address, warmup):
+    tracker = HandTracker(config["encoding"], config["max_hands"], config["model_complexity"],
+                          roi=bool(config["roi"]))
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    cpu = RollingHistogram(len(frames))
+    latency = RollingHistogram(len(frames))
+    total_bytes = 0
+    measured = 0
+    hands_seen = 0
+
+    start = None
+    for i, img in enumerate(frames):
+        if i == warmup:
+            start = time.perf_counter()
+        cpu_start = time.process_time()
+        capture_ns = time.monotonic_ns()
+
+        frame = tracker.process(img, capture_ns, capture_ns)
+        framing.send_frame(sock, frame['data'], sink_address, frame['sequence'])
+        sent_ns = time.monotonic_ns()
+
+        if i >= warmup:
+            measured += 1
+            cpu.add(time.process_time() - cpu_start)
+            latency.add((sent_ns - capture_ns) / 1e9)
+            total_bytes += len(frame['data'])
+            hands_seen += len(frame['results'].multi_hand_landmarks or [])
+    elapsed = time.perf_counter() - start if start is not None else 0
+
+    tracker.close()
+    sock.close()
+
+    roi_stats = tracker.roi_stats()
+    cpu_summary = cpu.summary()
+    latency_summary = latency.summary()
+    return {
+        "frames": measured,
+        "fps": round(measured / elapsed, 2) if elapsed else None,
+        "cpu_ms_per_frame": round(sum(cpu.samples) / measured * 1000, 3) if measured else None,
+        "cpu_p99_ms": cpu_summary.get("p99_ms"),
+        "capture_to_send_p50_ms": latency_summary.get("p50_ms"),
+        "capture_to_send_p99_ms": latency_summary.get("p99_ms"),
+        "bytes_per_frame": round(total_bytes / measured, 1) if measured else None,
+        "hands_per_frame": round(hands_seen / measured, 2) if measured else None,
+        "roi_hits": roi_stats["hits"],
+        "roi_misses": roi_stats["misses"],
+    }
+
+
+def case_key(result):
+    # Results from before the ROI mode existed were all full-frame runs
+    return (result["clip"], result["max_hands"], result["model_complexity"], result["encoding"],
+            result.get("roi", 0))
+
+
+# Function to print each case next to its baseline; returns the number of regressions
+def compare(results, baseline, tolerance):
+    previous = {case_key(result): result for result in baseline["results"]}
+    regressions = 0
+    for result in results:
+        old = previous.get(case_key(result))
+        if old is None:
+            print(f"{case_key(result)}: not in baseline")
+            continue
+        parts = []
+        for metric, higher_is_better in COMPARED.items():
+            new_value, old_value = result.get(metric), old.get(metric)
+            if not new_value or not old_value:
+                continue
+            change = (new_value - old_value) / old_value
+            worse = change < -tolerance if higher_is_better else change > tolerance
+            regressions += worse
+            parts.append(f"{metric} {old_value} -> {new_value} ({change:+.1%}){' REGRESSION' if worse else ''}")
+        print(f"{case_key(result)}: " + ", ".join(parts))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clip", action="append", help=f"clip to run, repeatable (default {DEFAULT_CLIP})")
+    parser.add_argument("--max-hands", type=int, nargs="+", default=[2])
+    parser.add_argument("--model-complexity", type=int, nargs="+", choices=[0, 1], default=[1])
+    parser.add_argument("--encoding", nargs="+", choices=ENCODINGS, default=["float32"])
+    parser.add_argument("--roi", type=int, nargs="+", choices=[0, 1], default=[0],
+                        help="1 to crop inference around the previous hands")
+    parser.add_argument("--warmup", type=int, default=10, help="frames per case excluded from the numbers")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    # Packets go to a socket we own so sendto behaves like it does with a live bridge
+    sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sink.bind(("127.0.0.1", 0))
+    sink.setblocking(False)
+    sink_address = sink.getsockname()
+
+    results = []
+    for clip in args.clip or [DEFAULT_CLIP]:
+        frames = load_clip(clip)
+        for max_hands, complexity, encoding, roi in itertools.product(args.max_hands, args.model_complexity,
+                                                                       args.encoding, args.roi):
+            config = {"max_hands": max_hands, "model_complexity": complexity, "encoding": encoding, "roi": roi}
+            result = {"clip": clip, **config, **run_case(frames, config, sink_address, args.warmup)}
+            results.append(result)
+            print(json.dumps(result))
+
+            # Empty the sink between cases
+            try:
+                while True:
+                    sink.recv(65535)
+            except BlockingIOError:
+                pass
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=4)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{regressions} regression(s) beyond {args.tolerance:.0%}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,992 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from collections import deque
+from itertools import islice
+from urllib.parse import urlsplit, parse_qs, quote, unquote
+
+import delta
+import fanout
+import framing
+import protocol
+import shared_ring
+from metrics import LatencyMetrics, RateLimitedLog
+
+# asyncio UDP -> HTTP bridge.
+#
+# Frames from the tracker arrive through a DatagramProtocol, are decoded once
+# and pushed to every subscriber of GET /stream (Server-Sent Events) as soon
+# as they arrive. GET /received-data still returns the latest frame for
+# clients that poll, and GET /frames?since=<seq> returns every frame newer
+# than a cursor from a bounded history so slow pollers can catch up.
+#
+# Each frame is JSON-encoded exactly once when it arrives; every HTTP
+# response and SSE event reuses those bytes, and /received-data answers
+# If-None-Match with 304 using an ETag built from the frame's sequence number.
+#
+# GET /metrics reports rolling p50/p95/p99 latencies for every stage, from the
+# tracker's own stage timings carried in each packet through network, decode
+# and HTTP serve. Timestamps are time.monotonic_ns(), so the cross-process
+# numbers (network, capture_to_*) are only meaningful on the same host.
+#
+# Delta-encoded frames (tracker --encoding delta, see delta.py) are rebuilt
+# by one DeltaDecoder per sender address and served like any other frame.
+#
+# With --multicast the bridge takes the landmark frames from a tracker's
+# multicast group (check.py --multicast) instead of its own UDP port, so
+# several bridges and other readers can share one tracker (see fanout.py).
+#
+# The frame socket is read in batches: every time it becomes readable, all
+# pending datagrams (up to MAX_BATCH) are drained with non-blocking reads and
+# handled together. With --latest-only only the newest complete frame of each
+# sender in a batch is decoded and published (delta keyframes are still
+# decoded), so a bridge that falls behind catches up instead of working
+# through a backlog. The receive buffer is sized explicitly (--rcvbuf), and
+# GET /stats reports the datagrams the kernel dropped because that buffer was
+# full (Linux) and the gaps in each sender's frame sequence. Problems are
+# logged as rate-limited JSON lines instead of being printed per frame.
+#
+# Gesture events (start / end / hold, see gestures.GestureEventStream) arrive
+# as small JSON datagrams on their own port and go into a second hub, served
+# as GET /events?since=<seq>, GET /events/stream and GET /gestures (the latest
+# event message, whose "active" list is the current gesture state).
+# The same port carries the tracker's operating point (governor.py), which
+# is reported under "tracker" in GET /stats instead of going into the hub.
+#
+# With --shm the bridge also reads landmark frames from the tracker's
+# shared-memory ring (check.py --shm), for trackers on the same host. Ring
+# records carry no station or camera, so --shm-station / --shm-camera say
+# which streams they go to (the top-level ones by default).
+#
+# Frames and events tagged with a camera id (host.py runs one tracker per
+# camera) get their own streams, history and metrics, served under
+# /cameras/<id>/ with the same endpoint names (received-data, frames,
+# stream, events, events/stream, gestures, stats, metrics); GET /cameras
+# lists them. Untagged frames, and those from --default-camera, are served
+# by the top-level endpoints as before.
+#
+# Frames and events tagged with a station id (check.py --station, host.py
+# "station"), so one bridge can serve several stations, are kept apart the
+# same way: /stations/<station>/<endpoint> for the station's untagged camera
+# and /stations/<station>/cameras/<id>/<endpoint> for its tagged ones. GET
+# /stations lists every station with the path prefix of each of its streams,
+# and /stations/<station>/cameras its cameras. Streams are found with one
+# dict lookup on (station, camera) per datagram and per request, however
+# many there are. A station's packets also carry the session number of its
+# tracker, so a restarted tracker is counted ("restarts") while its stream,
+# history and sequence cursors carry on.
+
+UDP_ADDRESS = ("127.0.0.1", 5052)
+EVENT_ADDRESS = ("127.0.0.1", 5053)
+HTTP_ADDRESS = ("127.0.0.1", 5000)
+
+# What to do with a subscriber whose queue is full
+POLICY_DROP_OLDEST = "drop_oldest"  # Skip stale frames, keep the newest ones
+POLICY_DISCONNECT = "disconnect"  # Close the stream, the client can reconnect
+POLICIES = (POLICY_DROP_OLDEST, POLICY_DISCONNECT)
+
+# Frames kept for GET /frames and SSE resume
+HISTORY_SIZE = 256
+
+# How often the shared-memory ring is checked for new frames, and for a tracker to appear
+SHM_POLL = 0.002
+SHM_RETRY = 1.0
+
+# Streams (station and camera pairs) kept at most, so stray packets cannot grow the bridge without bound
+MAX_STREAMS = 256
+# Senders whose delta-encoding and sequence state is kept; the one heard from least recently is forgotten first
+MAX_SENDERS = 256
+
+# Datagrams read from the socket per wakeup at most, so other clients still get a turn
+MAX_BATCH = 256
+# Requested receive buffer; Linux caps it at net.core.rmem_max
+RCVBUF = 4 * 1024 * 1024
+# Linux socket option that reports the datagrams dropped on a full receive buffer
+SO_RXQ_OVFL = 40 if sys.platform.startswith("linux") else None
+# Seconds between the receive counter lines in the log
+STATS_LOG_INTERVAL = 30.0
+
+# Longest a GET /frames?wait= long-poll may block
+MAX_LONG_POLL = 30.0
+
+# Comment line sent on idle streams so dead connections are noticed
+SSE_KEEPALIVE = b": keep-alive\n\n"
+SSE_KEEPALIVE_INTERVAL = 15.0
+
+log = RateLimitedLog("bridge")
+
+STATUS_TEXT = {200: "OK", 204: "No Content", 304: "Not Modified", 400: "Bad Request",
+               404: "Not Found", 405: "Method Not Allowed"}
+
+
+# Function to turn one reassembled frame into the JSON message served to consumers.
+# Returns (message, packet); packet is None for legacy JSON frames.
+def decode_frame(data):
+    if protocol.is_binary_packet(data):
+        packet = protocol.decode_packet(data)
+        return protocol.packet_to_message(packet), packet
+    return json.loads(data.decode()), None
+
+
+def sse_event(seq, body):
+    return b"id: " + str(seq).encode() + b"\ndata: " + body + b"\n\n"
+
+
+# Named event telling a resuming client how many frames it will not get; it has no id,
+# so the client's Last-Event-ID stays at the last frame it really received
+def sse_gap(missed):
+    return b'event: gap\ndata: {"missed": %d}\n\n' % missed
+
+
+# One connected push client with its own bounded queue
+class Subscriber:
+    def __init__(self, policy=POLICY_DROP_OLDEST, max_queue=8):
+        self.policy = policy
+        self.max_queue = max_queue
+        self.queue = deque()
+        self.event = asyncio.Event()
+        self.closed = False
+        self.sent = 0
+        self.dropped = 0
+
+    def push(self, item):
+        if self.closed:
+            return
+        if len(self.queue) >= self.max_queue:
+            if self.policy == POLICY_DISCONNECT:
+                self.close()
+                return
+            self.queue.popleft()
+            self.dropped += 1
+        self.queue.append(item)
+        self.event.set()
+
+    # Wait for the next queued item; returns None once the subscriber is closed
+    async def get(self):
+        while not self.queue:
+            if self.closed:
+                return None
+            self.event.clear()
+            await self.event.wait()
+        return self.queue.popleft()
+
+    def close(self):
+        self.closed = True
+        self.event.set()
+
+
+# Bounded ring buffer of (seq, encoded JSON body) with consecutive sequence numbers
+class FrameHistory:
+    def __init__(self, size=HISTORY_SIZE):
+        self.frames = deque(maxlen=size)
+
+    def append(self, seq, body):
+        self.frames.append((seq, body))
+
+    def oldest_seq(self):
+        return self.frames[0][0] if self.frames else None
+
+    # Frames after since that have already left the history
+    def missed(self, since):
+        oldest = self.oldest_seq()
+        return max(0, oldest - since - 1) if oldest is not None else 0
+
+    # Every frame with seq > since, oldest first
+    def since(self, since):
+        if not self.frames:
+            return []
+        start = max(0, since + 1 - self.frames[0][0])
+        return list(islice(self.frames, start, None))
+
+
+# Holds the latest frame and fans every new frame out to the subscribers
+class FrameHub:
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.latest_data = None
+        self.latest_body = None  # latest_data encoded once as JSON bytes
+        self.latest_etag = None
+        self.latest_seq = 0  # Bridge-side sequence number, 0 means nothing received yet
+        # Makes ETags from a restarted bridge differ from the ones clients still hold
+        self.instance = os.urandom(4).hex()
+        self.history = FrameHistory(history_size)
+        self.frame_event = asyncio.Event()  # Replaced after every frame to wake long-polls
+        self.frames_received = 0
+        self.subscribers = set()
+        self.metrics = LatencyMetrics()
+        self.latest_capture_ns = None  # Tracker capture time of the latest frame, if it sent one
+
+    def publish(self, message, capture_ns=None):
+        self.latest_seq += 1
+        self.latest_capture_ns = capture_ns
+        self.latest_data = message
+        self.latest_body = json.dumps(message).encode()
+        self.latest_etag = f'"{self.instance}-{self.latest_seq}"'
+        self.history.append(self.latest_seq, self.latest_body)
+        self.frames_received += 1
+
+        self.frame_event.set()
+        self.frame_event = asyncio.Event()
+
+        if not self.subscribers:
+            return
+
+        event = sse_event(self.latest_seq, self.latest_body)
+        for subscriber in self.subscribers:
+            subscriber.push(event)
+
+    # Wait until a frame newer than seq arrives or timeout seconds pass
+    async def wait_for_frame(self, seq, timeout):
+        while self.latest_seq <= seq:
+            try:
+                await asyncio.wait_for(self.frame_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return False
+        return True
+
+    # Batch response for GET /frames: everything after the cursor plus how much was lost.
+    # Built by joining the already-encoded frame bodies instead of re-encoding them.
+    def frames_since(self, since):
+        frames = self.history.since(since)
+        missed = self.history.missed(since)
+        items = b",".join(b'{"seq": %d, "data": %s}' % (seq, body) for seq, body in frames)
+        return b'{"latest_seq": %d, "missed": %d, "frames": [%s]}' % (self.latest_seq, missed, items)
+
+    def subscribe(self, policy=POLICY_DROP_OLDEST, max_queue=8):
+        subscriber = Subscriber(policy, max_queue)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscriber.close()
+        self.subscribers.discard(subscriber)
+
+
+# Everything served for one camera (of one station): its frames, its gesture
+# events and the operating point its tracker last reported
+class CameraStreams:
+    def __init__(self, camera, history_size=HISTORY_SIZE, station=None):
+        self.station = station
+        self.camera = camera
+        self.frames = FrameHub(history_size)
+        self.events = FrameHub(history_size)
+        self.operating_point = None
+        self.session = None  # Session number of the station's tracker, once one was seen
+        self.restarts = 0  # Times the session number changed
+
+    # Path the endpoints of these streams are served under ("" for the top-level ones)
+    @property
+    def prefix(self):
+        prefix = f"/stations/{quote(self.station, safe='')}" if self.station is not None else ""
+        if self.camera is not None:
+            prefix += f"/cameras/{quote(self.camera, safe='')}"
+        return prefix
+
+    def summary(self):
+        return {
+            "frames_received": self.frames.frames_received,
+            "latest_seq": self.frames.latest_seq,
+            "subscribers": len(self.frames.subscribers),
+            "events_received": self.events.frames_received,
+            "session": self.session,
+            "restarts": self.restarts,
+        }
+
+
+# CameraStreams by (station, camera), looked up once per datagram
+class StreamRegistry:
+    def __init__(self, history_size=HISTORY_SIZE, default_camera=None):
+        self.history_size = history_size
+        self.default = CameraStreams(default_camera, history_size)
+        self.streams = {(None, None): self.default}
+        self.stations = {None: {}}  # station -> {camera: CameraStreams}, for the listings
+        if default_camera is not None:
+            self.streams[(None, default_camera)] = self.default  # Same streams under both paths
+            self.stations[None][default_camera] = self.default
+        self.rejected = 0  # Frames from streams beyond MAX_STREAMS
+
+    # Existing streams for a station and camera, or None
+    def lookup(self, station, camera):
+        return self.streams.get((station, camera))
+
+    # Streams for a station and camera, created on their first frame; None when there are too many.
+    # session is the tracker's session number from the packet, when it carried one.
+    def get(self, station, camera, session=None):
+        streams = self.streams.get((station, camera))
+        if streams is None:
+            if len(self.streams) >= MAX_STREAMS:
+                self.rejected += 1
+                return None
+            streams = self.streams[(station, camera)] = CameraStreams(camera, self.history_size, station)
+            self.stations.setdefault(station, {})[camera] = streams
+            log.info("new_stream", key=f"new_stream:{streams.prefix}", station=station, camera=camera)
+        if session is not None and session != streams.session:
+            if streams.session is not None:
+                streams.restarts += 1
+                log.info("session_changed", station=station, camera=camera, session=session,
+                         restarts=streams.restarts)
+            streams.session = session
+        return streams
+
+
+# Function to read the (station, camera) a message was tagged with (JSON frames and events carry them as keys)
+def message_key(message):
+    if not isinstance(message, dict):
+        return None, None
+    station, camera = message.get('station'), message.get('camera')
+    return (station if isinstance(station, str) else None), (camera if isinstance(camera, str) else None)
+
+
+# Function to read (sequence, hand_count) from a binary or delta frame without decoding it; None for JSON
+def frame_header(data):
+    if protocol.is_binary_packet(data) and len(data) >= protocol.HEADER.size:
+        _, _, _, hand_count, sequence, _ = protocol.HEADER.unpack_from(data)
+        return sequence, hand_count
+    if delta.is_delta_packet(data) and len(data) >= delta.DELTA_HEADER.size:
+        _, _, _, hand_count, sequence, _, _ = delta.DELTA_HEADER.unpack_from(data)
+        return sequence, hand_count
+    return None
+
+
+# Function to look up a sender's entry in a bounded per-sender table, moving it to the back
+def sender_entry(table, addr, create):
+    entry = table.pop(addr, None)
+    if entry is None:
+        entry = create()
+        if len(table) >= MAX_SENDERS:
+            del table[next(iter(table))]  # Forget the sender heard from least recently
+    table[addr] = entry
+    return entry
+
+
+# Reassembles, decodes and publishes the frames from the tracker.
+# Datagrams come in batches from UdpReceiver (or one at a time through
+# datagram_received where the event loop cannot watch the socket itself).
+class BridgeProtocol(asyncio.DatagramProtocol):
+    def __init__(self, registry, latest_only=False):
+        self.registry = registry
+        self.latest_only = latest_only
+        self.reassembler = framing.Reassembler()
+        self.decode_errors = 0
+        self.delta_decoders = {}  # addr -> delta.DeltaDecoder, least recently heard from first
+
+        self.last_sequence = {}  # addr -> [sequence, had hands] of the sender's last frame
+        self.sequence_gaps = 0  # Frames missing from a sender's sequence
+        self.frames_skipped = 0  # Older frames of a batch not decoded in latest-only mode
+
+    # Function to decode a delta packet with its sender's decoder; (None, None) while its keyframe is missing
+    def decode_delta(self, data, addr):
+        packet = sender_entry(self.delta_decoders, addr, delta.DeltaDecoder).decode(data)
+        if packet is None:
+            return None, None
+        return protocol.packet_to_message(packet), packet
+
+    def delta_stats(self):
+        totals = {'senders': len(self.delta_decoders), 'keyframes': 0, 'deltas': 0, 'dropped': 0}
+        for decoder in self.delta_decoders.values():
+            for key, value in decoder.stats().items():
+                totals[key] += value
+        return totals
+
+    # Count the frames missing between this one and the sender's previous one. The tracker
+    # holds back repeated empty frames, so only a gap after a frame with hands is a real loss.
+    def count_gap(self, data, addr):
+        header = frame_header(data)
+        if header is None:
+            return
+        sequence, hand_count = header
+        last = sender_entry(self.last_sequence, addr, lambda: None)
+        if last is not None:
+            last_sequence, had_hands = last
+            gap = (sequence - last_sequence - 1) & 0xFFFFFFFF
+            if had_hands and 0 < gap < 0x80000000:  # Larger means reordered or a restarted tracker
+                self.sequence_gaps += gap
+                log.warning("sequence_gap", sender=f"{addr[0]}:{addr[1]}", frames=gap,
+                            total=self.sequence_gaps)
+        self.last_sequence[addr] = (sequence, hand_count > 0)
+
+    def datagram_received(self, data, addr):
+        self.batch_received([(data, addr)], time.monotonic_ns())
+
+    # Handle every datagram read in one wakeup
+    def batch_received(self, batch, received_ns):
+        frames = []
+        for data, addr in batch:
+            data = self.reassembler.add(data, addr)
+            if data is not None:  # None while waiting for the rest of a chunked frame
+                self.count_gap(data, addr)
+                frames.append((data, addr))
+
+        if self.latest_only and len(frames) > 1:
+            newest = {addr: index for index, (_, addr) in enumerate(frames)}
+            for index, (data, addr) in enumerate(frames):
+                if newest[addr] == index:
+                    continue
+                self.frames_skipped += 1
+                if delta.is_keyframe(data):
+                    self.decode(data, addr)  # Later deltas of this sender refer to it
+            frames = [frames[index] for index in sorted(newest.values())]
+
+        for data, addr in frames:
+            self.frame_received(data, addr, received_ns)
+
+    # Function to decode one complete frame; (message, packet), both None when it cannot be used
+    def decode(self, data, addr):
+        try:
+            if delta.is_delta_packet(data):
+                return self.decode_delta(data, addr)  # (None, None) until the sender's next keyframe
+            return decode_frame(data)
+        except (protocol.ProtocolError, ValueError) as e:
+            self.decode_errors += 1
+            log.warning("decode_error", sender=f"{addr[0]}:{addr[1]}", error=str(e), total=self.decode_errors)
+            return None, None
+
+    def frame_received(self, data, addr, received_ns):
+        message, packet = self.decode(data, addr)
+        if message is None:
+            return
+        decoded_ns = time.monotonic_ns()
+
+        if packet is not None:
+            streams = self.registry.get(packet.get('station'), packet['camera'], packet.get('session'))
+        else:
+            streams = self.registry.get(*message_key(message))
+        if streams is None:
+            return
+        hub = streams.frames
+
+        capture_ns = packet['capture_ns'] if packet is not None else None
+        hub.publish(message, capture_ns)
+        published_ns = time.monotonic_ns()
+
+        metrics = hub.metrics
+        metrics.record_ns('decode', received_ns, decoded_ns)
+        metrics.record_ns('publish', decoded_ns, published_ns)
+        if packet is not None and packet['timings'] is not None:
+            for stage, seconds in packet['timings'].items():
+                metrics.record(stage, seconds)
+            metrics.record_ns('network', packet['send_ns'], received_ns)
+            metrics.record_ns('capture_to_receive', packet['capture_ns'], received_ns)
+
+
+# Function to ask for a receive buffer of rcvbuf bytes; returns the size the kernel granted
+def set_receive_buffer(sock, rcvbuf):
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+    granted = sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+    if sys.platform.startswith("linux"):
+        granted //= 2  # Linux doubles the value for its bookkeeping and reports that
+    if granted < rcvbuf:
+        log.warning("receive_buffer_capped", requested=rcvbuf, granted=granted,
+                    hint="raise net.core.rmem_max to allow more")
+    else:
+        log.info("receive_buffer", requested=rcvbuf, granted=granted)
+    return granted
+
+
+# Drains the frame socket: on every wakeup all pending datagrams (up to max_batch)
+# are read with non-blocking calls and passed to the protocol as one batch
+class UdpReceiver:
+    def __init__(self, sock, bridge_protocol, max_batch=MAX_BATCH):
+        self.sock = sock
+        self.sock.setblocking(False)
+        self.bridge_protocol = bridge_protocol
+        self.max_batch = max_batch
+        self.loop = None
+
+        # Linux attaches the socket's drop counter to received datagrams when asked to
+        self.kernel_drops = None
+        self.ancillary_size = 0
+        if SO_RXQ_OVFL is not None and hasattr(sock, "recvmsg"):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+                self.kernel_drops = 0
+                self.ancillary_size = socket.CMSG_SPACE(4)
+            except OSError:
+                pass
+
+        self.datagrams = 0
+        self.batches = 0
+        self.largest_batch = 0
+        self.receive_errors = 0
+
+    # Watch the socket from the event loop; raises NotImplementedError where that is not supported
+    def start(self, loop):
+        loop.add_reader(self.sock.fileno(), self.drain)
+        self.loop = loop
+
+    def drain(self):
+        received_ns = time.monotonic_ns()
+        batch = []
+        while len(batch) < self.max_batch:
+            try:
+                if self.ancillary_size:
+                    data, ancdata, _, addr = self.sock.recvmsg(65535, self.ancillary_size)
+                    for level, kind, value in ancdata:
+                        if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(value) >= 4:
+                            self.kernel_drops = max(self.kernel_drops, int.from_bytes(value[:4], sys.byteorder))
+                else:
+                    data, addr = self.sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                self.receive_errors += 1
+                log.warning("receive_error", error=str(e), total=self.receive_errors)
+                break
+            batch.append((data, addr))
+
+        if batch:
+            self.datagrams += len(batch)
+            self.batches += 1
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.bridge_protocol.batch_received(batch, received_ns)
+
+    def stats(self):
+        return {
+            'datagrams': self.datagrams,
+            'batches': self.batches,
+            'largest_batch': self.largest_batch,
+            'kernel_drops': self.kernel_drops,  # None where the platform does not report them
+            'receive_errors': self.receive_errors,
+        }
+
+    def close(self):
+        if self.loop is not None:
+            self.loop.remove_reader(self.sock.fileno())
+        self.sock.close()
+
+
+# Receives gesture event messages and tracker status from the tracker (one JSON object per datagram)
+class EventProtocol(asyncio.DatagramProtocol):
+    def __init__(self, registry):
+        self.registry = registry
+        self.decode_errors = 0
+
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data.decode())
+        except ValueError as e:
+            self.decode_errors += 1
+            log.warning("event_decode_error", sender=f"{addr[0]}:{addr[1]}", error=str(e),
+                        total=self.decode_errors)
+            return
+
+        streams = self.registry.get(*message_key(message))
+        if streams is None:
+            return
+        if isinstance(message, dict) and message.get('type') == 'operating_point':
+            streams.operating_point = message
+            return
+        streams.events.publish(message)
+
+
+# Publishes the frames a same-host tracker writes to its shared-memory ring.
+# Reattaches when the tracker restarts, since a new tracker creates a new segment;
+# a tracker that crashed never marks its ring closed, so a dead writer pid counts as closed too.
+class RingPump:
+    def __init__(self, name, hub):
+        self.name = name
+        self.hub = hub
+        self.reader = None
+
+    async def run(self):
+        while True:
+            if self.reader is None or self.reader.writer_closed:
+                if self.reader is not None:
+                    self.reader.close()
+                    self.reader = None
+                try:
+                    self.reader = shared_ring.RingReader(self.name)
+                except (FileNotFoundError, protocol.ProtocolError):
+                    await asyncio.sleep(SHM_RETRY)
+                    continue
+                if self.reader.writer_closed:
+                    # Left behind by a tracker that crashed; the next one replaces it
+                    self.reader.close()
+                    self.reader = None
+                    await asyncio.sleep(SHM_RETRY)
+                    continue
+                log.info("shm_attached", name=self.name)
+
+            for frame in self.reader.read_new():
+                received_ns = time.monotonic_ns()
+                self.hub.publish(protocol.packet_to_message(frame), frame['capture_ns'])
+                self.hub.metrics.record_ns('publish', received_ns, time.monotonic_ns())
+                self.hub.metrics.record_ns('capture_to_receive', frame['capture_ns'], received_ns)
+            await asyncio.sleep(SHM_POLL)
+
+    def stats(self):
+        if self.reader is None:
+            return {'attached': False}
+        return {'attached': True, **self.reader.stats()}
+
+
+# Minimal HTTP/1.1 server on asyncio streams, so pushing a frame to a client
+# is a single write on an open connection instead of a new poll request
+class HttpHandler:
+    def __init__(self, registry, udp_protocol, event_protocol, ring_pump=None, receiver=None):
+        self.registry = registry
+        self.udp_protocol = udp_protocol
+        self.event_protocol = event_protocol
+        self.ring_pump = ring_pump
+        self.receiver = receiver
+
+    async def handle(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        try:
+            while True:
+                request = await self.read_request(reader, writer)
+                if request is None:
+                    break
+                method, target, headers = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                url = urlsplit(target)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                station, camera, endpoint = self.resolve(url.path)
+                streams = self.registry.lookup(station, camera)
+
+                if method != "GET":
+                    await self.send_json(writer, 405, {"message": "Only GET is supported"}, keep_alive)
+                elif endpoint in ("/stations", "/cameras") and camera is None:
+                    status, body = self.listing(station, endpoint)
+                    await self.send_json(writer, status, body, keep_alive)
+                elif streams is None:
+                    await self.send_json(writer, 404, {"message": f"Unknown station or camera in {url.path}"},
+                                         keep_alive)
+                elif endpoint in ("/stream", "/events/stream"):
+                    hub = streams.frames if endpoint == "/stream" else streams.events
+                    await self.stream(hub, writer, query, headers)
+                    break
+                else:
+                    start_ns = time.monotonic_ns()
+                    status, body, extra_headers = await self.route(streams, endpoint, query, headers)
+                    await self.send_json(writer, status, body, keep_alive, extra_headers)
+                    if endpoint == "/received-data" and status in (200, 304):
+                        self.record_serve(streams.frames, start_ns)
+
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    # Returns (method, target, headers), or None when the connection should be closed.
+    # A malformed request (bad request line or Content-Length, a line longer than the
+    # stream limit) is answered with 400 first.
+    async def read_request(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            if not request_line:
+                return None
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+
+            # Discard any request body, none of the endpoints use one
+            length = int(headers.get("content-length", 0) or 0)
+            if length < 0:
+                raise ValueError(f"Negative Content-Length {length}")
+            if length:
+                await reader.readexactly(length)
+        except (ValueError, asyncio.LimitOverrunError):
+            await self.send_json(writer, 400, {"message": "Malformed request"}, False)
+            return None
+        return method, target, headers
+
+    # Function to split [/stations/<station>][/cameras/<id>]/<endpoint> into (station, camera, endpoint).
+    # Paths without those prefixes belong to the default streams (None, None).
+    def resolve(self, path):
+        station = None
+        camera = None
+        if path.startswith("/stations/"):
+            name, _, rest = path[len("/stations/"):].partition("/")
+            station, path = unquote(name), "/" + rest
+        if path.startswith("/cameras/"):
+            name, _, rest = path[len("/cameras/"):].partition("/")
+            camera, path = unquote(name), "/" + rest
+        return station, camera, path
+
+    # Function returning (status, body) for GET /stations (every station) and
+    # GET [/stations/<station>]/cameras (the cameras of one station)
+    def listing(self, station, endpoint):
+        if endpoint == "/stations":
+            return 200, {name: {streams.prefix: streams.summary() for streams in cameras.values()}
+                         for name, cameras in self.registry.stations.items() if name is not None}
+        cameras = self.registry.stations.get(station)
+        if cameras is None:
+            return 404, {"message": f"Unknown station {station}"}
+        return 200, {camera: streams.summary() for camera, streams in cameras.items() if camera is not None}
+
+    # Function returning (status, body, headers) for the plain GET endpoints.
+    # body is either a JSON-serialisable object or already-encoded JSON bytes.
+    async def route(self, streams, path, query, headers):
+        if path == "/received-data":
+            return self.received_data(streams.frames, headers)
+        if path == "/frames":
+            return await self.frames(streams.frames, query)
+        if path == "/gestures":
+            return self.received_data(streams.events, headers)
+        if path == "/events":
+            return await self.frames(streams.events, query)
+        if path == "/stats":
+            return 200, self.stats(streams), None
+        if path == "/metrics":
+            return 200, {"stages": streams.frames.metrics.summary(), "counters": self.stats(streams)}, None
+        return 404, {"message": f"Unknown endpoint {path}"}, None
+
+    def stats(self, streams):
+        return {
+            "station": streams.station,
+            "camera": streams.camera,
+            "session": streams.session,
+            "restarts": streams.restarts,
+            "frames_received": streams.frames.frames_received,
+            "subscribers": len(streams.frames.subscribers),
+            "events": {
+                "received": streams.events.frames_received,
+                "subscribers": len(streams.events.subscribers),
+            },
+            "tracker": streams.operating_point,
+            # Shared by every station and camera
+            "decode_errors": self.udp_protocol.decode_errors,
+            "event_decode_errors": self.event_protocol.decode_errors,
+            "reassembly": self.udp_protocol.reassembler.stats(),
+            "delta": self.udp_protocol.delta_stats(),
+            "receiver": {
+                **(self.receiver.stats() if self.receiver is not None else {}),
+                "sequence_gaps": self.udp_protocol.sequence_gaps,
+                "frames_skipped": self.udp_protocol.frames_skipped,
+            },
+            "shm": self.ring_pump.stats() if self.ring_pump is not None else None,
+            "streams": len(self.registry.streams),
+            "stations": len(self.registry.stations) - 1,  # Without the untagged None entry
+            "streams_rejected": self.registry.rejected,
+        }
+
+    def record_serve(self, hub, start_ns):
+        served_ns = time.monotonic_ns()
+        hub.metrics.record_ns('serve', start_ns, served_ns)
+        if hub.latest_capture_ns is not None:
+            hub.metrics.record_ns('capture_to_serve', hub.latest_capture_ns, served_ns)
+
+    # GET /received-data (and /gestures for the events hub): the cached bytes of the
+    # latest message, or 304 if the client already has it
+    def received_data(self, hub, headers):
+        if not hub.latest_data:
+            return 404, {"message": "No data received yet"}, None
+
+        etag = hub.latest_etag
+        cache_headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or
+                              etag in (tag.strip() for tag in if_none_match.split(","))):
+            return 304, b"", cache_headers
+        return 200, hub.latest_body, cache_headers
+
+    # GET /frames?since=<seq>[&wait=<seconds>] (and /events for the events hub)
+    # Returns every buffered frame after the cursor in one response. With wait,
+    # the request blocks until a newer frame arrives (long-poll) or the wait runs out.
+    async def frames(self, hub, query):
+        try:
+            since = int(query.get("since", 0))
+            wait = min(float(query.get("wait", 0)), MAX_LONG_POLL)
+        except ValueError:
+            return 400, {"message": "since must be an integer and wait a number"}, None
+
+        if wait > 0:
+            await hub.wait_for_frame(since, wait)
+        return 200, hub.frames_since(since), None
+
+    async def send_json(self, writer, status, body, keep_alive=True, headers=None):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode()
+        await self.send(writer, status, body, "application/json", keep_alive, headers)
+
+    async def send(self, writer, status, body, content_type, keep_alive=True, headers=None):
+        head = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}",
+                f"Content-Type: {content_type}",
+                f"Content-Length: {len(body)}",
+                "Access-Control-Allow-Origin: *",
+                "Connection: keep-alive" if keep_alive else "Connection: close"]
+        for name, value in (headers or {}).items():
+            head.append(f"{name}: {value}")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    # Server-Sent Events: one "data:" event per frame for as long as the client stays connected.
+    # ?policy=drop_oldest|disconnect and ?queue=N choose how a slow client is handled.
+    # A reconnecting client sending Last-Event-ID first gets the frames it missed from the history,
+    # at most one queue's worth, written ahead of the queue so the policy only applies to live frames.
+    # Anything older is reported in an "event: gap" with the number of frames skipped.
+    async def stream(self, hub, writer, query, headers):
+        policy = query.get("policy", POLICY_DROP_OLDEST)
+        if policy not in POLICIES:
+            await self.send_json(writer, 400, {"message": f"policy must be one of {POLICIES}"}, False)
+            return
+        try:
+            max_queue = max(1, int(query.get("queue", 8)))
+        except ValueError:
+            await self.send_json(writer, 400, {"message": "queue must be an integer"}, False)
+            return
+
+        writer.write(b"HTTP/1.1 200 OK\r\n"
+                     b"Content-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\n"
+                     b"Access-Control-Allow-Origin: *\r\n"
+                     b"Connection: keep-alive\r\n\r\n")
+        await writer.drain()
+
+        subscriber = hub.subscribe(policy, max_queue)
+        try:
+            last_event_id = headers.get("last-event-id", "")
+            if last_event_id.isdigit():
+                since = int(last_event_id)
+                backlog = hub.history.since(since)
+                missed = hub.history.missed(since) + max(0, len(backlog) - max_queue)
+                if missed:
+                    writer.write(sse_gap(missed))
+                for seq, body in backlog[-max_queue:]:
+                    writer.write(sse_event(seq, body))
+                    subscriber.sent += 1
+                await writer.drain()
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.get(), SSE_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    event = SSE_KEEPALIVE
+                if event is None:
+                    break
+                writer.write(event)
+                await writer.drain()
+                subscriber.sent += 1
+        finally:
+            hub.unsubscribe(subscriber)
+
+
+# Function to log the receive counters every interval seconds, as a warning when anything was lost
+async def log_receive_stats(receiver, udp_protocol, interval):
+    lost = 0
+    while True:
+        await asyncio.sleep(interval)
+        stats = {**(receiver.stats() if receiver is not None else {}),
+                 'sequence_gaps': udp_protocol.sequence_gaps, 'frames_skipped': udp_protocol.frames_skipped,
+                 'decode_errors': udp_protocol.decode_errors}
+        now_lost = (stats.get('kernel_drops') or 0) + stats['sequence_gaps']
+        if now_lost > lost:
+            log.warning("udp_loss", **stats)
+        else:
+            log.info("udp_stats", **stats)
+        lost = now_lost
+
+
+async def serve(udp_address=UDP_ADDRESS, http_address=HTTP_ADDRESS, history_size=HISTORY_SIZE,
+                event_address=EVENT_ADDRESS, shm_name=None, default_camera=None, multicast=None,
+                rcvbuf=RCVBUF, latest_only=False, stats_log_interval=STATS_LOG_INTERVAL, shm_station=None,
+                shm_camera=None):
+    loop = asyncio.get_running_loop()
+    registry = StreamRegistry(history_size, default_camera)
+
+    if multicast is not None:
+        sock = fanout.multicast_socket(*multicast)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(udp_address)
+    if rcvbuf:
+        set_receive_buffer(sock, rcvbuf)
+
+    udp_protocol = BridgeProtocol(registry, latest_only)
+    receiver = UdpReceiver(sock, udp_protocol)
+    transport = None
+    try:
+        receiver.start(loop)
+    except NotImplementedError:
+        # The Windows proactor loop cannot watch a socket, it delivers one datagram per callback instead
+        receiver = None
+        transport, _ = await loop.create_datagram_endpoint(lambda: udp_protocol, sock=sock)
+    log.info("listening", udp=multicast or udp_address, multicast=multicast is not None,
+             batched=receiver is not None, latest_only=latest_only)
+    event_transport, event_protocol = await loop.create_datagram_endpoint(
+        lambda: EventProtocol(registry), local_addr=event_address)
+    log.info("listening_events", udp=event_address)
+
+    ring_pump = None
+    ring_task = None
+    if shm_name:
+        ring_pump = RingPump(shm_name, registry.get(shm_station, shm_camera).frames)
+        ring_task = asyncio.create_task(ring_pump.run())
+    stats_task = None
+    if stats_log_interval:
+        stats_task = asyncio.create_task(log_receive_stats(receiver, udp_protocol, stats_log_interval))
+
+    handler = HttpHandler(registry, udp_protocol, event_protocol, ring_pump, receiver)
+    server = await asyncio.start_server(handler.handle, http_address[0], http_address[1])
+    log.info("listening_http", http=http_address,
+             endpoints=["/received-data", "/frames", "/stream", "/events", "/events/stream", "/gestures",
+                        "/stats", "/metrics", "/cameras", "/cameras/<id>/...", "/stations",
+                        "/stations/<id>/...", "/stations/<id>/cameras/<id>/..."])
+
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if receiver is not None:
+            receiver.close()
+        if transport is not None:
+            transport.close()
+        event_transport.close()
+        for task in (ring_task, stats_task):
+            if task is not None:
+                task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--udp-host", default=UDP_ADDRESS[0])
+    parser.add_argument("--udp-port", type=int, default=UDP_ADDRESS[1])
+    parser.add_argument("--http-host", default=HTTP_ADDRESS[0])
+    parser.add_argument("--http-port", type=int, default=HTTP_ADDRESS[1])
+    parser.add_argument("--events-port", type=int, default=EVENT_ADDRESS[1], help="UDP port for gesture events")
+    parser.add_argument("--history", type=int, default=HISTORY_SIZE, help="frames kept for GET /frames")
+    parser.add_argument("--shm", nargs="?", const=shared_ring.DEFAULT_NAME, default=None, metavar="NAME",
+                        help="also read frames from a same-host tracker's shared-memory ring")
+    parser.add_argument("--shm-station", help="station id the --shm frames are served under")
+    parser.add_argument("--shm-camera", help="camera id the --shm frames are served under")
+    parser.add_argument("--default-camera", help="camera id also served by the top-level endpoints")
+    parser.add_argument("--multicast", default=None, metavar="GROUP[:PORT]",
+                        help="receive landmark frames from a tracker's multicast group instead of --udp-port")
+    parser.add_argument("--rcvbuf", type=int, default=RCVBUF, help="receive buffer size in bytes (0 = OS default)")
+    parser.add_argument("--latest-only", action="store_true",
+                        help="decode only the newest frame of each sender per batch of datagrams")
+    parser.add_argument("--stats-log-interval", type=float, default=STATS_LOG_INTERVAL,
+                        help="seconds between receive counter log lines (0 = off)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    multicast = fanout.parse_multicast(args.multicast, args.udp_port) if args.multicast else None
+
+    try:
+        asyncio.run(serve((args.udp_host, args.udp_port), (args.http_host, args.http_port), args.history,
+                          (args.udp_host, args.events_port), args.shm, args.default_camera, multicast,
+                          args.rcvbuf, args.latest_only, args.stats_log_interval, args.shm_station,
+                          args.shm_camera))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
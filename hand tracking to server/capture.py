@@ -0,0 +1,101 @@
+import threading
+import time
+
+import cv2
+
+import recording
+
+
+# Reads the camera on its own thread into a single "latest frame wins" slot.
+# When inference is slower than the camera, older frames are overwritten
+# instead of queueing up in the driver buffer, and every overwritten frame
+# is counted in frames_dropped.
+#
+# source is a camera index / video path for cv2.VideoCapture, or any object
+# with the same read() interface (e.g. recording.FrameReplay). With
+# lossless=True the reader waits for the tracker instead of overwriting,
+# which makes replays deterministic.
+class LatestFrameCapture:
+    def __init__(self, source=0, lossless=False):
+        self.cap = source if hasattr(source, "read") else cv2.VideoCapture(source)
+        # Ask the driver to keep as few frames as possible (not every backend honours this)
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        self.lossless = lossless
+
+        self.condition = threading.Condition()
+        self.frame = None
+        self.capture_ns = 0  # time.monotonic_ns() taken right after the frame was read
+        self.frame_id = 0  # Incremented for every frame read from the camera
+        self.read_id = 0  # frame_id of the last frame handed to the tracker
+
+        self.frames_captured = 0
+        self.frames_dropped = 0
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._reader, daemon=True)
+        self.thread.start()
+        return self
+
+    # Camera thread: read as fast as the camera delivers and overwrite the slot
+    def _reader(self):
+        while self.running:
+            if self.lossless:
+                with self.condition:
+                    self.condition.wait_for(lambda: self.read_id == self.frame_id or not self.running)
+
+            success, frame = self.cap.read()
+            capture_ns = time.monotonic_ns()
+
+            with self.condition:
+                if not success:
+                    self.running = False
+                    self.condition.notify_all()
+                    break
+
+                # The previous frame was never picked up by the tracker
+                if self.frame is not None and self.read_id != self.frame_id:
+                    self.frames_dropped += 1
+
+                self.frame = frame
+                self.capture_ns = capture_ns
+                self.frame_id += 1
+                self.frames_captured += 1
+                self.condition.notify_all()
+
+    # Wait for a frame newer than the last one returned.
+    # Returns (success, frame, capture_ns) like cv2.VideoCapture.read() plus the timestamp.
+    def read(self, timeout=None):
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame_id != self.read_id or not self.running, timeout)
+            if self.frame_id == self.read_id:
+                return False, None, 0
+            self.read_id = self.frame_id
+            self.condition.notify_all()
+            return True, self.frame, self.capture_ns
+
+    def stats(self):
+        with self.condition:
+            return {'captured': self.frames_captured, 'dropped': self.frames_dropped}
+
+    def release(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+        self.cap.release()
+
+
+# Function to open what --source names: a camera index ("0"), a recording
+# directory made by recording.py, or a video file
+def open_source(spec, realtime=True):
+    if str(spec).isdigit():
+        return LatestFrameCapture(int(spec))
+    if recording.is_recording(spec):
+        replay = recording.FrameReplay(spec, realtime=realtime)
+        return LatestFrameCapture(replay, lossless=not realtime)
+    return LatestFrameCapture(spec)
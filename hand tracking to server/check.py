@@ -1,85 +1,247 @@
 import cv2
-import mediapipe as mp
 import time
-import socket
 import json
+import argparse
+from capture import open_source
+import fanout
+from governor import Governor
+from idle import IdlePolicy
+import shared_ring
+from preview import PreviewWindow, draw_hands
+from tracker import HandTracker, ENCODINGS
 
-cap = cv2.VideoCapture(0)
+# Run with --headless on kiosk stations: no drawing, no per-frame printing and
+# no window on the tracking loop. --preview adds a small debug window that is
+# drawn on its own thread from every Nth frame. Compare the "fps" in the
+# periodic stats line (--stats-interval) with and without --headless to see
+# what the drawing and GUI cost on a given machine.
+#
+# pipeline.py runs the same tracking split over separate capture, inference,
+# emission and preview processes.
+#
+# With --fanout, other local programs (a game, recording.py, a second bridge)
+# can subscribe to the same landmark and event datagrams on a control port
+# instead of running MediaPipe on the camera again; --multicast also sends
+# the landmark frames to a multicast group (see fanout.py).
+#
+# Where one machine runs the bridge for several stations, start the tracker
+# of each station with --station <id> --bridge-host <that machine>; the
+# bridge serves its frames under /stations/<id>/ (see bridge.py). Frames
+# read from the --shm ring carry no station; start that bridge with
+# --shm --shm-station <id> so they land under the same path.
+parser = argparse.ArgumentParser()
+parser.add_argument("--encoding", choices=ENCODINGS, default="float32",
+                    help="wire format sent to the bridge (json is the legacy text format)")
+parser.add_argument("--keyframe-interval", type=int, default=30,
+                    help="with --encoding delta, frames between full keyframes")
+parser.add_argument("--deadband", type=float, default=0.001,
+                    help="with --encoding delta, coordinate changes up to this size are not sent")
+parser.add_argument("--max-hands", type=int, default=2)
+parser.add_argument("--model-complexity", type=int, choices=[0, 1], default=1)
+parser.add_argument("--roi", action="store_true",
+                    help="run landmark inference on a crop around the previous hands (see tracker.py)")
+parser.add_argument("--target-fps", type=float, default=None,
+                    help="let the governor adjust complexity, resolution, hand count and stride to hold this rate")
+parser.add_argument("--idle-after", type=int, default=90,
+                    help="frames without a hand before inference drops to the idle rate (0 = never)")
+parser.add_argument("--idle-fps", type=float, default=2.0, help="inference rate while idle without the motion gate")
+parser.add_argument("--no-motion-gate", action="store_true",
+                    help="while idle, sample at --idle-fps instead of waiting for motion in the picture")
+parser.add_argument("--shm", nargs="?", const=shared_ring.DEFAULT_NAME, default=None, metavar="NAME",
+                    help="also publish landmarks to a shared-memory ring for readers on this host")
+parser.add_argument("--shm-force", action="store_true",
+                    help="replace the --shm ring even if another running tracker is writing it")
+parser.add_argument("--no-udp", action="store_true",
+                    help="with --shm, do not send landmark frames over UDP (gesture events still are); "
+                         "with --station, start the bridge with --shm-station to match")
+parser.add_argument("--fanout", nargs="?", const=fanout.CONTROL_ADDRESS[1], default=None, type=int, metavar="PORT",
+                    help="accept subscribers for the frame and event datagrams on this control port")
+parser.add_argument("--multicast", default=None, metavar="GROUP[:PORT]",
+                    help="also send landmark frames to this multicast group (e.g. 239.0.0.52, default port 5052)")
+parser.add_argument("--per-frame-stop", action="store_true",
+                    help="old behaviour: send {'command': 'STOP'} on every open-palm frame instead of gesture events")
+parser.add_argument("--headless", action="store_true",
+                    help="no drawing, no per-frame print and no window on the tracking loop")
+parser.add_argument("--preview", action="store_true", help="with --headless, show a reduced debug preview")
+parser.add_argument("--preview-every", type=int, default=5, help="show every Nth frame in the preview")
+parser.add_argument("--preview-scale", type=float, default=0.5, help="preview size relative to the camera frame")
+parser.add_argument("--stats-interval", type=float, default=None,
+                    help="seconds between stats lines (default 5 when headless, off otherwise)")
+parser.add_argument("--station", default=None,
+                    help="tag frames and events with this station id, for a bridge shared by several stations")
+parser.add_argument("--bridge-host", default="127.0.0.1", help="host running bridge.py")
+parser.add_argument("--source", default="0",
+                    help="camera index, video file or frame recording directory (see recording.py)")
+parser.add_argument("--fast", action="store_true",
+                    help="replay a recording as fast as possible without dropping frames")
+args = parser.parse_args()
 
-mpHands = mp.solutions.hands
-hands = mpHands.Hands()
-mpDraw = mp.solutions.drawing_utils
+if args.stats_interval is None:
+    args.stats_interval = 5.0 if args.headless else 0
+
+# Camera is read on its own thread so inference always runs on the newest frame
+capture = open_source(args.source, realtime=not args.fast).start()
+
+# Flip/convert, hands.process, STOP gesture and encoding, with per-stage timings
+# (the timings also travel in each packet to the bridge)
+tracker = HandTracker(args.encoding, args.max_hands, args.model_complexity,
+                      gesture_events=not args.per_frame_stop, roi=args.roi,
+                      keyframe_interval=args.keyframe_interval, deadband=args.deadband, station=args.station)
+metrics = tracker.metrics
+
+# --max-hands and --model-complexity are the most the governor will use
+governor = None
+if args.target_fps:
+    governor = Governor(args.target_fps, args.model_complexity, args.max_hands)
+
+# Same-host readers (bridge --shm, recording.py --shm) read straight from shared memory
+ring = None
+if args.shm:
+    try:
+        ring = shared_ring.RingWriter(args.shm, max_hands=args.max_hands, force=args.shm_force)
+    except FileExistsError as e:
+        parser.error(str(e))
+
+# Low-power mode while nobody is in front of the camera
+idle_policy = None
+if args.idle_after:
+    idle_policy = IdlePolicy(args.idle_after, args.idle_fps, motion_gate=not args.no_motion_gate)
+
+preview = None
+if args.headless and args.preview:
+    preview = PreviewWindow(args.preview_every, args.preview_scale).start()
 
 pTime = 0
 cTime = 0
 
-sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # UDP
-serverAddressPort = ("127.0.0.1", 5052)
-
-# Function to detect if all fingers are extended (STOP gesture)
-def fingers_extended(hand_landmarks):
-    tip_ids = [4, 8, 12, 16, 20]
-    fingers = []
-    
-    for tip_id in tip_ids:
-        if hand_landmarks.landmark[tip_id].y < hand_landmarks.landmark[tip_id - 2].y:
-            fingers.append(1)  # Finger is up
-        else:
-            fingers.append(0)  # Finger is down
-    
-    return sum(fingers) == 5  # True if all fingers are extended
-
-while True:
-    success, img = cap.read()
-    img = cv2.flip(img, 1)
-    imgRGB = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    results = hands.process(imgRGB)
-
-    all_hands_data = []
-    send_stop = False
-
-    if results.multi_hand_landmarks:
-        for hand_idx, handLms in enumerate(results.multi_hand_landmarks):
-            if fingers_extended(handLms):
-                send_stop = True  # If any hand shows STOP, send the STOP signal
-            
-            for id, lm in enumerate(handLms.landmark):
-                h, w, c = img.shape
-                cx, cy = int(lm.x * w), int(lm.y * h)
-                if id in [4, 8, 12, 16, 20]:
-                    cv2.circle(img, (cx, cy), 15, (255, 0, 255), cv2.FILLED)
-            
-            mpDraw.draw_landmarks(img, handLms, mpHands.HAND_CONNECTIONS)
-
-            landmarks = []
-            for id, lm in enumerate(handLms.landmark):
-                landmarks.append({'x': lm.x, 'y': lm.y, 'z': lm.z})
-
-            all_hands_data.append({'hand_index': hand_idx, 'landmarks': landmarks})
-
-    # Prepare the data to send
-    if send_stop:
-        data = json.dumps({'command': 'STOP'})
-    else:
-        data = json.dumps({'hands': all_hands_data})
-    
-    # Send data to server
-    print("Sending data:", data)  # For debugging
-    sock.sendto(data.encode(), serverAddressPort)
-
-    # Calculate FPS
-    cTime = time.time()
-    fps = 1 / (cTime - pTime)
-    pTime = cTime
-
-    # Display FPS
-    cv2.putText(img, str(int(fps)), (10, 70), cv2.FONT_HERSHEY_PLAIN, 3, (255, 0, 255), 3)
-    cv2.imshow("Image", img)
-    
-    key = cv2.waitKey(1) & 0xFF
-    if key == ord('q'):
-        break
-
-cap.release()
-sock.close()
-cv2.destroyAllWindows()
+serverAddressPort = (args.bridge_host, 5052)
+eventAddressPort = (args.bridge_host, 5053)  # Low-rate gesture events (start / end / hold)
+
+# Every frame goes to the bridge, plus any subscribers and the multicast group
+outputs = fanout.FanOut(
+    {'frames': [serverAddressPort], 'events': [eventAddressPort]},
+    control_address=(fanout.CONTROL_ADDRESS[0], args.fanout) if args.fanout else None,
+    multicast=fanout.parse_multicast(args.multicast, serverAddressPort[1]) if args.multicast else None,
+)
+
+# Frames without hands are only repeated this often while nothing changes
+EMPTY_FRAME_INTERVAL_NS = 1_000_000_000
+last_sent_empty = False
+last_sent_ns = 0
+
+# The governor's operating point is resent this often so a restarted bridge picks it up
+OPERATING_POINT_INTERVAL = 5.0
+last_point_sent = 0
+frame_index = 0
+
+# Counters for the periodic stats line
+stats_start = time.perf_counter()
+stats_frames = 0
+
+# Function to print one line of throughput and latency numbers
+def print_stats(elapsed, frames):
+    capture_to_send = metrics.summary().get('capture_to_send', {})
+    print(f"fps={frames / elapsed:.1f} camera={capture.stats()} "
+          f"capture_to_send_p50={capture_to_send.get('p50_ms')}ms "
+          f"p99={capture_to_send.get('p99_ms')}ms roi={tracker.roi_stats()} tracks={tracker.tracks.stats()}"
+          + (f" point={governor.state()}" if governor is not None else "")
+          + (f" idle={idle_policy.stats()}" if idle_policy is not None else "")
+          + (f" subscribers={len(outputs.subscribers)}" if args.fanout else ""))
+
+try:
+    while True:
+        success, img, capture_ns = capture.read()
+        if not success:
+            break
+
+        # With a stride above 1 the governor only has every Nth camera frame tracked,
+        # and while idle only the frames the idle policy picks are tracked
+        frame_index += 1
+        if ((governor is not None and frame_index % governor.point.stride)
+                or (idle_policy is not None and not idle_policy.should_infer(img))):
+            if not args.headless and cv2.waitKey(1) & 0xFF == ord('q'):
+                break  # Keep the window responsive on skipped frames
+            continue
+
+        work_start = time.perf_counter()
+        outputs.poll()  # New subscribers and heartbeats
+        frame = tracker.process(img, capture_ns)
+        img, results, data = frame['img'], frame['results'], frame['data']
+        if idle_policy is not None:
+            idle_policy.update(len(frame['hands']))
+
+        if frame['events'] is not None:
+            outputs.send_event(frame['events'])
+        if ring is not None:
+            ring.write(frame['hands'], capture_ns, frame['stop'], frame['track_ids'], frame['track_ages'])
+            if args.no_udp:
+                tracker.record_sent(frame)
+
+        # Send data to server (frames larger than one datagram are split into chunks),
+        # skipping repeated empty frames while no hand is visible
+        empty = len(frame['hands']) == 0
+        send_udp = ring is None or not args.no_udp
+        if send_udp and not (empty and last_sent_empty and capture_ns - last_sent_ns < EMPTY_FRAME_INTERVAL_NS):
+            if not args.headless:
+                print("Sending data:", len(data), "bytes")  # For debugging
+            outputs.send_frame('frames', data, frame['sequence'])
+            tracker.record_sent(frame)
+            last_sent_empty = empty
+            last_sent_ns = capture_ns
+
+        if governor is not None:
+            point = governor.record(time.perf_counter() - work_start)
+            if point is not None:
+                tracker.configure(point.model_complexity, point.max_num_hands, point.scale)
+                print("Operating point:", governor.state())
+            if point is not None or time.perf_counter() - last_point_sent >= OPERATING_POINT_INTERVAL:
+                state = governor.state()
+                if args.station is not None:
+                    state['station'] = args.station
+                outputs.send_event(json.dumps(state).encode())
+                last_point_sent = time.perf_counter()
+
+        # Calculate FPS
+        cTime = time.perf_counter()
+        fps = 1 / (cTime - pTime) if cTime > pTime else 0
+        pTime = cTime
+
+        stats_frames += 1
+        if args.stats_interval and cTime - stats_start >= args.stats_interval:
+            print_stats(cTime - stats_start, stats_frames)
+            stats_start = cTime
+            stats_frames = 0
+
+        if args.headless:
+            if preview is not None:
+                preview.offer(img, results.multi_hand_landmarks, fps)
+                if preview.quit_requested:
+                    break
+            continue
+
+        # Draw fingertips, connections and FPS, then display
+        draw_hands(img, results.multi_hand_landmarks, fps)
+        cv2.imshow("Image", img)
+
+        key = cv2.waitKey(1) & 0xFF
+        if key == ord('q'):
+            break
+except KeyboardInterrupt:
+    pass  # Ctrl+C is the way to stop a headless tracker
+
+print("Camera frames captured/dropped:", capture.stats())
+print("Inference crops/full frames:", tracker.roi_stats())
+if tracker.delta_encoder is not None:
+    print("Delta keyframes/deltas/bytes:", tracker.delta_encoder.stats())
+print("Stage latencies:", json.dumps(metrics.summary(), indent=2))
+if args.fanout:
+    print("Fan-out:", json.dumps(outputs.stats(), indent=2))
+if preview is not None:
+    preview.stop()
+capture.release()
+tracker.close()
+if ring is not None:
+    ring.close()
+outputs.close()
+if not args.headless:
+    cv2.destroyAllWindows()  # Headless builds of OpenCV have no highgui; the preview closes its own window
@@ -0,0 +1,200 @@
+import struct
+
+import numpy as np
+
+import protocol
+from protocol import NUM_LANDMARKS, ProtocolError
+
+# Delta-encoded, quantized landmark packets (--encoding delta).
+#
+# Coordinates are quantized to 16-bit fixed point (QUANT_SCALE steps per
+# normalized unit, covering -0.5 .. 1.5 so hands partly outside the picture
+# still fit). A keyframe carries every quantized coordinate; the packets in
+# between only carry the coordinates that differ from the keyframe by more
+# than the dead-band, as int16 deltas against the keyframe, so a hand that
+# barely moves produces an almost empty packet.
+#
+# Every delta refers to one keyframe and nothing else, so a lost delta only
+# loses its own frame. When a keyframe is lost, the deltas that refer to it
+# are dropped by the decoder until the next keyframe, which comes every
+# keyframe_interval frames, whenever the set of tracked hands changes
+# (a track was lost or a new one started), and for every frame without hands.
+#
+# Header (little endian, 24 bytes):
+#   magic         4s  b'BODQ'
+#   version       B   DELTA_VERSION
+#   flags         B   FLAG_KEYFRAME plus protocol.FLAG_STOP / FLAG_TIMING / FLAG_CAMERA / FLAG_STATION /
+#                     FLAG_TRACKS
+#   hand_count    B
+#   (pad)         x
+#   sequence      I
+#   capture_ns    Q
+#   keyframe_seq  I   sequence of the keyframe this packet refers to (its own for a keyframe)
+# followed by the optional timing, camera, station and track blocks of protocol.py.
+#
+# Keyframe body: hand_count * 63 uint16 quantized coordinates.
+# Delta body, per hand:
+#   slot   B    index of the hand in the keyframe
+#   mask   Q    bit i set when coordinate i (landmark i // 3, axis i % 3) follows
+#   int16 delta against the keyframe for each set bit, in order
+
+DELTA_MAGIC = b'BODQ'
+DELTA_VERSION = 2  # 2: protocol.py timing block without the encode stage
+
+FLAG_KEYFRAME = 0x80
+
+DELTA_HEADER = struct.Struct('<4sBBBxIQI')
+HAND_HEADER = struct.Struct('<BQ')
+
+QUANT_OFFSET = 0.5
+QUANT_SCALE = 32768
+COORDINATES = NUM_LANDMARKS * 3
+MASK_BITS = np.uint64(1) << np.arange(COORDINATES, dtype=np.uint64)
+
+KEYFRAME_INTERVAL = 30  # Frames, one second at 30 fps
+DEADBAND = 0.001  # Normalized units, about half a pixel at 640x480
+
+
+def is_delta_packet(data):
+    return data[:4] == DELTA_MAGIC
+
+
+def is_keyframe(data):
+    return is_delta_packet(data) and len(data) >= DELTA_HEADER.size and bool(data[5] & FLAG_KEYFRAME)
+
+
+# Function to turn an (n_hands, 21, 3) array into (n_hands, 63) fixed-point values
+def quantize(hands):
+    hands = np.asarray(hands, dtype=np.float32).reshape(-1, COORDINATES)
+    return np.clip(np.rint((hands + QUANT_OFFSET) * QUANT_SCALE), 0, 0xFFFF).astype(np.int32)
+
+
+def dequantize(values):
+    return (values.astype(np.float32) / QUANT_SCALE - QUANT_OFFSET).reshape(-1, NUM_LANDMARKS, 3)
+
+
+# Keeps the last keyframe of one sender and builds its packets
+class DeltaEncoder:
+    def __init__(self, keyframe_interval=KEYFRAME_INTERVAL, deadband=DEADBAND):
+        self.keyframe_interval = keyframe_interval
+        self.deadband = int(round(deadband * QUANT_SCALE))
+
+        self.keyframe = None  # (n_hands, 63) quantized values of the last keyframe
+        self.keyframe_ids = ()  # Track id (or index) of each keyframe hand
+        self.keyframe_seq = 0
+        self.frames_since_keyframe = 0
+
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+        self.bytes_sent = 0
+
+    # Build the packet for one frame; arguments as for protocol.encode_packet()
+    def encode(self, hands, sequence, capture_ns, stop=False, timings=None, camera=None, track_ids=None,
+               track_ages=None, station=None, session=0):
+        values = quantize(hands)
+        ids = tuple(int(i) for i in track_ids) if track_ids is not None else tuple(range(len(values)))
+
+        slots = None
+        if (self.keyframe is not None and len(values) and set(ids) == set(self.keyframe_ids)
+                and self.frames_since_keyframe < self.keyframe_interval):
+            slots = [self.keyframe_ids.index(i) for i in ids]
+            deltas = values - self.keyframe[slots]
+            if np.abs(deltas).max() > 0x7FFF:
+                slots = None  # Too far from the keyframe for int16, start over
+
+        sequence &= 0xFFFFFFFF
+        flags = protocol.block_flags(stop, timings, camera, track_ids, station)
+        if slots is None:
+            flags |= FLAG_KEYFRAME
+            self.keyframe = values
+            self.keyframe_ids = ids
+            self.keyframe_seq = sequence
+            self.frames_since_keyframe = 0
+            body = values.astype('<u2').tobytes()
+            self.keyframes_sent += 1
+        else:
+            self.frames_since_keyframe += 1
+            body = b''
+            for slot, hand_deltas in zip(slots, deltas):
+                changed = np.abs(hand_deltas) > self.deadband
+                mask = int(MASK_BITS[changed].sum())
+                body += HAND_HEADER.pack(slot, mask) + hand_deltas[changed].astype('<i2').tobytes()
+            self.deltas_sent += 1
+
+        header = DELTA_HEADER.pack(DELTA_MAGIC, DELTA_VERSION, flags, len(values), sequence, capture_ns,
+                                   self.keyframe_seq)
+        blocks = protocol.encode_blocks(len(values), timings, camera, track_ids, track_ages, station, session)
+        packet = header + blocks + body
+        self.bytes_sent += len(packet)
+        return packet
+
+    def stats(self):
+        return {'keyframes': self.keyframes_sent, 'deltas': self.deltas_sent, 'bytes': self.bytes_sent}
+
+
+# Rebuilds the frames of one sender; keep one decoder per sender
+class DeltaDecoder:
+    def __init__(self):
+        self.keyframe = None
+        self.keyframe_seq = None
+
+        self.keyframes_received = 0
+        self.deltas_received = 0
+        self.deltas_dropped = 0  # Deltas whose keyframe never arrived
+
+    # Returns a dict like protocol.decode_packet(), or None for a delta whose
+    # keyframe is missing (the stream recovers at the next keyframe)
+    def decode(self, data):
+        if len(data) < DELTA_HEADER.size:
+            raise ProtocolError(f"Packet too short: {len(data)} bytes")
+        magic, version, flags, hand_count, sequence, capture_ns, keyframe_seq = DELTA_HEADER.unpack_from(data)
+        if magic != DELTA_MAGIC:
+            raise ProtocolError("Bad magic")
+        if version != DELTA_VERSION:
+            raise ProtocolError(f"Unsupported delta version {version}")
+
+        blocks, offset = protocol.decode_blocks(data, DELTA_HEADER.size, flags, hand_count)
+        if flags & FLAG_KEYFRAME:
+            expected = offset + hand_count * COORDINATES * 2
+            if len(data) != expected:
+                raise ProtocolError(f"Expected {expected} bytes, got {len(data)}")
+            values = np.frombuffer(data, dtype='<u2', offset=offset).reshape(hand_count, COORDINATES)
+            self.keyframe = values.astype(np.int32)
+            self.keyframe_seq = sequence
+            self.keyframes_received += 1
+            values = self.keyframe
+        else:
+            if keyframe_seq != self.keyframe_seq:
+                self.deltas_dropped += 1
+                return None
+            values = np.empty((hand_count, COORDINATES), dtype=np.int32)
+            for hand in range(hand_count):
+                if len(data) < offset + HAND_HEADER.size:
+                    raise ProtocolError("Packet too short for delta hand")
+                slot, mask = HAND_HEADER.unpack_from(data, offset)
+                offset += HAND_HEADER.size
+                if slot >= len(self.keyframe):
+                    raise ProtocolError(f"Delta refers to keyframe hand {slot} of {len(self.keyframe)}")
+                changed = (np.uint64(mask) & MASK_BITS) != 0
+                count = int(changed.sum())
+                if len(data) < offset + count * 2:
+                    raise ProtocolError("Packet too short for delta values")
+                values[hand] = self.keyframe[slot]
+                values[hand, changed] += np.frombuffer(data, dtype='<i2', count=count, offset=offset)
+                offset += count * 2
+            if offset != len(data):
+                raise ProtocolError(f"Expected {offset} bytes, got {len(data)}")
+            self.deltas_received += 1
+
+        return {
+            'sequence': sequence,
+            'capture_ns': capture_ns,
+            **blocks,
+            'stop': bool(flags & protocol.FLAG_STOP),
+            'keyframe': bool(flags & FLAG_KEYFRAME),
+            'hands': dequantize(values),
+        }
+
+    def stats(self):
+        return {'keyframes': self.keyframes_received, 'deltas': self.deltas_received,
+                'dropped': self.deltas_dropped}
@@ -0,0 +1,239 @@
+import json
+import socket
+import struct
+import time
+
+import framing
+
+# Datagram fan-out, so one tracker feeds every consumer on the machine.
+#
+# Only one process can bind the bridge's port, so a recorder or a game that
+# wanted the landmarks used to run MediaPipe again on the same camera. With a
+# FanOut the tracker sends each frame to:
+#   targets      fixed addresses, the bridge (5052) and its events port (5053) as before
+#   subscribers  clients that registered on the control port (CONTROL_ADDRESS)
+#   multicast    optionally one UDP multicast group any number of local readers can join
+#
+# A client subscribes by sending {"type": "subscribe", "stream": "frames"}
+# (or "events") from the socket it wants the datagrams on, and repeats it as
+# a heartbeat at least every SUBSCRIBER_TIMEOUT seconds; Subscription does
+# this for it. {"type": "unsubscribe"} or missing heartbeats remove it.
+# Every subscriber has its own send counters (stats()).
+#
+#   fanout = FanOut({'frames': [("127.0.0.1", 5052)]}, control_address=CONTROL_ADDRESS)
+#   fanout.poll()                              # once per frame, handles (un)subscribe messages
+#   fanout.send_frame('frames', data, frame_id)
+
+CONTROL_ADDRESS = ("127.0.0.1", 5054)
+STREAMS = ('frames', 'events')
+
+SUBSCRIBER_TIMEOUT = 5.0  # Seconds without a heartbeat before a subscriber is dropped
+HEARTBEAT_INTERVAL = 1.0
+MAX_SUBSCRIBERS = 32
+
+MULTICAST_TTL = 1  # Stay on the local network
+
+
+# Function to parse "GROUP" or "GROUP:PORT" into an address, e.g. "239.0.0.52:5052"
+def parse_multicast(value, default_port):
+    group, _, port = value.partition(":")
+    return group, int(port) if port else default_port
+
+
+# Function to make a UDP socket that receives a multicast group on port
+def multicast_socket(group, port, interface="0.0.0.0"):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)  # Several readers on one host
+    sock.bind(("", port))
+    membership = struct.pack("4s4s", socket.inet_aton(group), socket.inet_aton(interface))
+    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+    return sock
+
+
+# One registered client
+class Subscriber:
+    def __init__(self, address, stream, now):
+        self.address = address
+        self.stream = stream
+        self.subscribed_at = now
+        self.last_seen = now
+        self.frames_sent = 0
+        self.datagrams_sent = 0
+        self.bytes_sent = 0
+        self.send_errors = 0
+
+    def summary(self):
+        return {'stream': self.stream, 'frames': self.frames_sent, 'datagrams': self.datagrams_sent,
+                'bytes': self.bytes_sent, 'errors': self.send_errors}
+
+
+class FanOut:
+    def __init__(self, targets, control_address=None, multicast=None, sock=None,
+                 subscriber_timeout=SUBSCRIBER_TIMEOUT):
+        self.sock = sock or socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.targets = {stream: list(targets.get(stream, ())) for stream in STREAMS}
+        self.subscriber_timeout = subscriber_timeout
+        self.subscribers = {}  # (address, stream) -> Subscriber
+
+        self.control = None
+        if control_address is not None:
+            self.control = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.control.bind(control_address)
+            self.control.setblocking(False)
+
+        # Multicast carries the frames stream only; events stay point to point
+        self.multicast = multicast
+        if multicast is not None:
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+            self.sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+
+        self.frames_sent = {stream: 0 for stream in STREAMS}
+        self.subscribers_rejected = 0
+        self.subscribers_expired = 0
+        self.control_errors = 0
+
+    # Handle every pending control message and drop subscribers whose heartbeat stopped
+    def poll(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        while self.control is not None:
+            try:
+                data, address = self.control.recvfrom(1024)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                self.control_errors += 1  # e.g. ICMP port unreachable from a client that went away
+                continue
+            self.handle(data, address, now)
+
+        for key, subscriber in list(self.subscribers.items()):
+            if now - subscriber.last_seen > self.subscriber_timeout:
+                del self.subscribers[key]
+                self.subscribers_expired += 1
+
+    def handle(self, data, address, now):
+        try:
+            message = json.loads(data.decode())
+            kind = message['type']
+            stream = message.get('stream', 'frames')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            self.control_errors += 1
+            return
+        if stream not in STREAMS:
+            self.control_errors += 1
+            return
+
+        key = (address, stream)
+        if kind == 'unsubscribe':
+            self.subscribers.pop(key, None)
+            return
+        if kind != 'subscribe':
+            self.control_errors += 1
+            return
+
+        subscriber = self.subscribers.get(key)
+        if subscriber is None:
+            if len(self.subscribers) >= MAX_SUBSCRIBERS:
+                self.subscribers_rejected += 1
+                return
+            subscriber = self.subscribers[key] = Subscriber(address, stream, now)
+        subscriber.last_seen = now
+        reply = {'type': 'subscribed', 'stream': stream, 'timeout': self.subscriber_timeout}
+        self.control.sendto(json.dumps(reply).encode(), address)
+
+    # Send one frame (chunked when needed) to every target and subscriber of stream
+    def send_frame(self, stream, data, frame_id):
+        datagrams = framing.split_frame(data, frame_id)
+        for address in self.targets[stream]:
+            for datagram in datagrams:
+                self.sock.sendto(datagram, address)
+        if stream == 'frames' and self.multicast is not None:
+            for datagram in datagrams:
+                self.sock.sendto(datagram, self.multicast)
+
+        for key, subscriber in list(self.subscribers.items()):
+            if subscriber.stream != stream:
+                continue
+            try:
+                for datagram in datagrams:
+                    self.sock.sendto(datagram, subscriber.address)
+                    subscriber.datagrams_sent += 1
+                    subscriber.bytes_sent += len(datagram)
+                subscriber.frames_sent += 1
+            except ConnectionRefusedError:
+                del self.subscribers[key]  # The client has gone, no need to wait for the timeout
+            except OSError:
+                subscriber.send_errors += 1
+        self.frames_sent[stream] += 1
+
+    # Send one small message (a gesture event or status) as a single datagram
+    def send_event(self, data):
+        self.send_frame('events', data, 0)
+
+    def stats(self):
+        return {
+            'frames_sent': dict(self.frames_sent),
+            'subscribers': {f"{address[0]}:{address[1]}/{stream}": subscriber.summary()
+                            for (address, stream), subscriber in self.subscribers.items()},
+            'rejected': self.subscribers_rejected,
+            'expired': self.subscribers_expired,
+            'control_errors': self.control_errors,
+        }
+
+    def close(self):
+        if self.control is not None:
+            self.control.close()
+        self.sock.close()
+
+
+# Client side: registers with a tracker's FanOut and keeps the registration alive
+class Subscription:
+    def __init__(self, control_address=CONTROL_ADDRESS, stream='frames', heartbeat_interval=HEARTBEAT_INTERVAL):
+        self.control_address = control_address
+        self.stream = stream
+        self.heartbeat_interval = heartbeat_interval
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("127.0.0.1", 0))
+        self.last_heartbeat = None
+        self.acknowledged = False  # Set once the tracker has answered a heartbeat
+
+    def heartbeat(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        if self.last_heartbeat is not None and now - self.last_heartbeat < self.heartbeat_interval:
+            return
+        message = {'type': 'subscribe', 'stream': self.stream}
+        try:
+            self.sock.sendto(json.dumps(message).encode(), self.control_address)
+        except OSError:
+            pass  # Tracker not running yet, the next heartbeat tries again
+        self.last_heartbeat = now
+
+    # Next datagram from the tracker, or None after timeout seconds; heartbeats are sent as needed
+    def recv(self, timeout=0.5):
+        self.heartbeat()
+        self.sock.settimeout(min(timeout, self.heartbeat_interval))
+        end = time.monotonic() + timeout
+        while True:
+            try:
+                data, address = self.sock.recvfrom(65535)
+            except (socket.timeout, BlockingIOError):
+                data = None
+            except ConnectionResetError:
+                data = None  # Windows reports an unreachable control port this way
+            if data is not None:
+                if address == self.control_address and data.startswith(b'{"type": "subscribed"'):
+                    self.acknowledged = True
+                    continue
+                return data, address
+            self.heartbeat()
+            if time.monotonic() >= end:
+                return None
+
+    def close(self):
+        try:
+            self.sock.sendto(json.dumps({'type': 'unsubscribe', 'stream': self.stream}).encode(),
+                             self.control_address)
+        except OSError:
+            pass
+        self.sock.close()
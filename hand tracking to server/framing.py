@@ -0,0 +1,121 @@
+import struct
+import time
+from collections import OrderedDict
+
+# Splits frames that do not fit in one datagram into numbered chunks and
+# puts them back together on the receiving side.
+#
+# Chunk header (little endian, 12 bytes):
+#   magic        4s  b'BOBF'
+#   frame_id     I   sender's frame counter, wraps at 2**32
+#   chunk_index  H   0 .. chunk_count - 1
+#   chunk_count  H   number of chunks in this frame
+#
+# Frames that fit in a single datagram are sent as-is, so small binary
+# packets and legacy JSON messages pay no framing overhead.
+
+CHUNK_MAGIC = b'BOBF'
+CHUNK_HEADER = struct.Struct('<4sIHH')
+
+# Keeps every datagram below a typical 1500-byte Ethernet MTU
+MAX_DATAGRAM = 1200
+
+
+def is_chunk(data):
+    return data[:4] == CHUNK_MAGIC
+
+
+# Function to split one frame into datagrams no larger than max_datagram
+def split_frame(data, frame_id, max_datagram=MAX_DATAGRAM):
+    if len(data) <= max_datagram and not is_chunk(data):
+        return [data]
+
+    payload_size = max_datagram - CHUNK_HEADER.size
+    chunk_count = (len(data) + payload_size - 1) // payload_size
+    if chunk_count > 0xFFFF:
+        raise ValueError(f"Frame of {len(data)} bytes needs too many chunks")
+
+    frame_id &= 0xFFFFFFFF
+    chunks = []
+    for chunk_index in range(chunk_count):
+        payload = data[chunk_index * payload_size:(chunk_index + 1) * payload_size]
+        chunks.append(CHUNK_HEADER.pack(CHUNK_MAGIC, frame_id, chunk_index, chunk_count) + payload)
+    return chunks
+
+
+# Function to send a frame over a UDP socket, chunking it if needed
+def send_frame(sock, data, address, frame_id, max_datagram=MAX_DATAGRAM):
+    for datagram in split_frame(data, frame_id, max_datagram):
+        sock.sendto(datagram, address)
+
+
+# Reassembly table for chunked frames.
+# Partial frames are kept per (sender, frame_id); the table is bounded to
+# max_frames entries and anything older than timeout seconds is discarded
+# and counted in frames_incomplete.
+class Reassembler:
+    def __init__(self, max_frames=32, timeout=0.5):
+        self.max_frames = max_frames
+        self.timeout = timeout
+        self.pending = OrderedDict()  # (addr, frame_id) -> [first_seen, chunk_count, {index: payload}]
+
+        self.frames_completed = 0
+        self.frames_incomplete = 0
+        self.chunks_invalid = 0
+
+    # Feed one datagram; returns the full frame bytes once every chunk has arrived
+    def add(self, data, addr=None, now=None):
+        if not is_chunk(data):
+            return data
+        if len(data) < CHUNK_HEADER.size:
+            self.chunks_invalid += 1
+            return None
+
+        if now is None:
+            now = time.monotonic()
+        self.expire(now)
+
+        _, frame_id, chunk_index, chunk_count = CHUNK_HEADER.unpack_from(data)
+        if chunk_count == 0 or chunk_index >= chunk_count:
+            self.chunks_invalid += 1
+            return None
+
+        key = (addr, frame_id)
+        entry = self.pending.get(key)
+        if entry is None:
+            if len(self.pending) >= self.max_frames:
+                self.pending.popitem(last=False)
+                self.frames_incomplete += 1
+            entry = [now, chunk_count, {}]
+            self.pending[key] = entry
+        elif entry[1] != chunk_count:
+            self.chunks_invalid += 1
+            return None
+
+        entry[2][chunk_index] = data[CHUNK_HEADER.size:]
+        if len(entry[2]) < chunk_count:
+            return None
+
+        del self.pending[key]
+        self.frames_completed += 1
+        chunks = entry[2]
+        return b''.join(chunks[i] for i in range(chunk_count))
+
+    # Drop partial frames that have been waiting longer than the timeout
+    def expire(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        while self.pending:
+            key, entry = next(iter(self.pending.items()))
+            if now - entry[0] < self.timeout:
+                break
+            del self.pending[key]
+            self.frames_incomplete += 1
+
+    def stats(self):
+        return {
+            'completed': self.frames_completed,
+            'incomplete': self.frames_incomplete,
+            'invalid_chunks': self.chunks_invalid,
+            'pending': len(self.pending),
+        }
@@ -0,0 +1,200 @@
+import numpy as np
+
+from protocol import landmarks_to_array
+
+# Gesture predicates shared by the tracker and the games.
+#
+# MediaPipe results are turned into one (n_hands, 21, 3) array per frame
+# (landmarks_to_array) and analyze() computes every predicate for all hands
+# at once with NumPy instead of walking hand_landmarks.landmark[...] one
+# attribute at a time in each game.
+
+WRIST = 0
+THUMB_IP = 3
+THUMB_TIP = 4
+INDEX_FINGER_TIP = 8
+MIDDLE_FINGER_TIP = 12
+RING_FINGER_TIP = 16
+PINKY_TIP = 20
+
+# Thumb, index, middle, ring, pinky
+FINGERTIP_IDS = np.array([THUMB_TIP, INDEX_FINGER_TIP, MIDDLE_FINGER_TIP, RING_FINGER_TIP, PINKY_TIP])
+# The joint two landmarks below each tip (thumb MCP, then the PIP joints)
+FINGER_JOINT_IDS = FINGERTIP_IDS - 2
+
+PINCH_THRESHOLD = 0.08
+
+LEFT = 0
+RIGHT = 1
+
+
+# Function to compute every gesture predicate for an (n_hands, 21, 3) array.
+# Returns a dict of arrays with one entry per hand:
+#   fingers_up      (n, 5) bool  tip above the joint two landmarks below it (image y grows downwards)
+#   thumb_out       (n,) bool    thumb tip left of the thumb IP joint (mirrored image)
+#   finger_count    (n,) int     thumb_out plus the four fingers that are up
+#   open_palm       (n,) bool    all five fingers up (the STOP gesture)
+#   closed_fist     (n,) bool    index, middle, ring and pinky all folded
+#   pinch_distance  (n,) float   thumb tip to index tip distance in x/y
+#   pinch           (n,) bool    pinch_distance below pinch_threshold
+#   pointing        (n,) int     RIGHT when the thumb tip is left of the index tip, else LEFT
+def analyze(hands, pinch_threshold=PINCH_THRESHOLD):
+    hands = np.asarray(hands, dtype=np.float32).reshape(-1, 21, 3)
+
+    tips_y = hands[:, FINGERTIP_IDS, 1]
+    joints_y = hands[:, FINGER_JOINT_IDS, 1]
+    fingers_up = tips_y < joints_y
+
+    thumb_out = hands[:, THUMB_TIP, 0] < hands[:, THUMB_IP, 0]
+    finger_count = thumb_out.astype(np.int32) + fingers_up[:, 1:].sum(axis=1)
+
+    pinch_vector = hands[:, INDEX_FINGER_TIP, :2] - hands[:, THUMB_TIP, :2]
+    pinch_distance = np.sqrt((pinch_vector ** 2).sum(axis=1))
+
+    pointing = np.where(hands[:, THUMB_TIP, 0] < hands[:, INDEX_FINGER_TIP, 0], RIGHT, LEFT)
+
+    return {
+        'fingers_up': fingers_up,
+        'thumb_out': thumb_out,
+        'finger_count': finger_count,
+        'open_palm': fingers_up.all(axis=1),
+        'closed_fist': (tips_y[:, 1:] > joints_y[:, 1:]).all(axis=1),
+        'pinch_distance': pinch_distance,
+        'pinch': pinch_distance < pinch_threshold,
+        'pointing': pointing,
+    }
+
+
+# Function to read MediaPipe's handedness labels as an (n,) array of LEFT / RIGHT
+def handedness_from_results(results):
+    if not results.multi_handedness:
+        return np.zeros(0, dtype=np.int32)
+    return np.array([RIGHT if h.classification[0].label == "Right" else LEFT
+                     for h in results.multi_handedness], dtype=np.int32)
+
+
+# Function doing the whole per-frame step for a game: results -> (hands array, gestures)
+def from_results(results, pinch_threshold=PINCH_THRESHOLD):
+    hands = landmarks_to_array(results.multi_hand_landmarks)
+    return hands, analyze(hands, pinch_threshold)
+
+
+# Debounced on/off state for one gesture on one hand.
+# The gesture only becomes active after the raw predicate has held for
+# min_on_ms, and only ends after it has been false for min_off_ms, so a
+# single noisy frame neither starts nor ends it. update() returns the events
+# for this frame: "start", "end", or "hold" once the gesture has been active
+# for each of hold_ms.
+class GestureDebouncer:
+    def __init__(self, min_on_ms=100, min_off_ms=150, hold_ms=(1000,)):
+        self.min_on_ns = int(min_on_ms * 1e6)
+        self.min_off_ns = int(min_off_ms * 1e6)
+        self.hold_ns = sorted(int(ms * 1e6) for ms in hold_ms)
+
+        self.active = False
+        self.changed_ns = None  # When the raw predicate last disagreed with the state
+        self.started_ns = None  # When the gesture became active
+        self.duration_ns = 0  # How long the last activation lasted, once it has ended
+        self.holds_sent = 0
+
+    def update(self, raw, now_ns):
+        events = []
+        if raw == self.active:
+            self.changed_ns = None
+        elif self.changed_ns is None:
+            self.changed_ns = now_ns
+
+        if not self.active and raw and now_ns - self.changed_ns >= self.min_on_ns:
+            self.active = True
+            self.started_ns = self.changed_ns
+            self.changed_ns = None
+            self.holds_sent = 0
+            events.append("start")
+        elif self.active and not raw and now_ns - self.changed_ns >= self.min_off_ns:
+            self.active = False
+            self.duration_ns = self.changed_ns - self.started_ns
+            self.changed_ns = None
+            events.append("end")
+
+        if self.active:
+            while self.holds_sent < len(self.hold_ns) and self.held_ns(now_ns) >= self.hold_ns[self.holds_sent]:
+                self.holds_sent += 1
+                events.append("hold")
+        return events
+
+    # How long the gesture has been held, or how long it was held once it has ended
+    def held_ns(self, now_ns):
+        return now_ns - self.started_ns if self.active else self.duration_ns
+
+
+# Gestures reported as events and the legacy command each one stands for
+EVENT_GESTURES = ('open_palm', 'closed_fist', 'pinch')
+GESTURE_COMMANDS = {'open_palm': 'STOP'}
+
+# Pinch uses two thresholds so a distance hovering around one value does not flicker
+PINCH_ENTER = 0.06
+PINCH_EXIT = 0.08
+
+
+# Turns per-frame gesture predicates into edge-triggered events.
+# Hands are keyed by their index in the frame (or a stable track id when one
+# is passed in). Every message also lists the currently active gestures, and a
+# message is produced at least every heartbeat_ms, so a consumer that lost an
+# event datagram still converges on the right state.
+class GestureEventStream:
+    def __init__(self, min_on_ms=100, min_off_ms=150, hold_ms=(1000,), heartbeat_ms=1000):
+        self.min_on_ms = min_on_ms
+        self.min_off_ms = min_off_ms
+        self.hold_ms = hold_ms
+        self.heartbeat_ns = int(heartbeat_ms * 1e6)
+
+        self.debouncers = {}  # (hand, gesture) -> GestureDebouncer
+        self.sequence = 0
+        self.last_sent_ns = None
+
+    # Feed one frame's gestures.analyze() output; returns a message dict or None
+    def update(self, hand_gestures, now_ns, hand_ids=None):
+        count = len(hand_gestures['open_palm'])
+        if hand_ids is None:
+            hand_ids = range(count)
+
+        raw = {}
+        for i, hand in enumerate(hand_ids):
+            hand = int(hand)
+            for gesture in EVENT_GESTURES:
+                if gesture == 'pinch':
+                    debouncer = self.debouncers.get((hand, gesture))
+                    threshold = PINCH_EXIT if debouncer is not None and debouncer.active else PINCH_ENTER
+                    raw[(hand, gesture)] = bool(hand_gestures['pinch_distance'][i] < threshold)
+                else:
+                    raw[(hand, gesture)] = bool(hand_gestures[gesture][i])
+
+        events = []
+        # Hands that are gone count as "gesture not shown"
+        for key in sorted(set(self.debouncers) | set(raw)):
+            debouncer = self.debouncers.get(key)
+            if debouncer is None:
+                if not raw[key]:
+                    continue
+                debouncer = self.debouncers[key] = GestureDebouncer(self.min_on_ms, self.min_off_ms, self.hold_ms)
+
+            for kind in debouncer.update(raw.get(key, False), now_ns):
+                hand, gesture = key
+                event = {'hand': hand, 'gesture': gesture, 'event': kind,
+                         'held_ms': debouncer.held_ns(now_ns) // 1_000_000}
+                if gesture in GESTURE_COMMANDS:
+                    event['command'] = GESTURE_COMMANDS[gesture]
+                events.append(event)
+
+            if not debouncer.active and debouncer.changed_ns is None:
+                del self.debouncers[key]
+
+        heartbeat_due = self.last_sent_ns is None or now_ns - self.last_sent_ns >= self.heartbeat_ns
+        if not events and not heartbeat_due:
+            return None
+
+        self.last_sent_ns = now_ns
+        self.sequence += 1
+        active = [{'hand': hand, 'gesture': gesture, 'held_ms': debouncer.held_ns(now_ns) // 1_000_000}
+                  for (hand, gesture), debouncer in sorted(self.debouncers.items()) if debouncer.active]
+        return {'type': 'gesture_events', 'seq': self.sequence, 'events': events, 'active': active}
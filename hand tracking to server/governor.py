@@ -0,0 +1,107 @@
+import time
+from collections import deque, namedtuple
+
+# Adaptive performance governor for the tracker.
+#
+# Stations range from new desktops to old laptops, so no single set of
+# Hands() arguments is right everywhere. The governor watches how long each
+# inference takes and walks a ladder of operating points, from the most
+# accurate to the cheapest, to hold a target frame rate:
+#   model_complexity  MediaPipe landmark model (1 = full, 0 = lite)
+#   scale             inference resolution relative to the camera frame
+#   max_num_hands     hands MediaPipe looks for
+#   stride            run inference on every Nth camera frame only
+# It steps down as soon as the median cost per camera frame is over budget
+# and steps back up only when there is clear headroom. A level that was
+# just left for being too slow is not retried for a while, and the wait
+# doubles each time, so it does not flip-flop between two levels.
+
+OperatingPoint = namedtuple("OperatingPoint", ["model_complexity", "scale", "max_num_hands", "stride"])
+
+# Most accurate first, each step gives up one thing
+LADDER = (
+    OperatingPoint(1, 1.0, 2, 1),
+    OperatingPoint(0, 1.0, 2, 1),
+    OperatingPoint(0, 0.75, 2, 1),
+    OperatingPoint(0, 0.75, 1, 1),
+    OperatingPoint(0, 0.5, 1, 1),
+    OperatingPoint(0, 0.5, 1, 2),
+    OperatingPoint(0, 0.5, 1, 3),
+)
+
+WINDOW = 30  # Frames measured before each decision
+HEADROOM = 0.6  # Step up only when the cost is below this fraction of the budget
+COOLDOWN = 2.0  # Seconds between changes
+BACKOFF = 10.0  # Seconds before retrying a level that was too slow, doubled on every retry
+MAX_BACKOFF = 300.0
+
+
+# Function to build the ladder for a station, never going above the configured complexity and hand count
+def build_ladder(model_complexity=1, max_num_hands=2):
+    points = (OperatingPoint(min(p.model_complexity, model_complexity), p.scale,
+                             min(p.max_num_hands, max_num_hands), p.stride) for p in LADDER)
+    return list(dict.fromkeys(points))  # Drop the steps that became duplicates, keep the order
+
+
+class Governor:
+    def __init__(self, target_fps, model_complexity=1, max_num_hands=2, window=WINDOW, headroom=HEADROOM,
+                 cooldown=COOLDOWN):
+        self.target_fps = target_fps
+        self.budget = 1.0 / target_fps
+        self.ladder = build_ladder(model_complexity, max_num_hands)
+        self.headroom = headroom
+        self.cooldown = cooldown
+
+        self.level = 0
+        self.samples = deque(maxlen=window)
+        self.changed_at = None
+        self.changes = 0
+        self.measured = None  # Median seconds per camera frame at the last decision
+        self.blocked_until = {}  # level -> time.monotonic() before which it is not retried
+        self.backoff = {}  # level -> current backoff in seconds
+
+    @property
+    def point(self):
+        return self.ladder[self.level]
+
+    # Record how long one inference took (seconds of work, not camera wait).
+    # Returns the new OperatingPoint when the governor changes level, else None.
+    def record(self, seconds, now=None):
+        if now is None:
+            now = time.monotonic()
+        self.samples.append(seconds)
+        if len(self.samples) < self.samples.maxlen:
+            return None
+        if self.changed_at is not None and now - self.changed_at < self.cooldown:
+            return None
+
+        # Inference only runs on every stride-th frame, so that is its cost per camera frame
+        self.measured = sorted(self.samples)[len(self.samples) // 2] / self.point.stride
+
+        if self.measured > self.budget and self.level < len(self.ladder) - 1:
+            backoff = min(self.backoff.get(self.level, BACKOFF / 2) * 2, MAX_BACKOFF)
+            self.backoff[self.level] = backoff
+            self.blocked_until[self.level] = now + backoff
+            self.level += 1
+        elif (self.measured < self.budget * self.headroom and self.level > 0
+              and now >= self.blocked_until.get(self.level - 1, 0)):
+            self.level -= 1
+        else:
+            return None
+
+        self.samples.clear()
+        self.changed_at = now
+        self.changes += 1
+        return self.point
+
+    # The current operating point as a JSON-serialisable message
+    def state(self):
+        return {
+            'type': 'operating_point',
+            'target_fps': self.target_fps,
+            'level': self.level,
+            'levels': len(self.ladder),
+            **self.point._asdict(),
+            'measured_ms': round(self.measured * 1000, 2) if self.measured is not None else None,
+            'changes': self.changes,
+        }
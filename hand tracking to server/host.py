@@ -0,0 +1,248 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import time
+
+import fanout
+
+# Multi-camera tracker host.
+#
+# One process per camera, started from a JSON config file. Every worker runs
+# the headless tracking loop of check.py on its own camera and tags its
+# packets and gesture events with the camera id, so a single bridge serves
+# all cameras: GET /cameras lists them and /cameras/<id>/received-data,
+# /cameras/<id>/stream, /cameras/<id>/metrics etc. are per camera (see
+# bridge.py); with a "station" they are under /stations/<station>/cameras/<id>/.
+# A worker that crashes (camera unplugged, driver error) is restarted after
+# RESTART_DELAY seconds while the others keep running. A worker that ends
+# cleanly (a recording source that finished) is not, unless its camera has
+# "restart": "always"; the host exits once no worker is left.
+#
+#   python host.py cameras.example.json
+#
+# Config:
+#   {
+#     "bridge": ["127.0.0.1", 5052],        optional, landmark frames
+#     "events": ["127.0.0.1", 5053],        optional, gesture events
+#     "station": "room-2",                  optional, station id for a bridge shared by several stations
+#     "defaults": {...},                    optional, applied to every camera
+#     "cameras": [
+#       {"id": "left", "source": "0", "max_hands": 2, "model_complexity": 1,
+#        "encoding": "float32", "roi": false, "idle_after": 90, "cpus": [0, 1]}
+#     ]
+#   }
+# Only "id" and "source" are required. "cpus" pins the worker to those cores
+# (Linux only) so cameras do not fight over the same ones. "fanout_port"
+# lets local clients subscribe to that camera's datagrams (see fanout.py).
+# "keyframe_interval" and "deadband" tune "encoding": "delta". "restart" is
+# "on-failure" (default, only after a non-zero exit code) or "always".
+
+UDP_ADDRESS = ("127.0.0.1", 5052)
+EVENT_ADDRESS = ("127.0.0.1", 5053)
+
+CAMERA_DEFAULTS = {
+    'encoding': "float32",
+    'max_hands': 2,
+    'model_complexity': 1,
+    'roi': False,
+    'idle_after': 90,
+    'idle_fps': 2.0,
+    'motion_gate': True,
+    'per_frame_stop': False,
+    'keyframe_interval': 30,  # With "encoding": "delta"
+    'deadband': 0.001,
+    'fanout_port': None,
+    'cpus': None,
+    'restart': "on-failure",
+}
+
+RESTART_POLICIES = ("on-failure", "always")
+
+RESTART_DELAY = 5.0  # Seconds before a crashed worker is started again
+STATS_INTERVAL = 5.0
+
+# Frames without hands are only repeated this often while nothing changes
+EMPTY_FRAME_INTERVAL_NS = 1_000_000_000
+
+
+# Function to read the config file into (udp_address, event_address, camera configs).
+# The station id, when given, is copied into every camera config.
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+
+    defaults = {**CAMERA_DEFAULTS, **config.get('defaults', {})}
+    station = config.get('station')
+    defaults['station'] = str(station) if station is not None else None
+    cameras = []
+    for camera in config['cameras']:
+        camera = {**defaults, **camera}
+        if 'id' not in camera or 'source' not in camera:
+            raise ValueError(f"Camera entry needs an id and a source: {camera}")
+        camera['id'] = str(camera['id'])
+        camera['source'] = str(camera['source'])
+        if camera['restart'] not in RESTART_POLICIES:
+            raise ValueError(f"Camera {camera['id']}: restart must be one of {RESTART_POLICIES}")
+        cameras.append(camera)
+
+    ids = [camera['id'] for camera in cameras]
+    if len(set(ids)) != len(ids):
+        raise ValueError(f"Camera ids must be unique: {ids}")
+    return tuple(config.get('bridge', UDP_ADDRESS)), tuple(config.get('events', EVENT_ADDRESS)), cameras
+
+
+def report(stats_queue, stats):
+    try:
+        stats_queue.put_nowait(stats)
+    except queue.Full:
+        pass  # The parent is behind, the next report replaces this one
+
+
+# Headless tracking loop for one camera, run in its own process
+def camera_worker(camera, udp_address, event_address, stop, stats_queue, interval):
+    from capture import open_source  # Camera and MediaPipe are only loaded in the workers
+    from idle import IdlePolicy
+    from tracker import HandTracker
+
+    if camera['cpus'] and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, camera['cpus'])
+
+    capture = open_source(camera['source']).start()
+    tracker = HandTracker(camera['encoding'], camera['max_hands'], camera['model_complexity'],
+                          gesture_events=not camera['per_frame_stop'], roi=camera['roi'], camera=camera['id'],
+                          keyframe_interval=camera['keyframe_interval'], deadband=camera['deadband'],
+                          station=camera['station'])
+    idle_policy = None
+    if camera['idle_after']:
+        idle_policy = IdlePolicy(camera['idle_after'], camera['idle_fps'], motion_gate=camera['motion_gate'])
+    fanout_port = camera['fanout_port']
+    outputs = fanout.FanOut({'frames': [udp_address], 'events': [event_address]},
+                            control_address=(fanout.CONTROL_ADDRESS[0], fanout_port) if fanout_port else None)
+
+    processed = 0
+    sent = 0
+    last_sent_empty = False
+    last_sent_ns = 0
+    next_report = time.monotonic() + interval
+    try:
+        while not stop.is_set():
+            success, img, capture_ns = capture.read(timeout=0.5)
+            if not success:
+                if not capture.running:
+                    break  # Camera closed or recording finished
+                continue
+            if idle_policy is not None and not idle_policy.should_infer(img):
+                continue
+
+            outputs.poll()
+            frame = tracker.process(img, capture_ns)
+            processed += 1
+            if idle_policy is not None:
+                idle_policy.update(len(frame['hands']))
+            if frame['events'] is not None:
+                outputs.send_event(frame['events'])
+
+            empty = len(frame['hands']) == 0
+            if not (empty and last_sent_empty and capture_ns - last_sent_ns < EMPTY_FRAME_INTERVAL_NS):
+                outputs.send_frame('frames', frame['data'], frame['sequence'])
+                tracker.record_sent(frame)
+                sent += 1
+                last_sent_empty = empty
+                last_sent_ns = capture_ns
+
+            if time.monotonic() >= next_report:
+                next_report += interval
+                capture_to_send = tracker.metrics.summary().get('capture_to_send', {})
+                report(stats_queue, {'camera': camera['id'], 'frames': processed, 'sent': sent,
+                                     'capture': capture.stats(), 'roi': tracker.roi_stats(),
+                                     'tracks': tracker.tracks.stats(), 'subscribers': len(outputs.subscribers),
+                                     'idle': idle_policy.stats() if idle_policy is not None else None,
+                                     'capture_to_send_p50_ms': capture_to_send.get('p50_ms')})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        capture.release()
+        tracker.close()
+        outputs.close()
+
+
+def start_worker(context, camera, udp_address, event_address, stop, stats_queue, interval):
+    process = context.Process(target=camera_worker, name=f"camera-{camera['id']}",
+                              args=(camera, udp_address, event_address, stop, stats_queue, interval))
+    process.start()
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("config", help="JSON file listing the cameras (see the top of host.py)")
+    parser.add_argument("--stats-interval", type=float, default=STATS_INTERVAL)
+    parser.add_argument("--restart-delay", type=float, default=RESTART_DELAY,
+                        help="seconds before a crashed camera worker is restarted")
+    args = parser.parse_args()
+
+    udp_address, event_address, cameras = load_config(args.config)
+    interval = args.stats_interval
+
+    # spawn, so no worker inherits MediaPipe or camera state from the parent
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    stats_queue = context.Queue(maxsize=64 * len(cameras))
+
+    workers = {}
+    restart_at = {}
+    finished = set()  # Cameras whose worker ended cleanly and is not restarted
+    restarts = {camera['id']: 0 for camera in cameras}
+    for camera in cameras:
+        workers[camera['id']] = start_worker(context, camera, udp_address, event_address, stop, stats_queue,
+                                             interval)
+    print("Started", len(cameras), "camera workers, sending to", udp_address)
+
+    latest = {}
+    next_print = time.monotonic() + interval
+    try:
+        while len(finished) < len(cameras):
+            try:
+                stats = stats_queue.get(timeout=0.5)
+                latest[stats.pop('camera')] = stats
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for camera in cameras:
+                camera_id = camera['id']
+                process = workers[camera_id]
+                if process.is_alive() or camera_id in finished:
+                    continue
+                if process.exitcode == 0 and camera['restart'] != "always":
+                    print(f"Camera {camera_id} worker finished")
+                    finished.add(camera_id)
+                elif camera_id not in restart_at:
+                    print(f"Camera {camera_id} worker exited with code {process.exitcode}, "
+                          f"restarting in {args.restart_delay:.0f} s")
+                    restart_at[camera_id] = now + args.restart_delay
+                elif now >= restart_at[camera_id]:
+                    del restart_at[camera_id]
+                    restarts[camera_id] += 1
+                    workers[camera_id] = start_worker(context, camera, udp_address, event_address, stop,
+                                                      stats_queue, interval)
+
+            if now >= next_print and latest:
+                next_print += interval
+                for camera_id, stats in latest.items():
+                    print(f"{camera_id}: {json.dumps(stats)} restarts={restarts[camera_id]}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for process in workers.values():
+            process.join(timeout=3.0)
+            if process.is_alive():
+                process.terminate()
+        print("Final camera counters:", json.dumps(latest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
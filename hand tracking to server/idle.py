@@ -0,0 +1,113 @@
+import time
+import types
+
+import cv2
+import numpy as np
+
+# Idle / low-power policy for the tracking loops.
+#
+# Stations sit in front of an empty room for hours between sessions. After
+# idle_after frames in a row without a hand, IdlePolicy stops running
+# MediaPipe on every frame and only samples at idle_fps. With the motion gate
+# on, a cheap frame difference on a tiny grayscale copy of the frame decides
+# instead: inference only runs on the frames where something moved (plus one
+# safety sample every max_idle_gap seconds, for a hand held perfectly still).
+# Motion or a detected hand returns to full rate immediately.
+#
+#   idle_policy = IdlePolicy()
+#   if idle_policy.should_infer(frame):
+#       results = hands.process(rgb_frame)
+#   else:
+#       results = NO_HANDS
+#   idle_policy.update(len(results.multi_hand_landmarks or []))
+
+IDLE_AFTER = 90  # Frames without a hand, about 3 s at 30 fps
+IDLE_FPS = 2.0
+MAX_IDLE_GAP = 5.0  # Seconds, longest the motion gate may go without a sample
+
+MOTION_SIZE = (64, 48)  # Frames are compared at this size
+MOTION_PIXEL_DELTA = 25  # Grey levels a pixel must change by to count as moved
+MOTION_AREA = 0.01  # Fraction of moved pixels that counts as motion
+
+# Stands in for MediaPipe results on frames that were not run through the model
+NO_HANDS = types.SimpleNamespace(multi_hand_landmarks=None, multi_handedness=None)
+
+
+# Compares each frame with the previous one at a tiny size
+class MotionDetector:
+    def __init__(self, size=MOTION_SIZE, pixel_delta=MOTION_PIXEL_DELTA, area=MOTION_AREA):
+        self.size = size
+        self.pixel_delta = pixel_delta
+        self.area = area
+        self.previous = None
+
+    def moved(self, img):
+        small = cv2.resize(img, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        previous, self.previous = self.previous, small
+        if previous is None:
+            return False
+        changed = np.count_nonzero(cv2.absdiff(small, previous) > self.pixel_delta)
+        return changed >= self.area * small.size
+
+    def reset(self):
+        self.previous = None
+
+
+class IdlePolicy:
+    def __init__(self, idle_after=IDLE_AFTER, idle_fps=IDLE_FPS, motion_gate=True, max_idle_gap=MAX_IDLE_GAP):
+        self.idle_after = idle_after
+        self.idle_interval = 1.0 / idle_fps
+        self.motion = MotionDetector() if motion_gate else None
+        self.max_idle_gap = max_idle_gap
+
+        self.idle = False
+        self.frames_without_hand = 0
+        self.last_inference = 0.0
+
+        self.frames_skipped = 0
+        self.wakeups = 0  # Times motion ended an idle period
+
+    # Decide whether this frame goes through MediaPipe
+    def should_infer(self, img, now=None):
+        if now is None:
+            now = time.monotonic()
+        if not self.idle:
+            self.last_inference = now
+            return True
+
+        if self.motion is not None:
+            if self.motion.moved(img):
+                self.wake()
+                self.last_inference = now
+                return True
+            due = now - self.last_inference >= self.max_idle_gap
+        else:
+            due = now - self.last_inference >= self.idle_interval
+
+        if due:
+            self.last_inference = now
+            return True
+        self.frames_skipped += 1
+        return False
+
+    # Report how many hands the last inference found
+    def update(self, hand_count):
+        if hand_count:
+            self.frames_without_hand = 0
+            self.idle = False
+            return
+        self.frames_without_hand += 1
+        if self.idle_after and self.frames_without_hand >= self.idle_after and not self.idle:
+            self.idle = True
+            if self.motion is not None:
+                self.motion.reset()
+
+    def wake(self):
+        self.idle = False
+        self.frames_without_hand = 0
+        self.wakeups += 1
+
+    def stats(self):
+        return {'idle': self.idle, 'skipped': self.frames_skipped, 'wakeups': self.wakeups}
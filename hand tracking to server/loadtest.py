@@ -0,0 +1,545 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import delta
+import framing
+import protocol
+import recording
+from gestures import WRIST
+from metrics import RollingHistogram
+
+# Load generator and capacity test for the UDP -> HTTP bridge (bridge.py).
+#
+# Sends landmark frames over UDP as --stations separate stations (each with
+# its own socket, station id and session, like trackers on several machines
+# sharing one bridge) at --rate frames per second each, while --pollers
+# (GET /received-data), --long-pollers (GET /frames?wait=) and --sse-readers
+# (GET /stream, the bridge's push channel) read the stations' endpoints.
+# Frames are synthetic hands (--hands per frame) or a landmark recording
+# (recording.py record-landmarks) played in a loop; together with
+# --encoding they set the payload size.
+#
+# The report (printed, and written to --output) has:
+#   sent      frames and bytes sent, and the rate actually reached
+#   bridge    frames the bridge published per station and the resulting drop
+#             rate, its receive counters (kernel drops, sequence gaps, decode
+#             errors) and the stage latencies of the first station
+#   readers   per kind: requests, frames read, frames missed, errors, response
+#             time and delivery latency (send -> read) percentiles
+#   cpu       CPU used by the sender, the readers and (with --start-bridge, on
+#             Linux) the bridge; close to 1.0 for the sender or the readers
+#             means this tool, not the bridge, was the limit
+#
+# Delivery latency: the sender writes the frame's sequence % MARKERS into the
+# wrist z of the first hand (MediaPipe always reports 0 there) and keeps the
+# send time of each marker in shared memory, so a reader can tell when the
+# frame it got was sent. Frames without hands are not measured, and latencies
+# above MARKERS frames of one station are not told apart.
+#
+# Everything runs on localhost. --start-bridge starts bridge.py on the ports
+# given (extra bridge flags with --bridge-arg), otherwise a bridge must
+# already be listening there.
+#
+#   python loadtest.py --start-bridge --stations 12 --rate 30 --hands 2 \
+#       --sse-readers 24 --pollers 12 --duration 30 --output load.json
+
+HOST = "127.0.0.1"
+
+MARKERS = 256
+MARKER_BASE = 0.1
+MARKER_STEP = 0.003  # Survives float16, the delta quantization and its dead-band
+
+SENDER_STARTUP = 1.0  # Seconds for the sender process to start before the clock runs
+SETTLE = 0.5  # Seconds for the bridge to finish the last frames before the final counters
+BRIDGE_TIMEOUT = 10.0
+RETRY = 0.05  # Seconds before a reader tries a station that does not exist yet again
+LONG_POLL_WAIT = 5.0
+HISTOGRAM_SIZE = 100_000
+
+READER_KINDS = ('poll', 'long_poll', 'sse')
+GAUGES = ('largest_batch',)  # Receiver values reported as they are instead of as a change
+
+
+def station_id(index):
+    return f"load-{index}"
+
+
+# Function to yield (n_hands, 21, 3) arrays forever, from a recording or synthetic
+def frame_source(path, hand_count, seed):
+    if path:
+        replay = recording.LandmarkReplay(path, realtime=False, loop=True)
+        if not len(replay):
+            raise ValueError(f"{path} holds no frames")
+        for _, hands, _ in replay:
+            yield np.array(hands, dtype=np.float32)
+        return
+
+    rng = np.random.default_rng(seed)
+    base = (rng.random((hand_count, protocol.NUM_LANDMARKS, 3)) * 0.5 + 0.25).astype(np.float32)
+    for step in itertools.count():
+        yield base + np.float32(0.05 * np.sin(step * 0.05))  # Slow drift, so delta packets are not empty
+
+
+# Function to build the packet a tracker of station would send
+def encode_frame(hands, sequence, encoding, encoder, station, session):
+    capture_ns = time.monotonic_ns()
+    if encoding == "json":
+        return json.dumps(protocol.packet_to_message({'stop': False, 'hands': hands, 'station': station})).encode()
+    if encoder is not None:
+        return encoder.encode(hands, sequence, capture_ns, station=station, session=session)
+    return protocol.encode_packet(hands, sequence, capture_ns, float16=encoding == "float16", station=station,
+                                  session=session)
+
+
+# Sends the frames of every station, interleaved and paced to the configured rate
+def sender_process(config, sent_ns, results, start_at):
+    stations = config['stations']
+    address = (HOST, config['udp_port'])
+    sockets = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(stations)]
+    encoders = [delta.DeltaEncoder() if config['encoding'] == "delta" else None for _ in range(stations)]
+    sessions = [protocol.new_session() for _ in range(stations)]
+    sources = [frame_source(config['recording'], config['hands'], index) for index in range(stations)]
+
+    interval = 1.0 / (config['rate'] * stations)
+    per_station = [0] * stations
+    sent_bytes = 0
+    late = 0  # Frames sent more than one interval behind schedule
+
+    while time.monotonic() < start_at:
+        time.sleep(0.005)
+    cpu_start = time.process_time()
+    deadline = start_at + config['duration']
+    next_send = time.monotonic()
+    frame = 0
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            break
+        if next_send > now:
+            time.sleep(next_send - now)
+        elif now - next_send > interval:
+            late += 1
+
+        station, sequence = frame % stations, frame // stations
+        hands = next(sources[station])
+        marker = sequence % MARKERS
+        if len(hands):
+            hands[0, WRIST, 2] = MARKER_BASE + marker * MARKER_STEP
+        data = encode_frame(hands, sequence, config['encoding'], encoders[station], station_id(station),
+                            sessions[station])
+        sent_ns[station * MARKERS + marker] = time.monotonic_ns()  # Before sending, so no reader sees it first
+        framing.send_frame(sockets[station], data, address, sequence)
+
+        per_station[station] += 1
+        sent_bytes += len(data)
+        frame += 1
+        next_send += interval
+
+    elapsed = time.monotonic() - start_at
+    for sock in sockets:
+        sock.close()
+    results.put({
+        'frames': frame,
+        'bytes': sent_bytes,
+        'per_station': per_station,
+        'target_fps': config['rate'] * stations,
+        'fps': round(frame / elapsed, 1) if elapsed else None,
+        'bytes_per_frame': round(sent_bytes / frame, 1) if frame else None,
+        'late': late,
+        'cpu': round((time.process_time() - cpu_start) / elapsed, 3) if elapsed else None,
+    })
+
+
+# One keep-alive HTTP/1.1 connection to the bridge
+class Connection:
+    def __init__(self, port):
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(HOST, self.port)
+
+    # Send a GET and read the status line and headers; returns (status, headers)
+    async def request(self, path, headers=None):
+        lines = [f"GET {path} HTTP/1.1", f"Host: {HOST}:{self.port}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Bridge closed the connection")
+        status = int(status_line.split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        return status, response_headers
+
+    async def read_body(self, headers):
+        return await self.reader.readexactly(int(headers.get("content-length", 0)))
+
+    async def get(self, path, headers=None):
+        status, response_headers = await self.request(path, headers)
+        return status, response_headers, await self.read_body(response_headers)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+# Counters shared by every reader of one kind
+class ReaderStats:
+    def __init__(self):
+        self.readers = 0
+        self.requests = 0
+        self.frames = 0
+        self.missed = 0  # Frames the bridge published that the reader never got (SSE and long-poll)
+        self.not_found = 0  # Requests made before the station's first frame arrived
+        self.errors = 0
+        self.response = RollingHistogram(HISTOGRAM_SIZE)
+        self.delivery = RollingHistogram(HISTOGRAM_SIZE)
+
+    def summary(self):
+        return {
+            'readers': self.readers,
+            'requests': self.requests,
+            'frames': self.frames,
+            'missed': self.missed,
+            'not_found': self.not_found,
+            'errors': self.errors,
+            'response': self.response.summary(),
+            'delivery': self.delivery.summary(),
+        }
+
+
+# Function to record how long ago the frame in message was sent, from its marker
+def record_delivery(stats, message, station, sent_ns, received_ns):
+    hands = message.get('hands') if isinstance(message, dict) else None
+    if not hands:
+        return
+    marker = round((hands[0]['landmarks'][WRIST]['z'] - MARKER_BASE) / MARKER_STEP)
+    if not 0 <= marker < MARKERS:
+        return
+    sent = sent_ns[station * MARKERS + marker]
+    if sent and received_ns >= sent:
+        stats.delivery.add((received_ns - sent) / 1e9)
+
+
+# GET /received-data every interval seconds, with If-None-Match like a polling game
+async def poller(stats, port, station, sent_ns, interval):
+    path = f"/stations/{station_id(station)}/received-data"
+    etag = None
+    while True:
+        connection = Connection(port)
+        try:
+            await connection.open()
+            while True:
+                start = time.perf_counter()
+                status, headers, body = await connection.get(path, {"If-None-Match": etag} if etag else None)
+                received_ns = time.monotonic_ns()
+                stats.requests += 1
+                stats.response.add(time.perf_counter() - start)
+                if status == 200:
+                    etag = headers.get("etag")
+                    stats.frames += 1
+                    record_delivery(stats, json.loads(body), station, sent_ns, received_ns)
+                elif status == 404:
+                    stats.not_found += 1
+                elif status != 304:
+                    stats.errors += 1
+                await asyncio.sleep(max(0.0, interval - (time.perf_counter() - start)))
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            await asyncio.sleep(RETRY)
+        finally:
+            connection.close()
+
+
+# GET /frames?since=<cursor>&wait=..., picking up every frame in order like a long-polling client
+async def long_poller(stats, port, station, sent_ns):
+    prefix = f"/stations/{station_id(station)}"
+    cursor = None
+    while True:
+        connection = Connection(port)
+        try:
+            await connection.open()
+            while cursor is None:
+                # A cursor beyond the newest frame returns only latest_seq, so reading starts there
+                status, _, body = await connection.get(f"{prefix}/frames?since={2 ** 62}")
+                if status == 200:
+                    cursor = json.loads(body)['latest_seq']
+                else:
+                    stats.not_found += 1
+                    await asyncio.sleep(RETRY)
+
+            while True:
+                start = time.perf_counter()
+                status, _, body = await connection.get(f"{prefix}/frames?since={cursor}&wait={LONG_POLL_WAIT}")
+                received_ns = time.monotonic_ns()
+                stats.requests += 1
+                stats.response.add(time.perf_counter() - start)
+                if status != 200:
+                    stats.errors += 1
+                    continue
+                batch = json.loads(body)
+                stats.missed += batch['missed']
+                for frame in batch['frames']:
+                    stats.frames += 1
+                    record_delivery(stats, frame['data'], station, sent_ns, received_ns)
+                if batch['frames']:
+                    cursor = batch['frames'][-1]['seq']
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            await asyncio.sleep(RETRY)
+        finally:
+            connection.close()
+
+
+# GET /stream, reading the pushed frames as they come; reconnects when the bridge disconnects it
+async def sse_reader(stats, port, station, sent_ns, queue, policy):
+    path = f"/stations/{station_id(station)}/stream?queue={queue}&policy={policy}"
+    while True:
+        connection = Connection(port)
+        try:
+            await connection.open()
+            status, headers = await connection.request(path)
+            stats.requests += 1
+            if status != 200:
+                await connection.read_body(headers)
+                if status == 404:
+                    stats.not_found += 1
+                else:
+                    stats.errors += 1
+                await asyncio.sleep(RETRY)
+                continue
+
+            last_id = None
+            event_id = None
+            while True:
+                line = await connection.reader.readline()
+                if not line:
+                    break  # Disconnected, e.g. by the disconnect policy
+                if line.startswith(b"id: "):
+                    event_id = int(line[4:])
+                elif line.startswith(b"data: "):
+                    received_ns = time.monotonic_ns()
+                    stats.frames += 1
+                    if last_id is not None and event_id > last_id + 1:
+                        stats.missed += event_id - last_id - 1
+                    last_id = event_id
+                    record_delivery(stats, json.loads(line[6:]), station, sent_ns, received_ns)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            stats.errors += 1
+            await asyncio.sleep(RETRY)
+        finally:
+            connection.close()
+
+
+# Function to read the bridge's /stats and /stations
+async def snapshot(port):
+    connection = Connection(port)
+    try:
+        await connection.open()
+        _, _, stats = await connection.get("/stats")
+        _, _, stations = await connection.get("/stations")
+        return json.loads(stats), json.loads(stations)
+    finally:
+        connection.close()
+
+
+async def wait_for_bridge(port, timeout):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return await snapshot(port)
+        except OSError:
+            if time.monotonic() >= deadline:
+                raise
+            await asyncio.sleep(0.2)
+
+
+# Function to subtract the counters of before from after (counters missing from before count from 0)
+def counter_changes(after, before):
+    changes = {}
+    for key, value in after.items():
+        if key in GAUGES:
+            changes[key] = value
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            previous = before.get(key)
+            changes[key] = value - previous if isinstance(previous, (int, float)) else value
+    return changes
+
+
+# Function to read the CPU seconds a process has used so far; None where /proc is not available
+def process_cpu_seconds(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as file:
+            fields = file.read().rpartition(")")[2].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")  # utime + stime
+
+
+def start_bridge(args):
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "bridge.py"),
+               "--udp-port", str(args.udp_port), "--events-port", str(args.events_port),
+               "--http-port", str(args.http_port), "--log-level", "WARNING", *args.bridge_arg]
+    return subprocess.Popen(command)
+
+
+async def run(args, bridge_pid=None):
+    before_stats, before_stations = await wait_for_bridge(args.http_port, BRIDGE_TIMEOUT)
+    bridge_cpu = process_cpu_seconds(bridge_pid) if bridge_pid is not None else None
+
+    context = multiprocessing.get_context("spawn")
+    sent_ns = context.Array('q', args.stations * MARKERS, lock=False)
+    results = context.Queue()
+    config = {'stations': args.stations, 'rate': args.rate, 'hands': args.hands, 'encoding': args.encoding,
+              'recording': args.recording, 'duration': args.duration, 'udp_port': args.udp_port}
+    start_at = time.monotonic() + SENDER_STARTUP
+    sender = context.Process(target=sender_process, name="sender", args=(config, sent_ns, results, start_at))
+    sender.start()
+
+    readers = {kind: ReaderStats() for kind in READER_KINDS}
+    tasks = []
+    for index in range(args.pollers):
+        tasks.append(poller(readers['poll'], args.http_port, index % args.stations, sent_ns, args.poll_interval))
+    for index in range(args.long_pollers):
+        tasks.append(long_poller(readers['long_poll'], args.http_port, index % args.stations, sent_ns))
+    for index in range(args.sse_readers):
+        tasks.append(sse_reader(readers['sse'], args.http_port, index % args.stations, sent_ns, args.sse_queue,
+                                args.sse_policy))
+    readers['poll'].readers, readers['long_poll'].readers = args.pollers, args.long_pollers
+    readers['sse'].readers = args.sse_readers
+    tasks = [asyncio.create_task(task) for task in tasks]
+
+    cpu_start = time.process_time()
+    await asyncio.sleep(max(0.0, start_at + args.duration - time.monotonic()))
+    wall = args.duration + SENDER_STARTUP
+    readers_cpu = (time.process_time() - cpu_start) / wall
+    if bridge_cpu is not None:
+        bridge_cpu = (process_cpu_seconds(bridge_pid) - bridge_cpu) / wall
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    sent = await asyncio.to_thread(results.get, True, BRIDGE_TIMEOUT)
+    sender.join()
+    await asyncio.sleep(SETTLE)
+    after_stats, after_stations = await snapshot(args.http_port)
+
+    stations = {}
+    published = 0
+    for index in range(args.stations):
+        station = station_id(index)
+        prefix = f"/stations/{station}"
+        received = after_stations.get(station, {}).get(prefix, {}).get('frames_received', 0)
+        received -= before_stations.get(station, {}).get(prefix, {}).get('frames_received', 0)
+        stations[station] = {'sent': sent['per_station'][index], 'published': received}
+        published += received
+
+    stages = {}
+    _, _, body = await get_once(args.http_port, f"/stations/{station_id(0)}/metrics")
+    if body:
+        stages = json.loads(body).get('stages', {})
+
+    return {
+        'sent': {key: value for key, value in sent.items() if key not in ('per_station', 'cpu')},
+        'bridge': {
+            'published': published,
+            'drop_rate': round(1 - published / sent['frames'], 4) if sent['frames'] else None,
+            'stations': stations,
+            'receiver': counter_changes(after_stats.get('receiver', {}), before_stats.get('receiver', {})),
+            'decode_errors': after_stats['decode_errors'] - before_stats['decode_errors'],
+            'streams_rejected': after_stats['streams_rejected'] - before_stats['streams_rejected'],
+            'stages': stages,
+        },
+        'readers': {kind: stats.summary() for kind, stats in readers.items() if stats.readers},
+        'cpu': {'sender': sent['cpu'], 'readers': round(readers_cpu, 3),
+                'bridge': round(bridge_cpu, 3) if bridge_cpu is not None else None},
+    }
+
+
+# Function for a single request on its own connection; (status, headers, body), all None when it fails
+async def get_once(port, path):
+    connection = Connection(port)
+    try:
+        await connection.open()
+        return await connection.get(path)
+    except (OSError, asyncio.IncompleteReadError, ValueError):
+        return None, None, None
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stations", type=int, default=4, help="stations sending at the same time")
+    parser.add_argument("--rate", type=float, default=30.0, help="frames per second per station")
+    parser.add_argument("--hands", type=int, default=2, help="hands per synthetic frame")
+    parser.add_argument("--encoding", choices=("float32", "float16", "json", "delta"), default="float32")
+    parser.add_argument("--recording", help="landmark recording to send instead of synthetic hands")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of sending")
+    parser.add_argument("--pollers", type=int, default=0, help="clients polling GET /received-data")
+    parser.add_argument("--poll-interval", type=float, default=1 / 30)
+    parser.add_argument("--long-pollers", type=int, default=0, help="clients long-polling GET /frames")
+    parser.add_argument("--sse-readers", type=int, default=0, help="clients reading GET /stream")
+    parser.add_argument("--sse-queue", type=int, default=8, help="per-client queue length asked of the bridge")
+    parser.add_argument("--sse-policy", choices=("drop_oldest", "disconnect"), default="drop_oldest")
+    parser.add_argument("--udp-port", type=int, default=5052)
+    parser.add_argument("--events-port", type=int, default=5053)
+    parser.add_argument("--http-port", type=int, default=5000)
+    parser.add_argument("--start-bridge", action="store_true", help="start bridge.py on the ports above")
+    parser.add_argument("--bridge-arg", action="append", default=[], metavar="FLAG",
+                        help="extra bridge.py flag with --start-bridge, repeatable (e.g. --bridge-arg=--latest-only)")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+    args = parser.parse_args()
+    if args.stations < 1 or args.rate <= 0:
+        parser.error("--stations and --rate must be positive")
+
+    bridge = start_bridge(args) if args.start_bridge else None
+    try:
+        report = asyncio.run(run(args, bridge.pid if bridge is not None else None))
+    except KeyboardInterrupt:
+        return
+    finally:
+        if bridge is not None:
+            bridge.terminate()
+            bridge.wait(timeout=5)
+
+    report = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        **report,
+    }
+    print(json.dumps(report, indent=4))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=4)
+        print(f"Report written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
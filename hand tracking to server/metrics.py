@@ -0,0 +1,92 @@
+import json
+import logging
+import time
+from collections import deque
+
+# Rolling latency statistics for the tracker -> bridge pipeline.
+# Each stage keeps its most recent samples and reports p50/p95/p99 over them,
+# so the numbers follow the current load instead of averaging over all time.
+#
+# RateLimitedLog is for messages that can happen on every frame (decode
+# errors, packet loss): one JSON line per kind of message at most every few
+# seconds, so logging can never become the thing that falls behind.
+
+PERCENTILES = (50, 95, 99)
+
+LOG_INTERVAL = 5.0  # Seconds between two lines for the same key
+
+
+class RollingHistogram:
+    def __init__(self, size=1024):
+        self.samples = deque(maxlen=size)
+        self.count = 0  # All samples ever recorded, not just the ones in the window
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+
+    # Function to summarise the window in milliseconds
+    def summary(self):
+        if not self.samples:
+            return {'count': self.count}
+
+        ordered = sorted(self.samples)
+        result = {'count': self.count}
+        for p in PERCENTILES:
+            index = min(len(ordered) - 1, int(p / 100 * len(ordered)))
+            result[f'p{p}_ms'] = round(ordered[index] * 1000, 3)
+        result['max_ms'] = round(ordered[-1] * 1000, 3)
+        return result
+
+
+class LatencyMetrics:
+    def __init__(self, window=1024):
+        self.window = window
+        self.stages = {}
+
+    def record(self, stage, seconds):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = RollingHistogram(self.window)
+        histogram.add(seconds)
+
+    # Same as record() for a pair of time.monotonic_ns() / time.perf_counter_ns() readings
+    def record_ns(self, stage, start_ns, end_ns):
+        self.record(stage, (end_ns - start_ns) / 1e9)
+
+    def summary(self):
+        return {stage: histogram.summary() for stage, histogram in self.stages.items()}
+
+
+# Structured log lines, one JSON object each: {"event": ..., **fields}.
+# Lines with the same key (the event name unless given) are let through at
+# most once per interval; the ones held back are counted and reported as
+# "suppressed" on the next line that gets through.
+class RateLimitedLog:
+    def __init__(self, name, interval=LOG_INTERVAL):
+        self.logger = logging.getLogger(name)
+        self.interval = interval
+        self.last_logged = {}  # key -> time.monotonic() of its last line
+        self.suppressed = {}  # key -> lines held back since then
+
+    def log(self, event, level=logging.INFO, key=None, **fields):
+        if key is None:
+            key = event
+        now = time.monotonic()
+        last = self.last_logged.get(key)
+        if last is not None and now - last < self.interval:
+            self.suppressed[key] = self.suppressed.get(key, 0) + 1
+            return
+        self.last_logged[key] = now
+
+        record = {'event': event, **fields}
+        suppressed = self.suppressed.pop(key, 0)
+        if suppressed:
+            record['suppressed'] = suppressed
+        self.logger.log(level, json.dumps(record, default=str))
+
+    def info(self, event, **fields):
+        self.log(event, logging.INFO, **fields)
+
+    def warning(self, event, **fields):
+        self.log(event, logging.WARNING, **fields)
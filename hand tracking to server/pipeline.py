@@ -0,0 +1,342 @@
+import argparse
+import json
+import multiprocessing
+import queue
+import time
+
+import delta
+import fanout
+import protocol
+import shared_ring
+from metrics import RollingHistogram
+
+# Multi-process version of check.py.
+#
+# Capture, inference, emission and the optional preview each run in their
+# own process, so drawing, JSON and socket work no longer compete with
+# MediaPipe for one interpreter and the stages spread over the cores:
+#
+#   capture    camera -> frame ring (shared memory, newest frame wins)
+#   inference  frame ring -> HandTracker -> landmark ring (shared_ring.py)
+#   emission   landmark ring -> packets to the bridge over UDP, plus gesture events
+#   preview    frame ring + landmark ring -> debug window (--preview)
+#
+# Frames and landmarks pass through shared memory only. Every stage reports
+# its counters and queue depth (items written but not yet picked up) to the
+# parent, which prints one line per --stats-interval. The landmark ring is
+# the same one check.py --shm writes, so a bridge on this host can also read
+# it with --shm instead of UDP. --fanout, --multicast, --station and
+# --bridge-host work as in check.py.
+#
+#   python pipeline.py --source 0 --preview
+
+FRAME_RING = "hand_tracking_frames"
+UDP_ADDRESS = ("127.0.0.1", 5052)
+EVENT_ADDRESS = ("127.0.0.1", 5053)
+
+# Frames without hands are only repeated this often while nothing changes
+EMPTY_FRAME_INTERVAL_NS = 1_000_000_000
+
+
+# Function to wait for another stage to be ready; False if the pipeline is stopping instead
+def wait_ready(event, stop):
+    while not event.wait(0.1):
+        if stop.is_set():
+            return False
+    return True
+
+
+def report(stats_queue, stats):
+    try:
+        stats_queue.put_nowait(stats)
+    except queue.Full:
+        pass  # The parent is behind, the next report replaces this one
+
+
+def capture_stage(source, frame_ring, force, frames_ready, stop, stats_queue, interval):
+    from capture import open_source  # Only the capture process needs the camera
+
+    capture = open_source(source).start()
+    ring = None
+    next_report = time.monotonic() + interval
+    try:
+        while not stop.is_set():
+            success, frame, capture_ns = capture.read(timeout=0.5)
+            if not success:
+                if not capture.running:
+                    break  # Camera closed or recording finished
+                continue
+
+            if ring is None:
+                ring = shared_ring.FrameRingWriter(frame_ring, frame.shape, force=force)
+                frames_ready.set()
+            ring.write(frame, capture_ns)
+
+            if time.monotonic() >= next_report:
+                next_report += interval
+                report(stats_queue, {'stage': 'capture', **capture.stats()})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        capture.release()
+        if ring is not None:
+            ring.close()
+
+
+def inference_stage(config, frame_ring, landmark_ring, events_queue, frames_ready, landmarks_ready, stop,
+                    stats_queue, interval):
+    from tracker import HandTracker  # MediaPipe is only loaded in this process
+
+    if not wait_ready(frames_ready, stop):
+        return
+    frames = shared_ring.FrameRingReader(frame_ring)
+    tracker = HandTracker(config['encoding'], config['max_hands'], config['model_complexity'],
+                          gesture_events=not config['per_frame_stop'], roi=config['roi'], station=config['station'],
+                          session=config['session'])
+    ring = shared_ring.RingWriter(landmark_ring, max_hands=config['max_hands'], force=config['shm_force'])
+    landmarks_ready.set()
+
+    depth = RollingHistogram(256)
+    processed = 0
+    next_report = time.monotonic() + interval
+    try:
+        while not stop.is_set():
+            depth.add(frames.depth())
+            item = frames.wait_latest(timeout=0.1)
+            if item is None:
+                if frames.writer_closed:
+                    break
+                continue
+
+            _, capture_ns, img = item
+            frame = tracker.process(img, capture_ns, encode=False)  # The emission stage builds the packets
+            ring.write(frame['hands'], capture_ns, frame['stop'], frame['track_ids'], frame['track_ages'])
+            if frame['events'] is not None:
+                try:
+                    events_queue.put_nowait(frame['events'])
+                except queue.Full:
+                    pass
+            processed += 1
+
+            if time.monotonic() >= next_report:
+                next_report += interval
+                inference = tracker.metrics.summary().get('inference', {})
+                report(stats_queue, {'stage': 'inference', 'frames': processed, 'skipped': frames.frames_skipped,
+                                     'depth_max': int(max(depth.samples, default=0)),
+                                     'inference_p50_ms': inference.get('p50_ms')})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        tracker.close()
+        frames.close()
+        ring.close()
+
+
+# Function to build the packet check.py would send for one landmark ring record
+def encode_frame(frame, encoding, delta_encoder=None, station=None, session=0):
+    if encoding == "json":
+        return json.dumps(protocol.packet_to_message({**frame, 'station': station})).encode()
+    if delta_encoder is not None:
+        return delta_encoder.encode(frame['hands'], frame['sequence'], frame['capture_ns'], stop=frame['stop'],
+                                    track_ids=frame['track_ids'], track_ages=frame['track_ages'],
+                                    station=station, session=session)
+    return protocol.encode_packet(frame['hands'], frame['sequence'], frame['capture_ns'], stop=frame['stop'],
+                                  float16=encoding == "float16", track_ids=frame['track_ids'],
+                                  track_ages=frame['track_ages'], station=station, session=session)
+
+
+def emission_stage(encoding, send_landmarks, landmark_ring, events_queue, landmarks_ready, stop, stats_queue,
+                   interval, fanout_port=None, multicast=None, station=None, session=0,
+                   bridge_host=UDP_ADDRESS[0]):
+    if not wait_ready(landmarks_ready, stop):
+        return
+    landmarks = shared_ring.RingReader(landmark_ring)
+    targets = {'frames': [(bridge_host, UDP_ADDRESS[1])], 'events': [(bridge_host, EVENT_ADDRESS[1])]}
+    outputs = fanout.FanOut(targets,
+                            control_address=(fanout.CONTROL_ADDRESS[0], fanout_port) if fanout_port else None,
+                            multicast=multicast)
+    delta_encoder = delta.DeltaEncoder() if encoding == "delta" else None
+
+    capture_to_send = RollingHistogram(1024)
+    depth = RollingHistogram(256)
+    sent = 0
+    events_sent = 0
+    last_sent_empty = False
+    last_sent_ns = 0
+    next_report = time.monotonic() + interval
+    try:
+        while not stop.is_set():
+            landmarks.wait(timeout=0.05)
+            outputs.poll()
+            depth.add(landmarks.depth())
+            for frame in landmarks.read_new():
+                empty = len(frame['hands']) == 0
+                if not send_landmarks or (empty and last_sent_empty
+                                          and frame['capture_ns'] - last_sent_ns < EMPTY_FRAME_INTERVAL_NS):
+                    continue
+                outputs.send_frame('frames', encode_frame(frame, encoding, delta_encoder, station, session),
+                                   frame['sequence'])
+                capture_to_send.add((time.monotonic_ns() - frame['capture_ns']) / 1e9)
+                sent += 1
+                last_sent_empty = empty
+                last_sent_ns = frame['capture_ns']
+
+            while True:
+                try:
+                    outputs.send_event(events_queue.get_nowait())
+                    events_sent += 1
+                except queue.Empty:
+                    break
+
+            if time.monotonic() >= next_report:
+                next_report += interval
+                latency = capture_to_send.summary()
+                report(stats_queue, {'stage': 'emission', 'sent': sent, 'events': events_sent,
+                                     'missed': landmarks.frames_missed,
+                                     'depth_max': int(max(depth.samples, default=0)),
+                                     'capture_to_send_p50_ms': latency.get('p50_ms'),
+                                     'capture_to_send_p99_ms': latency.get('p99_ms'),
+                                     'subscribers': {name: s['frames'] for name, s in
+                                                     outputs.stats()['subscribers'].items()}})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        landmarks.close()
+        outputs.close()
+
+
+def preview_stage(frame_ring, landmark_ring, fps_limit, scale, frames_ready, landmarks_ready, stop, stats_queue,
+                  interval):
+    import cv2
+    from preview import draw_hand_array
+
+    if not wait_ready(frames_ready, stop) or not wait_ready(landmarks_ready, stop):
+        return
+    frames = shared_ring.FrameRingReader(frame_ring)
+    landmarks = shared_ring.RingReader(landmark_ring)
+
+    hands = []
+    shown = 0
+    last_shown = 0.0
+    next_report = time.monotonic() + interval
+    try:
+        while not stop.is_set():
+            # The newest landmarks go with whatever frame is shown, like a live overlay
+            for frame in landmarks.read_new():
+                hands = frame['hands']
+
+            if time.monotonic() - last_shown >= 1.0 / fps_limit:
+                item = frames.read_latest()
+                if item is not None:
+                    img = cv2.flip(item[2], 1)
+                    if scale != 1:
+                        img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+                    now = time.monotonic()
+                    draw_hand_array(img, hands, 1.0 / (now - last_shown) if last_shown else None)
+                    cv2.imshow("Preview", img)
+                    last_shown = now
+                    shown += 1
+
+            if cv2.waitKey(5) & 0xFF == ord('q'):
+                stop.set()
+
+            if time.monotonic() >= next_report:
+                next_report += interval
+                report(stats_queue, {'stage': 'preview', 'shown': shown, 'skipped': frames.frames_skipped})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cv2.destroyAllWindows()
+        frames.close()
+        landmarks.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--source", default="0",
+                        help="camera index, video file or frame recording directory (see recording.py)")
+    parser.add_argument("--encoding", choices=("float32", "float16", "json", "delta"), default="float32")
+    parser.add_argument("--max-hands", type=int, default=2)
+    parser.add_argument("--model-complexity", type=int, choices=[0, 1], default=1)
+    parser.add_argument("--roi", action="store_true", help="crop inference around the previous hands")
+    parser.add_argument("--per-frame-stop", action="store_true",
+                        help="old behaviour: STOP packets instead of gesture events")
+    parser.add_argument("--preview", action="store_true", help="show a debug window from its own process")
+    parser.add_argument("--preview-fps", type=float, default=10)
+    parser.add_argument("--preview-scale", type=float, default=0.5)
+    parser.add_argument("--shm", default=shared_ring.DEFAULT_NAME, help="name of the landmark ring")
+    parser.add_argument("--shm-force", action="store_true",
+                        help="replace the frame and landmark rings even if another running pipeline is writing them")
+    parser.add_argument("--no-udp", action="store_true",
+                        help="only publish landmarks to the ring (gesture events still go over UDP)")
+    parser.add_argument("--fanout", nargs="?", const=fanout.CONTROL_ADDRESS[1], default=None, type=int,
+                        metavar="PORT", help="accept subscribers for the frame and event datagrams on this port")
+    parser.add_argument("--multicast", default=None, metavar="GROUP[:PORT]",
+                        help="also send landmark frames to this multicast group")
+    parser.add_argument("--station", default=None,
+                        help="tag frames and events with this station id, for a bridge shared by several stations")
+    parser.add_argument("--bridge-host", default=UDP_ADDRESS[0], help="host running bridge.py")
+    parser.add_argument("--stats-interval", type=float, default=5.0)
+    args = parser.parse_args()
+
+    # spawn, so no child inherits MediaPipe or camera state from the parent
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    frames_ready = context.Event()
+    landmarks_ready = context.Event()
+    stats_queue = context.Queue(maxsize=64)
+    events_queue = context.Queue(maxsize=256)
+    interval = args.stats_interval
+
+    config = {'encoding': args.encoding, 'max_hands': args.max_hands, 'model_complexity': args.model_complexity,
+              'roi': args.roi, 'per_frame_stop': args.per_frame_stop, 'station': args.station,
+              'shm_force': args.shm_force,
+              'session': protocol.new_session()}  # One session for the events and the frames of this run
+    processes = [
+        context.Process(target=capture_stage, name="capture",
+                        args=(args.source, FRAME_RING, args.shm_force, frames_ready, stop, stats_queue, interval)),
+        context.Process(target=inference_stage, name="inference",
+                        args=(config, FRAME_RING, args.shm, events_queue, frames_ready, landmarks_ready, stop,
+                              stats_queue, interval)),
+        context.Process(target=emission_stage, name="emission",
+                        args=(args.encoding, not args.no_udp, args.shm, events_queue, landmarks_ready, stop,
+                              stats_queue, interval, args.fanout,
+                              fanout.parse_multicast(args.multicast, UDP_ADDRESS[1]) if args.multicast else None,
+                              args.station, config['session'], args.bridge_host)),
+    ]
+    if args.preview:
+        processes.append(context.Process(target=preview_stage, name="preview",
+                                         args=(FRAME_RING, args.shm, args.preview_fps, args.preview_scale,
+                                               frames_ready, landmarks_ready, stop, stats_queue, interval)))
+    for process in processes:
+        process.start()
+
+    latest = {}
+    next_print = time.monotonic() + interval
+    try:
+        while not stop.is_set():
+            try:
+                stats = stats_queue.get(timeout=0.5)
+                latest[stats.pop('stage')] = stats
+            except queue.Empty:
+                pass
+            if any(not process.is_alive() for process in processes):
+                break  # A stage exited or crashed, take the rest down with it
+            if time.monotonic() >= next_print and latest:
+                next_print += interval
+                print(" | ".join(f"{stage} {json.dumps(stats)}" for stage, stats in latest.items()))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for process in processes:
+            process.join(timeout=3.0)
+            if process.is_alive():
+                process.terminate()
+        print("Final stage counters:", json.dumps(latest, indent=2))
+
+
+if __name__ == '__main__':
+    main()
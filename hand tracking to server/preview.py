@@ -0,0 +1,99 @@
+import threading
+
+import cv2
+import mediapipe as mp
+
+mpHands = mp.solutions.hands
+mpDraw = mp.solutions.drawing_utils
+
+FINGERTIP_IDS = [4, 8, 12, 16, 20]
+
+
+# Function to draw fingertips and hand connections onto a BGR image
+def draw_hands(img, multi_hand_landmarks, fps=None):
+    h, w, c = img.shape
+    radius = max(3, int(15 * w / 640))
+    for handLms in multi_hand_landmarks or []:
+        for id, lm in enumerate(handLms.landmark):
+            if id in FINGERTIP_IDS:
+                cx, cy = int(lm.x * w), int(lm.y * h)
+                cv2.circle(img, (cx, cy), radius, (255, 0, 255), cv2.FILLED)
+        mpDraw.draw_landmarks(img, handLms, mpHands.HAND_CONNECTIONS)
+
+    if fps is not None:
+        cv2.putText(img, str(int(fps)), (10, 70), cv2.FONT_HERSHEY_PLAIN, 3, (255, 0, 255), 3)
+
+
+# Function to draw the same picture from an (n_hands, 21, 3) landmark array,
+# for processes that get the landmarks from shared memory instead of MediaPipe
+def draw_hand_array(img, hands, fps=None):
+    h, w, c = img.shape
+    radius = max(3, int(15 * w / 640))
+    for hand in hands:
+        points = [(int(x * w), int(y * h)) for x, y, _ in hand.tolist()]
+        for start, end in mpHands.HAND_CONNECTIONS:
+            cv2.line(img, points[start], points[end], (224, 224, 224), 2)
+        for id in FINGERTIP_IDS:
+            cv2.circle(img, points[id], radius, (255, 0, 255), cv2.FILLED)
+
+    if fps is not None:
+        cv2.putText(img, str(int(fps)), (10, 70), cv2.FONT_HERSHEY_PLAIN, 3, (255, 0, 255), 3)
+
+
+# Debug preview for headless mode.
+# The tracker offers every frame; only every Nth one is kept (single slot, newest wins)
+# and a separate thread scales it down, draws it and shows it, so none of the
+# drawing or GUI work runs on the tracking loop.
+class PreviewWindow:
+    def __init__(self, every=5, scale=0.5, window_name="Preview"):
+        self.every = max(1, every)
+        self.scale = scale
+        self.window_name = window_name
+
+        self.offered = 0
+        self.pending = None
+        self.condition = threading.Condition()
+        self.quit_requested = False  # Set when 'q' is pressed in the preview window
+
+        self.running = False
+        self.thread = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    # Called from the tracking loop; costs a counter increment on skipped frames
+    def offer(self, img, multi_hand_landmarks, fps=None):
+        self.offered += 1
+        if self.offered % self.every:
+            return
+        with self.condition:
+            self.pending = (img, multi_hand_landmarks, fps)
+            self.condition.notify()
+
+    def _run(self):
+        while self.running:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending is not None or not self.running, 0.1)
+                item, self.pending = self.pending, None
+
+            if item is not None:
+                img, multi_hand_landmarks, fps = item
+                if self.scale != 1:
+                    img = cv2.resize(img, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+                draw_hands(img, multi_hand_landmarks, fps)
+                cv2.imshow(self.window_name, img)
+
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                self.quit_requested = True
+
+        cv2.destroyWindow(self.window_name)
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
@@ -0,0 +1,253 @@
+import os
+import struct
+import time
+
+import numpy as np
+
+# Binary landmark packet sent from the tracker to the bridge.
+#
+# Header (little endian, 20 bytes):
+#   magic       4s  b'BOBO'
+#   version     B   PROTOCOL_VERSION
+#   flags       B   FLAG_FLOAT16 / FLAG_STOP / FLAG_TIMING / FLAG_CAMERA / FLAG_STATION / FLAG_TRACKS
+#   hand_count  B   number of hands that follow
+#   (pad)       x
+#   sequence    I   frame counter, wraps at 2**32
+#   capture_ns  Q   time.monotonic_ns() when the camera frame was read
+#
+# Timing block (only with FLAG_TIMING, 24 bytes):
+#   send_ns     Q   time.monotonic_ns() when the packet was built
+#   4 x I       microseconds spent in each of TIMING_STAGES for this frame
+#
+# Camera block (only with FLAG_CAMERA, 1 + length bytes):
+#   length      B   length of the camera id
+#   camera      UTF-8 id of the camera that produced the frame (host.py)
+#
+# Station block (only with FLAG_STATION, 1 + length + 4 bytes):
+#   length      B   length of the station id
+#   station     UTF-8 id of the station (the machine the tracker runs on)
+#   session     I   random number picked when the tracker started, so a restart is recognised
+#
+# Track block (only with FLAG_TRACKS, hand_count * 6 bytes):
+#   hand_count x I  stable track id of each hand (tracks.py)
+#   hand_count x H  frames each track has existed for (its lifetime counter, capped at 65535)
+#
+# Body: hand_count * 21 * 3 float32 (or float16 with FLAG_FLOAT16) values,
+# in (hand, landmark, xyz) order.
+
+MAGIC = b'BOBO'
+PROTOCOL_VERSION = 2  # 2: no encode stage in the timing block
+
+FLAG_FLOAT16 = 0x01
+FLAG_STOP = 0x02
+FLAG_TIMING = 0x04
+FLAG_CAMERA = 0x08
+FLAG_TRACKS = 0x10
+FLAG_STATION = 0x20
+
+NUM_LANDMARKS = 21
+
+HEADER = struct.Struct('<4sBBBxIQ')
+TIMING = struct.Struct('<Q4I')
+SESSION = struct.Struct('<I')
+
+# Tracker stages carried in the timing block, in order:
+#   wait       camera read -> frame picked up by the tracker
+#   convert    flip + BGR -> RGB
+#   inference  hands.process
+#   gesture    gesture classification
+# Encoding is not among them: it is still running while the block is built,
+# so the tracker only records it in its own metrics (like send).
+TIMING_STAGES = ('wait', 'convert', 'inference', 'gesture')
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+# Function to turn MediaPipe multi_hand_landmarks into an (n_hands, 21, 3) array
+def landmarks_to_array(multi_hand_landmarks):
+    if not multi_hand_landmarks:
+        return np.zeros((0, NUM_LANDMARKS, 3), dtype=np.float32)
+    return np.array([[(lm.x, lm.y, lm.z) for lm in hand.landmark] for hand in multi_hand_landmarks],
+                    dtype=np.float32)
+
+
+def is_binary_packet(data):
+    return data[:4] == MAGIC
+
+
+# Function to build one packet from an (n_hands, 21, 3) array.
+# timings is an optional dict of TIMING_STAGES -> nanoseconds spent in that stage,
+# camera an optional id of the camera the frame came from, track_ids and
+# track_ages optional per-hand track ids and lifetimes (tracks.py), station
+# and session the optional id of the station and the tracker's session number.
+def encode_packet(hands, sequence, capture_ns, stop=False, float16=False, timings=None, camera=None,
+                  track_ids=None, track_ages=None, station=None, session=0):
+    body = np.asarray(hands, dtype='<f2' if float16 else '<f4')
+    flags = block_flags(stop, timings, camera, track_ids, station)
+    if float16:
+        flags |= FLAG_FLOAT16
+
+    header = HEADER.pack(MAGIC, PROTOCOL_VERSION, flags, len(body), sequence & 0xFFFFFFFF, capture_ns)
+    return (header + encode_blocks(len(body), timings, camera, track_ids, track_ages, station, session)
+            + body.tobytes())
+
+
+# Function to pick the flags for the optional blocks (shared with delta.py)
+def block_flags(stop=False, timings=None, camera=None, track_ids=None, station=None):
+    flags = 0
+    if stop:
+        flags |= FLAG_STOP
+    if timings is not None:
+        flags |= FLAG_TIMING
+    if camera is not None:
+        flags |= FLAG_CAMERA
+    if track_ids is not None:
+        flags |= FLAG_TRACKS
+    if station is not None:
+        flags |= FLAG_STATION
+    return flags
+
+
+# Function to pick a session number for a tracker that is starting (never 0, which means "unknown")
+def new_session():
+    return int.from_bytes(os.urandom(4), 'little') or 1
+
+
+# Function to encode a length-prefixed UTF-8 id (camera or station)
+def encode_id(value, what):
+    value_bytes = value.encode()
+    if len(value_bytes) > 255:
+        raise ProtocolError(f"{what} id longer than 255 bytes")
+    return bytes([len(value_bytes)]) + value_bytes
+
+
+# Function to read a length-prefixed UTF-8 id at offset; returns (id, offset after it)
+def decode_id(data, offset, what):
+    if len(data) < offset + 1 or len(data) < offset + 1 + data[offset]:
+        raise ProtocolError(f"Packet too short for {what.lower()} block")
+    length = data[offset]
+    try:
+        value = bytes(data[offset + 1:offset + 1 + length]).decode()
+    except UnicodeDecodeError:
+        raise ProtocolError(f"{what} id is not UTF-8")
+    return value, offset + 1 + length
+
+
+# Function to build the timing, camera, station and track blocks that follow the header
+def encode_blocks(hand_count, timings=None, camera=None, track_ids=None, track_ages=None, station=None, session=0):
+    blocks = b''
+    if timings is not None:
+        durations_us = [min(timings.get(stage, 0) // 1000, 0xFFFFFFFF) for stage in TIMING_STAGES]
+        blocks += TIMING.pack(time.monotonic_ns(), *durations_us)
+    if camera is not None:
+        blocks += encode_id(camera, "Camera")
+    if station is not None:
+        blocks += encode_id(station, "Station") + SESSION.pack(session & 0xFFFFFFFF)
+    if track_ids is not None:
+        if track_ages is None:
+            track_ages = np.zeros(hand_count)
+        blocks += np.asarray(track_ids, dtype='<u4').tobytes()
+        blocks += np.minimum(track_ages, 0xFFFF).astype('<u2').tobytes()
+    return blocks
+
+
+# Function to parse a packet; returns a dict with the header fields and a float32 'hands' array
+def decode_packet(data):
+    if len(data) < HEADER.size:
+        raise ProtocolError(f"Packet too short: {len(data)} bytes")
+
+    magic, version, flags, hand_count, sequence, capture_ns = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ProtocolError("Bad magic")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+
+    blocks, offset = decode_blocks(data, HEADER.size, flags, hand_count)
+    dtype = np.dtype('<f2') if flags & FLAG_FLOAT16 else np.dtype('<f4')
+    expected = offset + hand_count * NUM_LANDMARKS * 3 * dtype.itemsize
+    if len(data) != expected:
+        raise ProtocolError(f"Expected {expected} bytes, got {len(data)}")
+
+    hands = np.frombuffer(data, dtype=dtype, offset=offset).reshape(hand_count, NUM_LANDMARKS, 3)
+    return {
+        'sequence': sequence,
+        'capture_ns': capture_ns,
+        **blocks,
+        'stop': bool(flags & FLAG_STOP),
+        'hands': hands.astype(np.float32),
+    }
+
+
+# Function to read the optional blocks starting at offset.
+# Returns (fields, offset after the blocks); fields holds send_ns, timings
+# (stage -> seconds), camera, station, session, track_ids and track_ages, each None when absent.
+def decode_blocks(data, offset, flags, hand_count):
+    send_ns = None
+    timings = None
+    if flags & FLAG_TIMING:
+        if len(data) < offset + TIMING.size:
+            raise ProtocolError("Packet too short for timing block")
+        send_ns, *durations_us = TIMING.unpack_from(data, offset)
+        timings = {stage: us / 1e6 for stage, us in zip(TIMING_STAGES, durations_us)}
+        offset += TIMING.size
+
+    camera = None
+    if flags & FLAG_CAMERA:
+        camera, offset = decode_id(data, offset, "Camera")
+
+    station = None
+    session = None
+    if flags & FLAG_STATION:
+        station, offset = decode_id(data, offset, "Station")
+        if len(data) < offset + SESSION.size:
+            raise ProtocolError("Packet too short for station block")
+        session, = SESSION.unpack_from(data, offset)
+        offset += SESSION.size
+
+    track_ids = None
+    track_ages = None
+    if flags & FLAG_TRACKS:
+        if len(data) < offset + hand_count * 6:
+            raise ProtocolError("Packet too short for track block")
+        track_ids = np.frombuffer(data, dtype='<u4', count=hand_count, offset=offset).astype(np.uint32)
+        offset += hand_count * 4
+        track_ages = np.frombuffer(data, dtype='<u2', count=hand_count, offset=offset).astype(np.uint32)
+        offset += hand_count * 2
+
+    fields = {
+        'send_ns': send_ns,
+        'timings': timings,  # stage -> seconds, or None
+        'camera': camera,  # None for untagged packets
+        'station': station,  # None for packets without a station block
+        'session': session,
+        'track_ids': track_ids,  # (n,) arrays, or None when the tracker sent no tracks
+        'track_ages': track_ages,
+    }
+    return fields, offset
+
+
+# Function to convert a decoded packet into the JSON message the HTTP consumers expect.
+# Tagged packets also carry their "camera" and "station" and each hand its "track_id" and
+# "track_age"; untagged ones produce exactly the old message.
+def packet_to_message(packet):
+    if packet['stop']:
+        message = {'command': 'STOP'}
+    else:
+        track_ids = packet.get('track_ids')
+        track_ages = packet.get('track_ages')
+        all_hands_data = []
+        for hand_idx, hand in enumerate(packet['hands'].tolist()):
+            landmarks = [{'x': x, 'y': y, 'z': z} for x, y, z in hand]
+            hand_data = {'hand_index': hand_idx, 'landmarks': landmarks}
+            if track_ids is not None:
+                hand_data['track_id'] = int(track_ids[hand_idx])
+                hand_data['track_age'] = int(track_ages[hand_idx]) if track_ages is not None else 0
+            all_hands_data.append(hand_data)
+        message = {'hands': all_hands_data}
+    if packet.get('camera') is not None:
+        message['camera'] = packet['camera']
+    if packet.get('station') is not None:
+        message['station'] = packet['station']
+    return message
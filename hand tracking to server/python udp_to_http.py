@@ -1,43 +1,36 @@
-import socket
-import json
-from flask import Flask, jsonify
-
-app = Flask(__name__)
-
-# Setup UDP socket to listen for data
-serverSock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-serverAddressPort = ("127.0.0.1", 5052)
-serverSock.bind(serverAddressPort)
-
-print("Server is listening on", serverAddressPort)
-
-# Variable to hold the latest received data
-latest_data = None
-
-# Function to listen for UDP messages
-def listen_for_udp():
-    global latest_data
-    while True:
-        data, addr = serverSock.recvfrom(1024)  # Buffer size is 1024 bytes
-        try:
-            message = json.loads(data.decode())  # Decode the received data
-            latest_data = message  # Store the latest data
-            print(f"Received data: {message}")
-        except json.JSONDecodeError:
-            print("Failed to decode JSON")
-
-# Start the UDP listening in a separate thread
-import threading
-udp_thread = threading.Thread(target=listen_for_udp, daemon=True)
-udp_thread.start()
-
-# Endpoint to expose the received data to Postman via HTTP
-@app.route('/received-data', methods=['GET'])
-def get_received_data():
-    if latest_data:
-        return jsonify(latest_data)
-    else:
-        return jsonify({"message": "No data received yet"}), 404
+# UDP -> HTTP bridge for the hand tracker (check.py).
+#
+# Listens for landmark frames on 127.0.0.1:5052 and serves them on port 5000:
+#   GET /received-data    latest frame (same JSON as before)
+#   GET /frames?since=N   every buffered frame newer than N (&wait=S to long-poll)
+#   GET /stream           Server-Sent Events, one event per frame as it arrives
+#   GET /stats            receive / reassembly / subscriber counters
+#   GET /metrics          p50/p95/p99 latency per pipeline stage plus the counters
+#
+# Gesture events (start / end / hold) arrive on 127.0.0.1:5053:
+#   GET /events?since=N   every buffered event message newer than N (&wait=S to long-poll)
+#   GET /events/stream    Server-Sent Events, one event message as it arrives
+#   GET /gestures         latest event message; "active" lists the gestures currently shown
+#
+# With --shm the bridge also reads frames from a tracker on the same host
+# through shared memory (check.py --shm), see shared_ring.py.
+#
+# Several cameras (host.py) can share one bridge; each one's frames and events
+# are served under /cameras/<id>/ with the endpoint names above, and
+#   GET /cameras          lists the cameras seen so far
+#
+# Several stations can share one bridge too (check.py --station, host.py
+# "station"); each one is served under /stations/<id>/ (its cameras under
+# /stations/<id>/cameras/<camera>/), and
+#   GET /stations         lists the stations and their streams
+#
+# The frame socket is drained in batches with an explicit receive buffer
+# (--rcvbuf); --latest-only decodes only the newest frame per batch. Kernel
+# drops and sequence gaps are counted in GET /stats, and problems are logged
+# as rate-limited JSON lines instead of printing every frame.
+#
+# The server itself lives in bridge.py (asyncio, no Flask needed).
+import bridge
 
 if __name__ == '__main__':
-    app.run(port=5000)
+    bridge.main()
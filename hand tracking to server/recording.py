@@ -0,0 +1,352 @@
+import argparse
+import json
+import os
+import socket
+import time
+
+import numpy as np
+
+import delta
+import fanout
+import framing
+import protocol
+import shared_ring
+
+# Recorder and replay sources for the tracking pipeline, so it can be tested
+# and benchmarked without a webcam.
+#
+# A recording is a directory:
+#   meta.json     kind ("frames" or "landmarks"), count, shape of one item
+#   data.bin      raw items back to back, opened with np.memmap on replay
+#   index.npy     one row per recorded frame (timestamp, offset, hand count, flags)
+#
+# FrameReplay behaves like cv2.VideoCapture, so it can stand in for the
+# camera in LatestFrameCapture / check.py (--source <dir>). LandmarkReplay
+# yields decoded landmark frames, and "replay-landmarks" sends them to the
+# bridge's UDP port exactly like the tracker does.
+
+FORMAT_VERSION = 1
+
+KIND_FRAMES = "frames"
+KIND_LANDMARKS = "landmarks"
+
+INDEX_DTYPE = np.dtype([('timestamp_ns', '<i8'), ('offset', '<i8'), ('hand_count', 'u1'), ('stop', 'u1')])
+
+
+def is_recording(path):
+    return os.path.isfile(os.path.join(str(path), "meta.json"))
+
+
+def load_meta(path):
+    with open(os.path.join(path, "meta.json"), "r") as file:
+        meta = json.load(file)
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported recording version {meta.get('version')}")
+    return meta
+
+
+# Shared writer: appends raw bytes to data.bin and keeps the index in memory until close()
+class _Recorder:
+    kind = None
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.data = open(os.path.join(path, "data.bin"), "wb")
+        self.index = []
+        self.offset = 0
+        self.item_shape = None
+
+    def _append(self, timestamp_ns, payload, hand_count=0, stop=False):
+        self.index.append((timestamp_ns, self.offset, hand_count, int(stop)))
+        self.data.write(payload)
+        self.offset += len(payload)
+
+    def close(self):
+        self.data.close()
+        np.save(os.path.join(self.path, "index.npy"), np.array(self.index, dtype=INDEX_DTYPE))
+        meta = {"version": FORMAT_VERSION, "kind": self.kind, "count": len(self.index),
+                "shape": self.item_shape}
+        with open(os.path.join(self.path, "meta.json"), "w") as file:
+            json.dump(meta, file, indent=4)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Records raw BGR camera frames (all frames must have the same size)
+class FrameRecorder(_Recorder):
+    kind = KIND_FRAMES
+
+    def write(self, frame, timestamp_ns=None):
+        if self.item_shape is None:
+            self.item_shape = list(frame.shape)
+        elif list(frame.shape) != self.item_shape:
+            raise ValueError(f"Frame shape {frame.shape} differs from {self.item_shape}")
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self._append(timestamp_ns, np.ascontiguousarray(frame, dtype=np.uint8).tobytes())
+
+
+# Records (n_hands, 21, 3) landmark arrays as float32
+class LandmarkRecorder(_Recorder):
+    kind = KIND_LANDMARKS
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.item_shape = [protocol.NUM_LANDMARKS, 3]
+
+    def write(self, hands, timestamp_ns=None, stop=False):
+        hands = np.asarray(hands, dtype='<f4').reshape(-1, protocol.NUM_LANDMARKS, 3)
+        if timestamp_ns is None:
+            timestamp_ns = time.monotonic_ns()
+        self._append(timestamp_ns, hands.tobytes(), len(hands), stop)
+
+
+# Sleeps so that items come out at their recorded spacing (or not at all when realtime=False)
+class _Pacer:
+    def __init__(self, realtime):
+        self.realtime = realtime
+        self.start = None
+        self.first_ns = None
+
+    def wait(self, timestamp_ns):
+        if not self.realtime:
+            return
+        now = time.perf_counter()
+        if self.start is None:
+            self.start, self.first_ns = now, timestamp_ns
+            return
+        delay = self.start + (timestamp_ns - self.first_ns) / 1e9 - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def reset(self):
+        self.start = None
+
+
+# Replays a frame recording through the cv2.VideoCapture interface
+class FrameReplay:
+    def __init__(self, path, realtime=True, loop=False):
+        meta = load_meta(path)
+        if meta["kind"] != KIND_FRAMES:
+            raise ValueError(f"{path} is a {meta['kind']} recording, not frames")
+        self.index = np.load(os.path.join(path, "index.npy"))
+        data_path = os.path.join(path, "data.bin")
+        if len(self.index) and os.path.getsize(data_path):
+            shape = (meta["count"], *meta["shape"])
+            self.frames = np.memmap(data_path, dtype=np.uint8, mode="r", shape=shape)
+        else:
+            # Nothing was recorded, so there is no frame shape and mmap cannot map an empty file
+            self.frames = np.zeros((0, *(meta["shape"] or (0, 0, 3))), dtype=np.uint8)
+        self.realtime = realtime
+        self.loop = loop
+        self.position = 0
+        self.pacer = _Pacer(realtime)
+        self.opened = True
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self):
+        if not self.opened:
+            return False, None
+        if self.position >= len(self.frames):
+            if not self.loop or len(self.frames) == 0:
+                return False, None
+            self.position = 0
+            self.pacer.reset()
+
+        self.pacer.wait(int(self.index[self.position]['timestamp_ns']))
+        frame = np.array(self.frames[self.position])  # Copy, callers draw on the frame
+        self.position += 1
+        return True, frame
+
+    # Camera properties cannot be changed on a recording
+    def set(self, prop, value):
+        return False
+
+    def get(self, prop):
+        return 0.0
+
+    def release(self):
+        self.opened = False
+
+
+# Iterates over a landmark recording, yielding (timestamp_ns, hands, stop)
+class LandmarkReplay:
+    def __init__(self, path, realtime=True, loop=False):
+        meta = load_meta(path)
+        if meta["kind"] != KIND_LANDMARKS:
+            raise ValueError(f"{path} is a {meta['kind']} recording, not landmarks")
+        self.index = np.load(os.path.join(path, "index.npy"))
+        data_path = os.path.join(path, "data.bin")
+        if os.path.getsize(data_path):
+            self.data = np.memmap(data_path, dtype='<f4', mode="r").reshape(-1, protocol.NUM_LANDMARKS, 3)
+        else:
+            self.data = np.zeros((0, protocol.NUM_LANDMARKS, 3), dtype='<f4')
+        self.realtime = realtime
+        self.loop = loop
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        pacer = _Pacer(self.realtime)
+        hand_bytes = protocol.NUM_LANDMARKS * 3 * 4
+        while True:
+            for entry in self.index:
+                pacer.wait(int(entry['timestamp_ns']))
+                first = int(entry['offset']) // hand_bytes
+                yield int(entry['timestamp_ns']), self.data[first:first + int(entry['hand_count'])], bool(entry['stop'])
+            if not self.loop or len(self.index) == 0:
+                return
+            pacer.reset()
+
+
+# Function to record camera frames to a directory
+def record_frames(path, camera, seconds):
+    import cv2
+
+    cap = cv2.VideoCapture(camera)
+    end = time.monotonic() + seconds
+    with FrameRecorder(path) as recorder:
+        while time.monotonic() < end:
+            success, frame = cap.read()
+            if not success:
+                break
+            recorder.write(frame)
+    cap.release()
+    print(f"Recorded {len(recorder.index)} frames to {path}")
+
+
+# Function to record the landmark stream the tracker sends over UDP: on address,
+# as a subscriber of the tracker's fan-out control port, or from its multicast group
+def record_landmarks(path, address, seconds, subscribe_port=None, multicast=None):
+    subscription = None
+    if subscribe_port:
+        subscription = fanout.Subscription((fanout.CONTROL_ADDRESS[0], subscribe_port))
+        sock = subscription.sock
+    elif multicast:
+        sock = fanout.multicast_socket(*multicast)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(address)
+    sock.settimeout(0.5)
+    reassembler = framing.Reassembler()
+    delta_decoders = {}  # addr -> delta.DeltaDecoder for trackers sending --encoding delta
+    end = time.monotonic() + seconds
+    with LandmarkRecorder(path) as recorder:
+        while time.monotonic() < end:
+            if subscription is not None:
+                received = subscription.recv(timeout=0.5)
+                if received is None:
+                    continue
+                data, addr = received
+            else:
+                try:
+                    data, addr = sock.recvfrom(65535)
+                except socket.timeout:
+                    continue
+            data = reassembler.add(data, addr)
+            if data is None:
+                continue
+            try:
+                if delta.is_delta_packet(data):
+                    packet = delta_decoders.setdefault(addr, delta.DeltaDecoder()).decode(data)
+                elif protocol.is_binary_packet(data):
+                    packet = protocol.decode_packet(data)
+                else:
+                    continue
+            except protocol.ProtocolError:
+                continue
+            if packet is None:
+                continue  # Delta whose keyframe was lost
+            recorder.write(packet['hands'], packet['capture_ns'], packet['stop'])
+    if subscription is not None:
+        subscription.close()
+    else:
+        sock.close()
+    print(f"Recorded {len(recorder.index)} landmark frames to {path}")
+
+
+# Function to record the landmark stream from a same-host tracker's shared-memory ring
+def record_landmarks_shm(path, name, seconds):
+    reader = shared_ring.RingReader(name)
+    end = time.monotonic() + seconds
+    with LandmarkRecorder(path) as recorder:
+        while time.monotonic() < end:
+            if not reader.wait(timeout=0.5):
+                continue
+            for frame in reader.read_new():
+                recorder.write(frame['hands'], frame['capture_ns'], frame['stop'])
+    print(f"Recorded {len(recorder.index)} landmark frames to {path} ({reader.stats()['missed']} missed)")
+    reader.close()
+
+
+# Function to send a landmark recording to the bridge the way check.py does
+def replay_landmarks(path, address, realtime=True, loop=False, float16=False):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sent = 0
+    try:
+        for sequence, (timestamp_ns, hands, stop) in enumerate(LandmarkReplay(path, realtime, loop)):
+            data = protocol.encode_packet(hands, sequence, time.monotonic_ns(), stop=stop, float16=float16)
+            framing.send_frame(sock, data, address, sequence)
+            sent += 1
+    except KeyboardInterrupt:
+        pass
+    sock.close()
+    print(f"Sent {sent} landmark frames to {address}")
+
+
+def parse_address(text):
+    host, _, port = text.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    frames = commands.add_parser("record-frames", help="record raw camera frames")
+    frames.add_argument("path")
+    frames.add_argument("--camera", type=int, default=0)
+    frames.add_argument("--seconds", type=float, default=30)
+
+    landmarks = commands.add_parser("record-landmarks", help="record the tracker's UDP landmark stream")
+    landmarks.add_argument("path")
+    landmarks.add_argument("--listen", default="127.0.0.1:5052")
+    landmarks.add_argument("--seconds", type=float, default=30)
+    landmarks.add_argument("--shm", nargs="?", const=shared_ring.DEFAULT_NAME, default=None, metavar="NAME",
+                           help="read the tracker's shared-memory ring instead of listening for UDP")
+    landmarks.add_argument("--subscribe", nargs="?", const=fanout.CONTROL_ADDRESS[1], default=None, type=int,
+                           metavar="PORT", help="subscribe to a tracker started with --fanout instead of listening")
+    landmarks.add_argument("--multicast", default=None, metavar="GROUP[:PORT]",
+                           help="join a tracker's --multicast group instead of listening")
+
+    replay = commands.add_parser("replay-landmarks", help="send a landmark recording over UDP")
+    replay.add_argument("path")
+    replay.add_argument("--to", default="127.0.0.1:5052")
+    replay.add_argument("--fast", action="store_true", help="send as fast as possible instead of wall-clock speed")
+    replay.add_argument("--loop", action="store_true")
+    replay.add_argument("--float16", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "record-frames":
+        record_frames(args.path, args.camera, args.seconds)
+    elif args.command == "record-landmarks":
+        if args.shm:
+            record_landmarks_shm(args.path, args.shm, args.seconds)
+        else:
+            address = parse_address(args.listen)
+            multicast = fanout.parse_multicast(args.multicast, address[1]) if args.multicast else None
+            record_landmarks(args.path, address, args.seconds, args.subscribe, multicast)
+    elif args.command == "replay-landmarks":
+        replay_landmarks(args.path, parse_address(args.to), not args.fast, args.loop, args.float16)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,365 @@
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+import protocol
+
+# Shared-memory landmark stream for consumers on the same host.
+#
+# The tracker writes every frame into a ring of fixed-size records in a
+# multiprocessing.shared_memory segment, and any number of local readers
+# (bridge, games, recorder) read it directly: no socket, no port to share,
+# no encode/decode. UDP stays the path between hosts.
+#
+# Layout: a 64-byte header followed by `slots` records.
+#   header   magic, version, slots, max_hands, closed, writer_pid, write_seq (last committed sequence)
+#   record   seq_begin, capture_ns, hand_count, flags, track_ids[max_hands], track_ages[max_hands],
+#            landmarks[max_hands, 21, 3] float32, seq_end
+#
+# There is one writer and no lock. Record `seq` lives in slot seq % slots.
+# The writer stores seq_begin, then the payload, then seq_end, then
+# write_seq. A reader copies seq_end first, then the payload, then
+# seq_begin, and keeps the copy only when both equal the sequence it wanted.
+# Otherwise the writer was in that slot meanwhile (the reader fell a whole
+# ring behind), and the record is counted as missed.
+#
+# FrameRingWriter / FrameRingReader use the same scheme for camera frames
+# (pipeline.py). Their readers only want the newest frame, so a few slots
+# are enough.
+#
+# A writer replaces a segment of the same name that a crashed process left
+# behind, but refuses one whose recorded writer pid is still running: a
+# second tracker on the same name would otherwise pull the ring away from
+# the first one and its readers. force=True (--shm-force) replaces it anyway.
+
+DEFAULT_NAME = "hand_tracking_landmarks"
+MAGIC = b'BORG'
+FORMAT_VERSION = 3
+SLOTS = 64
+MAX_HANDS = 2
+
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'), ('slots', '<u4'), ('max_hands', '<u4'),
+                         ('closed', '<u4'), ('writer_pid', '<u4'), ('write_seq', '<u8')])
+
+FLAG_STOP = protocol.FLAG_STOP
+FLAG_TRACKS = protocol.FLAG_TRACKS
+
+FRAME_MAGIC = b'BOFR'
+FRAME_SLOTS = 4
+FRAME_HEADER_DTYPE = np.dtype([('magic', 'S4'), ('version', '<u4'), ('slots', '<u4'), ('shape', '<u4', 3),
+                               ('closed', '<u4'), ('writer_pid', '<u4'), ('write_seq', '<u8')])
+
+
+def record_dtype(max_hands):
+    return np.dtype([('seq_begin', '<u8'), ('capture_ns', '<u8'), ('hand_count', 'u1'), ('flags', 'u1'),
+                     ('pad', 'u1', 6), ('track_ids', '<u4', (max_hands,)), ('track_ages', '<u2', (max_hands,)),
+                     ('landmarks', '<f4', (max_hands, protocol.NUM_LANDMARKS, 3)),
+                     ('seq_end', '<u8')])
+
+
+def frame_record_dtype(shape):
+    return np.dtype([('seq_begin', '<u8'), ('capture_ns', '<u8'), ('frame', 'u1', tuple(shape)),
+                     ('seq_end', '<u8')])
+
+
+# Function to map the header and the records onto a segment's buffer
+def _views(buf, slots, max_hands):
+    header = np.ndarray((), HEADER_DTYPE, buf, 0)
+    records = np.ndarray((slots,), record_dtype(max_hands), buf, HEADER_SIZE)
+    return header, records
+
+
+def _frame_views(buf, slots, shape):
+    header = np.ndarray((), FRAME_HEADER_DTYPE, buf, 0)
+    records = np.ndarray((slots,), frame_record_dtype(shape), buf, HEADER_SIZE)
+    return header, records
+
+
+# Function to create a segment, replacing one left behind by a process that did not shut down cleanly
+def _create(name, size, force=False):
+    try:
+        return shared_memory.SharedMemory(name, create=True, size=size)
+    except FileExistsError:
+        existing = _attach(name)
+        pid = _live_writer(existing.buf)
+        existing.close()
+        if pid is not None and not force:
+            raise FileExistsError(f"Shared memory {name} is in use by the writer with pid {pid}; "
+                                  f"stop it or use --shm-force to replace it") from None
+        stale = shared_memory.SharedMemory(name)
+        stale.close()
+        stale.unlink()
+        return shared_memory.SharedMemory(name, create=True, size=size)
+
+
+# Function to get the pid of the writer of a segment if it is still running, else None (closed or crashed)
+def _live_writer(buf):
+    if len(buf) < HEADER_SIZE:
+        return None
+    header_dtype = {MAGIC: HEADER_DTYPE, FRAME_MAGIC: FRAME_HEADER_DTYPE}.get(bytes(buf[:4]))
+    if header_dtype is None:
+        return None  # Not one of our rings
+    header = np.ndarray((), header_dtype, buf, 0)
+    closed, pid = int(header['closed']), int(header['writer_pid'])
+    del header
+    if closed or pid == 0:
+        return None
+    if os.name == "nt":
+        return pid  # os.kill would end the process there; the segment only exists while someone has it open
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass  # Running under another user
+    return pid
+
+
+class RingWriter:
+    def __init__(self, name=DEFAULT_NAME, slots=SLOTS, max_hands=MAX_HANDS, force=False):
+        self.shm = _create(name, HEADER_SIZE + slots * record_dtype(max_hands).itemsize, force)
+        self.name = name
+        self.max_hands = max_hands
+        self.header, self.records = _views(self.shm.buf, slots, max_hands)
+        self.records[:] = np.zeros((), self.records.dtype)
+        self.header['magic'] = MAGIC
+        self.header['version'] = FORMAT_VERSION
+        self.header['slots'] = slots
+        self.header['max_hands'] = max_hands
+        self.header['closed'] = 0
+        self.header['writer_pid'] = os.getpid()
+        self.header['write_seq'] = 0
+        self.sequence = 0
+
+    # Append one frame; hands is (n_hands, 21, 3), extra hands beyond max_hands are dropped.
+    # track_ids / track_ages are the optional per-hand track ids and lifetimes (tracks.py).
+    def write(self, hands, capture_ns, stop=False, track_ids=None, track_ages=None):
+        hands = np.asarray(hands, dtype=np.float32).reshape(-1, protocol.NUM_LANDMARKS, 3)[:self.max_hands]
+        self.sequence += 1
+        record = self.records[self.sequence % len(self.records)]
+
+        record['seq_begin'] = self.sequence
+        record['capture_ns'] = capture_ns
+        record['hand_count'] = len(hands)
+        record['flags'] = (FLAG_STOP if stop else 0) | (FLAG_TRACKS if track_ids is not None else 0)
+        if track_ids is not None:
+            record['track_ids'][:len(hands)] = np.asarray(track_ids)[:len(hands)]
+            ages = track_ages if track_ages is not None else np.zeros(len(hands))
+            record['track_ages'][:len(hands)] = np.minimum(ages, 0xFFFF)[:len(hands)]
+        record['landmarks'][:len(hands)] = hands
+        record['seq_end'] = self.sequence
+        self.header['write_seq'] = self.sequence
+        return self.sequence
+
+    def close(self):
+        self.header['closed'] = 1
+        del self.header, self.records  # Views must go before the buffer can be released
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RingReader:
+    def __init__(self, name=DEFAULT_NAME):
+        self.shm = _attach(name)
+        header = np.ndarray((), HEADER_DTYPE, self.shm.buf, 0)
+        valid = bytes(header['magic']) == MAGIC and int(header['version']) == FORMAT_VERSION
+        slots, max_hands = int(header['slots']), int(header['max_hands'])
+        del header
+        if not valid:
+            self.shm.close()
+            raise protocol.ProtocolError(f"{name} is not a landmark ring")
+        self.name = name
+        self.header, self.records = _views(self.shm.buf, slots, max_hands)
+        self.cursor = self.latest_seq()  # New readers start at the live position
+        self.frames_read = 0
+        self.frames_missed = 0
+
+    def latest_seq(self):
+        return int(self.header['write_seq'])
+
+    # True once the writer has shut down or died without closing the ring; the next tracker creates a new segment
+    @property
+    def writer_closed(self):
+        return _live_writer(self.shm.buf) is None
+
+    # Copy record seq out of the ring. Returns a dict like protocol.decode_packet()
+    # (sequence, capture_ns, stop, hands, track_ids, track_ages), or None if it was overwritten or is not written yet.
+    def read(self, seq):
+        record = self.records[seq % len(self.records)]
+        seq_end = int(record['seq_end'])
+        capture_ns = int(record['capture_ns'])
+        hand_count = int(record['hand_count'])
+        flags = int(record['flags'])
+        hands = record['landmarks'][:hand_count].copy()
+        track_ids = record['track_ids'][:hand_count].astype(np.uint32)
+        track_ages = record['track_ages'][:hand_count].astype(np.uint32)
+        seq_begin = int(record['seq_begin'])
+        if seq_end != seq or seq_begin != seq:
+            return None
+        tracked = bool(flags & FLAG_TRACKS)
+        return {'sequence': seq, 'capture_ns': capture_ns, 'stop': bool(flags & FLAG_STOP), 'hands': hands,
+                'track_ids': track_ids if tracked else None, 'track_ages': track_ages if tracked else None}
+
+    # Every record written since the last call, oldest first
+    def read_new(self):
+        latest = self.latest_seq()
+        if latest < self.cursor:
+            self.cursor = 0  # Writer restarted inside the same segment
+        start = max(self.cursor + 1, latest - len(self.records) + 1)
+        self.frames_missed += start - (self.cursor + 1)
+
+        frames = []
+        for seq in range(start, latest + 1):
+            frame = self.read(seq)
+            if frame is None:
+                self.frames_missed += 1
+                continue
+            frames.append(frame)
+        self.frames_read += len(frames)
+        self.cursor = latest
+        return frames
+
+    # Block until something newer than the cursor is written or timeout seconds pass
+    def wait(self, timeout=None, poll=0.001):
+        end = None if timeout is None else time.monotonic() + timeout
+        while self.latest_seq() <= self.cursor:
+            if end is not None and time.monotonic() >= end:
+                return False
+            time.sleep(poll)
+        return True
+
+    # Records written but not read yet
+    def depth(self):
+        return max(0, self.latest_seq() - self.cursor)
+
+    def stats(self):
+        return {'read': self.frames_read, 'missed': self.frames_missed, 'latest_seq': self.latest_seq()}
+
+    def close(self):
+        del self.header, self.records
+        self.shm.close()
+
+
+# Camera frames of one fixed shape (height, width, channels), written by the capture process
+class FrameRingWriter:
+    def __init__(self, name, shape, slots=FRAME_SLOTS, force=False):
+        self.shm = _create(name, HEADER_SIZE + slots * frame_record_dtype(shape).itemsize, force)
+        self.name = name
+        self.shape = tuple(shape)
+        self.header, self.records = _frame_views(self.shm.buf, slots, shape)
+        self.records['seq_begin'] = 0
+        self.records['seq_end'] = 0
+        self.header['magic'] = FRAME_MAGIC
+        self.header['version'] = FORMAT_VERSION
+        self.header['slots'] = slots
+        self.header['shape'] = shape
+        self.header['closed'] = 0
+        self.header['writer_pid'] = os.getpid()
+        self.header['write_seq'] = 0
+        self.sequence = 0
+
+    def write(self, frame, capture_ns):
+        if frame.shape != self.shape:
+            raise ValueError(f"Frame shape {frame.shape} differs from {self.shape}")
+        self.sequence += 1
+        record = self.records[self.sequence % len(self.records)]
+
+        record['seq_begin'] = self.sequence
+        record['capture_ns'] = capture_ns
+        record['frame'][...] = frame
+        record['seq_end'] = self.sequence
+        self.header['write_seq'] = self.sequence
+        return self.sequence
+
+    def close(self):
+        self.header['closed'] = 1
+        del self.header, self.records
+        self.shm.close()
+        self.shm.unlink()
+
+
+# Reads the newest frame only; the frames it never picked up are counted as skipped
+class FrameRingReader:
+    def __init__(self, name):
+        self.shm = _attach(name)
+        header = np.ndarray((), FRAME_HEADER_DTYPE, self.shm.buf, 0)
+        valid = bytes(header['magic']) == FRAME_MAGIC and int(header['version']) == FORMAT_VERSION
+        slots, shape = int(header['slots']), tuple(int(v) for v in header['shape'])
+        del header
+        if not valid:
+            self.shm.close()
+            raise protocol.ProtocolError(f"{name} is not a frame ring")
+        self.name = name
+        self.shape = shape
+        self.header, self.records = _frame_views(self.shm.buf, slots, shape)
+        self.cursor = 0
+        self.frames_read = 0
+        self.frames_skipped = 0
+
+    def latest_seq(self):
+        return int(self.header['write_seq'])
+
+    @property
+    def writer_closed(self):
+        return _live_writer(self.shm.buf) is None
+
+    # Frames written but not picked up yet
+    def depth(self):
+        return max(0, self.latest_seq() - self.cursor)
+
+    # The newest frame as (seq, capture_ns, frame copy), or None when there is nothing new
+    def read_latest(self):
+        latest = self.latest_seq()
+        if latest <= self.cursor:
+            return None
+        record = self.records[latest % len(self.records)]
+        seq_end = int(record['seq_end'])
+        capture_ns = int(record['capture_ns'])
+        frame = record['frame'].copy()
+        seq_begin = int(record['seq_begin'])
+        if seq_end != latest or seq_begin != latest:
+            return None  # Overwritten while copying, the next call gets a newer one
+
+        self.frames_skipped += latest - self.cursor - 1
+        self.frames_read += 1
+        self.cursor = latest
+        return latest, capture_ns, frame
+
+    # Wait up to timeout seconds for a frame newer than the last one read
+    def wait_latest(self, timeout=None, poll=0.001):
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            item = self.read_latest()
+            if item is not None or self.writer_closed:
+                return item
+            if end is not None and time.monotonic() >= end:
+                return None
+            time.sleep(poll)
+
+    def stats(self):
+        return {'read': self.frames_read, 'skipped': self.frames_skipped, 'depth': self.depth()}
+
+    def close(self):
+        del self.header, self.records
+        self.shm.close()
+
+
+# Function to open an existing segment without taking ownership of it.
+# Before Python 3.13 every process that opens a segment registers it with
+# the resource tracker, which unlinks it when that process exits and would
+# pull the ring away from the tracker and the other readers. Registration is
+# skipped rather than undone, since the tracker process may be shared with
+# the writer (multiprocessing children) and would forget its entry too.
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *args: None
+        try:
+            return shared_memory.SharedMemory(name)
+        finally:
+            resource_tracker.register = register
@@ -0,0 +1,114 @@
+import numpy as np
+
+# Temporal filtering for landmark arrays.
+#
+# hands.process is the expensive step, so games can run it below display
+# rate and fill the frames in between from a filter: every inference result
+# goes into update(), and predict() extrapolates the filtered landmarks to
+# the render timestamp with the filtered velocity. The filter is a One Euro
+# filter (Casiez et al.) applied to all 21x3 coordinates of a hand at once:
+# heavy smoothing while the hand is still, little lag when it moves fast.
+# Timestamps are time.monotonic_ns(), like the rest of the pipeline.
+
+MIN_CUTOFF = 1.0  # Hz, smoothing at rest (lower = smoother, more lag)
+BETA = 5.0  # How fast the cutoff rises with speed (higher = less lag when moving)
+D_CUTOFF = 1.0  # Hz, smoothing of the velocity estimate
+MAX_PREDICTION_MS = 100  # Never extrapolate further than this past the last inference
+
+
+# Exponential smoothing weight for a low-pass filter at cutoff Hz; works element-wise on arrays
+def smoothing_factor(cutoff, dt):
+    tau = 1.0 / (2 * np.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+# One Euro filter over an array of any shape (one hand is (21, 3))
+class OneEuroFilter:
+    def __init__(self, min_cutoff=MIN_CUTOFF, beta=BETA, d_cutoff=D_CUTOFF):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+
+        self.value = None  # Filtered position
+        self.velocity = None  # Filtered velocity, units per second
+        self.timestamp_ns = None
+
+    def update(self, value, timestamp_ns):
+        value = np.asarray(value, dtype=np.float32)
+        if self.value is None:
+            self.value = value.copy()
+            self.velocity = np.zeros_like(value)
+            self.timestamp_ns = timestamp_ns
+            return self.value
+
+        dt = (timestamp_ns - self.timestamp_ns) / 1e9
+        if dt <= 0:
+            return self.value  # Same or older sample, nothing new to learn
+
+        raw_velocity = (value - self.value) / dt
+        self.velocity += smoothing_factor(self.d_cutoff, dt) * (raw_velocity - self.velocity)
+
+        cutoff = self.min_cutoff + self.beta * np.abs(self.velocity)
+        self.value += smoothing_factor(cutoff, dt) * (value - self.value)
+        self.timestamp_ns = timestamp_ns
+        return self.value
+
+    # Filtered value extrapolated to now_ns along the filtered velocity
+    def predict(self, now_ns, max_prediction_ms=MAX_PREDICTION_MS):
+        if self.value is None:
+            return None
+        ahead = min(max(now_ns - self.timestamp_ns, 0) / 1e9, max_prediction_ms / 1000)
+        return self.value + self.velocity * ahead
+
+
+# One OneEuroFilter per hand for (n_hands, 21, 3) landmark arrays.
+# Hands are keyed by their index in the frame, or by hand_ids (e.g. stable
+# track ids) when given. A hand missing from an update is forgotten, so a
+# hand that reappears starts from its new position instead of sliding there.
+class LandmarkFilter:
+    def __init__(self, min_cutoff=MIN_CUTOFF, beta=BETA, d_cutoff=D_CUTOFF, max_prediction_ms=MAX_PREDICTION_MS):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_prediction_ms = max_prediction_ms
+        self.filters = {}  # hand id -> OneEuroFilter, in the order of the last update
+
+    # Feed one inference result; returns the filtered (n_hands, 21, 3) array
+    def update(self, hands, timestamp_ns, hand_ids=None):
+        hands = np.asarray(hands, dtype=np.float32).reshape(-1, 21, 3)
+        if hand_ids is None:
+            hand_ids = range(len(hands))
+
+        filters = {}
+        for hand_id, hand in zip(hand_ids, hands):
+            hand_filter = self.filters.get(hand_id)
+            if hand_filter is None:
+                hand_filter = OneEuroFilter(self.min_cutoff, self.beta, self.d_cutoff)
+            hand_filter.update(hand, timestamp_ns)
+            filters[hand_id] = hand_filter
+        self.filters = filters
+        return self.positions()
+
+    # Filtered landmarks as of the last update
+    def positions(self):
+        if not self.filters:
+            return np.zeros((0, 21, 3), dtype=np.float32)
+        return np.stack([f.value for f in self.filters.values()])
+
+    # Landmarks extrapolated to now_ns (the render timestamp), (n_hands, 21, 3)
+    def predict(self, now_ns):
+        if not self.filters:
+            return np.zeros((0, 21, 3), dtype=np.float32)
+        return np.stack([f.predict(now_ns, self.max_prediction_ms) for f in self.filters.values()])
+
+    # Filtered landmark velocities in units per second, (n_hands, 21, 3)
+    def velocities(self):
+        if not self.filters:
+            return np.zeros((0, 21, 3), dtype=np.float32)
+        return np.stack([f.velocity for f in self.filters.values()])
+
+    def hand_ids(self):
+        return list(self.filters)
+
+    def reset(self):
+        self.filters = {}
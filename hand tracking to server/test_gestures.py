@@ -0,0 +1,145 @@
+import numpy as np
+
+from gestures import (INDEX_FINGER_TIP, LEFT, RIGHT, THUMB_IP, THUMB_TIP, FINGER_JOINT_IDS, FINGERTIP_IDS,
+                      GestureDebouncer, GestureEventStream, analyze)
+
+# python -m pytest test_gestures.py
+
+MS = 1_000_000
+
+
+# Function to build one (21, 3) hand: each finger's tip above (up) or below its joint,
+# the thumb tip left (out) or right of the thumb IP joint, and the thumb and index tips where given
+def make_hand(up=(False,) * 5, thumb_out=False, thumb_tip=None, index_tip=None):
+    hand = np.full((21, 3), 0.5, dtype=np.float32)
+    hand[FINGER_JOINT_IDS, 1] = 0.5
+    hand[FINGERTIP_IDS, 1] = np.where(up, 0.4, 0.6)
+    hand[THUMB_IP, 0] = 0.4
+    hand[THUMB_TIP, 0] = 0.3 if thumb_out else 0.5
+    hand[INDEX_FINGER_TIP, 0] = 0.7
+    if thumb_tip is not None:
+        hand[THUMB_TIP, :2] = thumb_tip
+    if index_tip is not None:
+        hand[INDEX_FINGER_TIP, :2] = index_tip
+    return hand
+
+
+def test_open_palm():
+    gestures = analyze(make_hand(up=(True,) * 5, thumb_out=True)[None])
+    assert gestures['fingers_up'].tolist() == [[True] * 5]
+    assert gestures['thumb_out'].tolist() == [True]
+    assert gestures['finger_count'].tolist() == [5]
+    assert gestures['open_palm'].tolist() == [True]
+    assert gestures['closed_fist'].tolist() == [False]
+    assert gestures['pinch'].tolist() == [False]
+    assert gestures['pointing'].tolist() == [RIGHT]
+
+
+def test_closed_fist():
+    gestures = analyze(make_hand()[None])
+    assert gestures['fingers_up'].tolist() == [[False] * 5]
+    assert gestures['finger_count'].tolist() == [0]
+    assert gestures['open_palm'].tolist() == [False]
+    assert gestures['closed_fist'].tolist() == [True]
+
+
+def test_finger_count_uses_thumb_out_not_thumb_up():
+    # Index and middle up; the thumb tip is above its joint but not out to the side
+    gestures = analyze(make_hand(up=(True, True, True, False, False))[None])
+    assert gestures['fingers_up'].tolist() == [[True, True, True, False, False]]
+    assert gestures['finger_count'].tolist() == [2]
+    assert gestures['open_palm'].tolist() == [False]
+    assert gestures['closed_fist'].tolist() == [False]
+
+
+def test_pinch_and_pointing():
+    hand = make_hand(thumb_tip=(0.55, 0.60), index_tip=(0.52, 0.64))
+    hand[INDEX_FINGER_TIP, 2] = 0.9  # Depth is ignored
+    gestures = analyze(hand[None])
+    assert np.allclose(gestures['pinch_distance'], [0.05])
+    assert gestures['pinch'].tolist() == [True]
+    assert gestures['pointing'].tolist() == [LEFT]  # Thumb tip right of the index tip
+    assert analyze(hand[None], pinch_threshold=0.04)['pinch'].tolist() == [False]
+
+
+def test_several_hands_at_once():
+    hands = np.stack([make_hand(up=(True,) * 5, thumb_out=True), make_hand()])
+    gestures = analyze(hands)
+    assert gestures['finger_count'].tolist() == [5, 0]
+    assert gestures['open_palm'].tolist() == [True, False]
+    assert gestures['closed_fist'].tolist() == [False, True]
+
+
+def test_no_hands():
+    gestures = analyze(np.zeros((0, 21, 3), dtype=np.float32))
+    assert gestures['fingers_up'].shape == (0, 5)
+    for name in ('thumb_out', 'finger_count', 'open_palm', 'closed_fist', 'pinch_distance', 'pinch', 'pointing'):
+        assert gestures[name].shape == (0,)
+
+
+def test_debouncer_ignores_a_single_noisy_frame():
+    debouncer = GestureDebouncer(min_on_ms=100, min_off_ms=150)
+    assert debouncer.update(True, 0) == []
+    assert debouncer.update(False, 50 * MS) == []
+    assert debouncer.update(True, 100 * MS) == []
+    assert debouncer.update(True, 150 * MS) == []  # Only held 50 ms since the dropout
+    assert debouncer.update(True, 200 * MS) == ["start"]
+
+
+def test_debouncer_enter_and_exit_hysteresis():
+    debouncer = GestureDebouncer(min_on_ms=100, min_off_ms=150, hold_ms=(1000, 2000))
+    assert debouncer.update(True, 0) == []
+    assert debouncer.update(True, 99 * MS) == []
+    assert debouncer.update(True, 100 * MS) == ["start"]
+    assert debouncer.held_ns(100 * MS) == 100 * MS  # Counted from when the predicate became true
+
+    assert debouncer.update(False, 200 * MS) == []
+    assert debouncer.update(True, 250 * MS) == []  # Back before min_off_ms, still active
+    assert debouncer.active
+
+    assert debouncer.update(True, 1000 * MS) == ["hold"]
+    assert debouncer.update(True, 1500 * MS) == []
+    assert debouncer.update(True, 2100 * MS) == ["hold"]
+
+    assert debouncer.update(False, 2200 * MS) == []
+    assert debouncer.update(False, 2349 * MS) == []
+    assert debouncer.update(False, 2350 * MS) == ["end"]
+    assert debouncer.held_ns(3000 * MS) == 2200 * MS
+
+
+# Function to get the gestures of one hand whose thumb and index tips are distance apart
+def pinch_gestures(distance):
+    return analyze(make_hand(thumb_tip=(0.5, 0.5), index_tip=(0.5 + distance, 0.5))[None])
+
+
+def test_pinch_events_use_enter_and_exit_thresholds():
+    stream = GestureEventStream(min_on_ms=100, min_off_ms=150)
+
+    # Between the two thresholds: not pinching yet
+    for ms in (0, 100, 200):
+        message = stream.update(pinch_gestures(0.07), ms * MS)
+        assert message is None or not any(e['gesture'] == 'pinch' for e in message['events'])
+
+    stream.update(pinch_gestures(0.05), 300 * MS)
+    message = stream.update(pinch_gestures(0.05), 400 * MS)
+    assert {'hand': 0, 'gesture': 'pinch', 'event': 'start', 'held_ms': 100} in message['events']
+
+    # Between the thresholds again: the pinch stays active
+    for ms in (500, 700, 900):
+        message = stream.update(pinch_gestures(0.07), ms * MS)
+        assert message is None or not message['events']
+    assert stream.debouncers[(0, 'pinch')].active
+
+    stream.update(pinch_gestures(0.09), 1000 * MS)
+    message = stream.update(pinch_gestures(0.09), 1150 * MS)
+    assert [e['event'] for e in message['events'] if e['gesture'] == 'pinch'] == ["end"]
+
+
+def test_open_palm_events_carry_the_stop_command():
+    stream = GestureEventStream(min_on_ms=100, min_off_ms=150)
+    palm = analyze(make_hand(up=(True,) * 5, thumb_out=True)[None])
+    stream.update(palm, 0)
+    message = stream.update(palm, 100 * MS)
+    assert message['events'] == [{'hand': 0, 'gesture': 'open_palm', 'event': 'start', 'held_ms': 100,
+                                  'command': 'STOP'}]
+    assert message['active'] == [{'hand': 0, 'gesture': 'open_palm', 'held_ms': 100}]
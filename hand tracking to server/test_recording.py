@@ -0,0 +1,27 @@
+import numpy as np
+
+from recording import FrameRecorder, FrameReplay, LandmarkRecorder, LandmarkReplay
+
+# python -m pytest test_recording.py
+
+
+def test_landmark_replay_past_uint8_hand_offsets(tmp_path):
+    # 200 frames of two hands put the first hand index well past 255
+    frames = np.arange(200 * 2 * 21 * 3, dtype=np.float32).reshape(200, 2, 21, 3)
+    with LandmarkRecorder(str(tmp_path)) as recorder:
+        for number, hands in enumerate(frames):
+            recorder.write(hands, timestamp_ns=number)
+
+    replayed = list(LandmarkReplay(str(tmp_path), realtime=False))
+    assert len(replayed) == 200
+    for number, (timestamp_ns, hands, stop) in enumerate(replayed):
+        assert timestamp_ns == number
+        assert hands.shape == (2, 21, 3)
+        assert np.array_equal(hands, frames[number])
+
+
+def test_frame_replay_of_empty_recording(tmp_path):
+    with FrameRecorder(str(tmp_path)):
+        pass
+    replay = FrameReplay(str(tmp_path), realtime=False, loop=True)
+    assert replay.read() == (False, None)
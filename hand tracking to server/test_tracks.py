@@ -0,0 +1,61 @@
+import itertools
+import time
+
+import numpy as np
+
+from tracks import TrackAssociator, assign
+
+# python -m pytest test_tracks.py
+
+
+# Function to find the lowest total cost over every permutation, for checking assign()
+def brute_force_total(cost, max_cost):
+    capped = np.minimum(cost, max_cost + 1e-6)
+    rows, columns = cost.shape
+    if rows <= columns:
+        return min(capped[range(rows), chosen].sum() for chosen in itertools.permutations(range(columns), rows))
+    return min(capped[chosen, range(columns)].sum() for chosen in itertools.permutations(range(rows), columns))
+
+
+def test_assign_matches_brute_force():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        rows, columns = rng.integers(1, 8, size=2)
+        cost = rng.random((rows, columns))
+        pairs = assign(cost, 0.6)
+
+        assert len({row for row, _ in pairs}) == len(pairs)
+        assert len({column for _, column in pairs}) == len(pairs)
+        assert all(cost[row, column] <= 0.6 for row, column in pairs)
+        total = sum(cost[pair] for pair in pairs) + (min(rows, columns) - len(pairs)) * (0.6 + 1e-6)
+        assert abs(total - brute_force_total(cost, 0.6)) < 1e-6
+
+
+def test_many_live_tracks_stay_fast_and_bounded():
+    rng = np.random.default_rng(1)
+    base = rng.random((4, 21, 3)).astype(np.float32) * 0.5 + 0.25
+    associator = TrackAssociator(max_tracks=6)
+    unbounded = TrackAssociator()
+    most_unbounded = 0
+
+    start = time.perf_counter()
+    for frame in range(200):
+        # Jitter large enough that hands often start new tracks, so stale ones pile up
+        hands = base + rng.normal(0, 0.15, (4, 1, 3)).astype(np.float32)
+        ids = associator.update(hands, now_ns=frame)
+        unbounded.update(hands, now_ns=frame)
+        most_unbounded = max(most_unbounded, len(unbounded.tracks))
+        assert len(set(ids.tolist())) == 4
+        assert len(associator.tracks) <= 6
+    elapsed = time.perf_counter() - start
+
+    assert most_unbounded > 6  # Without the cap the matrix gets more than 6 rows
+    assert elapsed / 200 < 0.02  # Per frame, for both associators together
+
+
+def test_assign_with_more_than_six_tracks():
+    # 11 live tracks, 4 hands: each hand must go to the track right next to it
+    tracks = np.linspace(0, 1, 11)
+    hands = tracks[[1, 4, 7, 10]] + 0.01
+    cost = np.abs(tracks[:, None] - hands[None, :])
+    assert assign(cost, 0.2) == [(1, 0), (4, 1), (7, 2), (10, 3)]
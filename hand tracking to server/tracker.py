@@ -0,0 +1,296 @@
+import json
+import time
+
+import cv2
+import mediapipe as mp
+
+import delta
+import gestures
+import protocol
+from metrics import LatencyMetrics
+from tracks import EXTRA_TRACKS, TrackAssociator
+
+# Per-frame tracking pipeline shared by check.py and benchmark.py:
+# flip + convert, hands.process, gesture classification and encoding, with
+# every stage timed. Sending is left to the caller.
+#
+# With gesture_events (the default) gestures are reported as debounced
+# start/end/hold events in frame['events'] for the separate event channel,
+# and landmark packets no longer turn into {'command': 'STOP'} on every frame
+# an open palm is visible. gesture_events=False restores that per-frame STOP.
+#
+# With roi=True, landmark inference runs on a padded crop around the hands
+# found in the previous frame instead of the whole camera frame. Only the crop
+# is converted to RGB and handed to MediaPipe, so the cost stays flat as the
+# camera resolution goes up, and small hands fill more of the model input.
+# The full frame is used again when the crop loses the hands, and every
+# ROI_REDETECT_EVERY frames while fewer than max_num_hands are tracked so new
+# hands entering the picture are still found. roi_stats() counts the crop hits
+# and misses.
+#
+# configure() changes model complexity, hand count and inference scale while
+# running (used by governor.py); the scale shrinks the full-frame RGB image
+# before inference, landmarks stay normalized to the camera frame.
+#
+# camera tags every packet and gesture event message with the id of the
+# camera it came from, so several trackers can share one bridge (host.py).
+# station does the same for the station (machine) the tracker runs on, so
+# the trackers of several stations can share one bridge; its packets also
+# carry a session number picked when the tracker starts.
+#
+# Every hand gets a stable track id (tracks.py) that follows it from frame to
+# frame, whatever order MediaPipe lists the hands in. The ids and each
+# track's age travel in the packets, key the gesture debouncers (the "hand"
+# of an event is its track id), and the ROI crop keeps covering a tracked
+# hand for a few frames after it was lost so the crop can find it again.
+#
+# encoding="delta" sends 16-bit quantized deltas against periodic keyframes
+# (delta.py) instead of full float arrays; keyframe_interval and deadband
+# tune it.
+
+ENCODINGS = ("float32", "float16", "json", "delta")
+
+ROI_PADDING = 0.35  # Added on every side, relative to the larger side of the landmark box
+ROI_MIN_SIZE = 160  # Pixels, so a far-away hand still gets a usable crop
+ROI_REDETECT_EVERY = 30
+
+
+# Function to turn the previous frame's landmarks into a padded square crop in pixels.
+# Returns (x0, y0, x1, y1) clipped to the frame.
+def roi_box(hand_array, width, height, padding=ROI_PADDING, min_size=ROI_MIN_SIZE):
+    xs = hand_array[:, :, 0] * width
+    ys = hand_array[:, :, 1] * height
+    x_min, x_max, y_min, y_max = xs.min(), xs.max(), ys.min(), ys.max()
+
+    side = max(x_max - x_min, y_max - y_min)
+    side = max(side * (1 + 2 * padding), min_size)
+    cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+
+    x0 = int(max(0, cx - side / 2))
+    y0 = int(max(0, cy - side / 2))
+    x1 = int(min(width, cx + side / 2))
+    y1 = int(min(height, cy + side / 2))
+    return x0, y0, x1, y1
+
+
+# Function to move landmarks found in a crop back into full-frame normalized
+# coordinates, in place, so drawing and encoding work as for a full frame
+def crop_to_frame(multi_hand_landmarks, box, width, height):
+    x0, y0, x1, y1 = box
+    crop_width, crop_height = x1 - x0, y1 - y0
+    for hand_landmarks in multi_hand_landmarks:
+        for landmark in hand_landmarks.landmark:
+            landmark.x = (landmark.x * crop_width + x0) / width
+            landmark.y = (landmark.y * crop_height + y0) / height
+            landmark.z = landmark.z * crop_width / width  # z uses the same scale as x
+
+
+class HandTracker:
+    def __init__(self, encoding="float32", max_num_hands=2, model_complexity=1,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5, gesture_events=True, roi=False,
+                 camera=None, keyframe_interval=delta.KEYFRAME_INTERVAL, deadband=delta.DEADBAND, station=None,
+                 session=None):
+        if encoding not in ENCODINGS:
+            raise ValueError(f"encoding must be one of {ENCODINGS}")
+        self.encoding = encoding
+        self.delta_encoder = delta.DeltaEncoder(keyframe_interval, deadband) if encoding == "delta" else None
+        self.camera = camera
+        self.station = station
+        self.session = session if session is not None else protocol.new_session()
+        self.max_num_hands = max_num_hands
+        self.model_complexity = model_complexity
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.scale = 1.0
+        self.hands = self.new_hands()
+
+        # Separate instance for the crops: MediaPipe keeps its own tracking state
+        # per instance, and crop coordinates do not line up with full-frame ones
+        self.roi_hands = self.new_hands() if roi else None
+        self.previous_hands = None  # Landmarks of the previous frame, for the next crop
+        self.roi_hits = 0
+        self.roi_misses = 0
+        self.full_frames = 0
+        self.crops_since_full_frame = 0
+        self.tracks = TrackAssociator(max_tracks=max_num_hands + EXTRA_TRACKS)
+        self.sequence = 0
+        self.metrics = LatencyMetrics()
+        self.event_stream = gestures.GestureEventStream() if gesture_events else None
+
+    def new_hands(self):
+        return mp.solutions.hands.Hands(
+            max_num_hands=self.max_num_hands,
+            model_complexity=self.model_complexity,
+            min_detection_confidence=self.min_detection_confidence,
+            min_tracking_confidence=self.min_tracking_confidence,
+        )
+
+    # Change settings while running. MediaPipe cannot change these on a live
+    # instance, so a new one is built when complexity or hand count changes
+    # (tracking restarts with a palm detection on the next frame).
+    def configure(self, model_complexity=None, max_num_hands=None, scale=None):
+        if scale is not None:
+            self.scale = scale
+        rebuild = False
+        if model_complexity is not None and model_complexity != self.model_complexity:
+            self.model_complexity = model_complexity
+            rebuild = True
+        if max_num_hands is not None and max_num_hands != self.max_num_hands:
+            self.max_num_hands = max_num_hands
+            self.tracks.max_tracks = max_num_hands + EXTRA_TRACKS
+            rebuild = True
+        if not rebuild:
+            return
+
+        self.hands.close()
+        self.hands = self.new_hands()
+        if self.roi_hands is not None:
+            self.roi_hands.close()
+            self.roi_hands = self.new_hands()
+        self.previous_hands = None
+
+    # Full-frame RGB image for inference, shrunk to the configured scale
+    def full_frame_rgb(self, img):
+        if self.scale != 1.0:
+            img = cv2.resize(img, None, fx=self.scale, fy=self.scale, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+
+    # Run one camera frame through the pipeline.
+    # Returns a dict with the flipped BGR image, the MediaPipe results, the
+    # (n_hands, 21, 3) landmark array, the gestures.analyze() output, the STOP
+    # flag and the encoded bytes to send, plus the timestamps used for metrics.
+    # With encode=False no packet is built ('data' is None), for callers that
+    # send the landmarks some other way (pipeline.py encodes in its emission stage).
+    def process(self, img, capture_ns, picked_ns=None, encode=True):
+        if picked_ns is None:
+            picked_ns = time.monotonic_ns()
+
+        img = cv2.flip(img, 1)
+        if self.roi_hands is not None:
+            results, converted_ns = self.process_roi(img)
+        else:
+            imgRGB = self.full_frame_rgb(img)
+            converted_ns = time.monotonic_ns()
+            results = self.hands.process(imgRGB)
+            self.full_frames += 1
+        inferred_ns = time.monotonic_ns()
+
+        hand_array, hand_gestures = gestures.from_results(results)
+        track_ids = self.tracks.update(hand_array, gestures.handedness_from_results(results), capture_ns)
+        track_ages = self.tracks.ages(track_ids)
+        # Crop around every live track, including one missed in this frame, as long as any hand was found
+        self.previous_hands = self.tracks.last_hands() if len(hand_array) else None
+        events = None
+        if self.event_stream is not None:
+            send_stop = False
+            message = self.event_stream.update(hand_gestures, capture_ns, track_ids)
+            if message is not None:
+                if self.camera is not None:
+                    message['camera'] = self.camera
+                if self.station is not None:
+                    message['station'] = self.station
+                events = json.dumps(message).encode()
+        else:
+            send_stop = bool(hand_gestures['open_palm'].any())  # If any hand shows STOP, send the STOP signal
+        classified_ns = time.monotonic_ns()
+
+        encode_start_ns = time.monotonic_ns()
+        data = None
+        if encode:
+            if self.encoding == "json":
+                data = self.encode_json(hand_array, send_stop, track_ids, track_ages)
+            else:
+                timings = {
+                    'wait': picked_ns - capture_ns,
+                    'convert': converted_ns - picked_ns,
+                    'inference': inferred_ns - converted_ns,
+                    'gesture': classified_ns - inferred_ns,
+                }
+                if self.delta_encoder is not None:
+                    data = self.delta_encoder.encode(hand_array, self.sequence, capture_ns, stop=send_stop,
+                                                     timings=timings, camera=self.camera, track_ids=track_ids,
+                                                     track_ages=track_ages, station=self.station,
+                                                     session=self.session)
+                else:
+                    data = protocol.encode_packet(hand_array, self.sequence, capture_ns, stop=send_stop,
+                                                  float16=self.encoding == "float16", timings=timings,
+                                                  camera=self.camera, track_ids=track_ids, track_ages=track_ages,
+                                                  station=self.station, session=self.session)
+        encoded_ns = time.monotonic_ns()
+
+        self.metrics.record_ns('wait', capture_ns, picked_ns)
+        self.metrics.record_ns('convert', picked_ns, converted_ns)
+        self.metrics.record_ns('inference', converted_ns, inferred_ns)
+        self.metrics.record_ns('gesture', inferred_ns, classified_ns)
+        if encode:
+            self.metrics.record_ns('encode', encode_start_ns, encoded_ns)
+
+        frame = {
+            'img': img,
+            'results': results,
+            'hands': hand_array,
+            'track_ids': track_ids,  # (n,) stable id of each hand in 'hands'
+            'track_ages': track_ages,  # (n,) frames each of those tracks has existed for
+            'gestures': hand_gestures,
+            'stop': send_stop,
+            'data': data,
+            'events': events,  # Encoded gesture event message, or None when nothing changed
+            'sequence': self.sequence,
+            'capture_ns': capture_ns,
+            'encoded_ns': encoded_ns,
+        }
+        self.sequence += 1
+        return frame
+
+    # Inference for roi mode: the crop around the previous hands when there are
+    # any, the full frame when there are none or the crop came back empty.
+    # Returns (results, converted_ns); the fallback counts towards inference time.
+    def process_roi(self, img):
+        height, width = img.shape[:2]
+        redetect = (self.previous_hands is not None and len(self.previous_hands) < self.max_num_hands
+                    and self.crops_since_full_frame >= ROI_REDETECT_EVERY)
+
+        if self.previous_hands is not None and not redetect:
+            box = roi_box(self.previous_hands, width, height)
+            x0, y0, x1, y1 = box
+            crop = cv2.cvtColor(img[y0:y1, x0:x1], cv2.COLOR_BGR2RGB)
+            converted_ns = time.monotonic_ns()
+
+            results = self.roi_hands.process(crop)
+            if results.multi_hand_landmarks:
+                self.roi_hits += 1
+                self.crops_since_full_frame += 1
+                crop_to_frame(results.multi_hand_landmarks, box, width, height)
+                return results, converted_ns
+            self.roi_misses += 1
+        else:
+            converted_ns = None
+
+        imgRGB = self.full_frame_rgb(img)
+        if converted_ns is None:
+            converted_ns = time.monotonic_ns()
+        self.full_frames += 1
+        self.crops_since_full_frame = 0
+        return self.hands.process(imgRGB), converted_ns
+
+    def roi_stats(self):
+        return {'hits': self.roi_hits, 'misses': self.roi_misses, 'full_frames': self.full_frames}
+
+    # Call after the frame's data has been sent to record send and capture-to-send latency
+    def record_sent(self, frame, sent_ns=None):
+        if sent_ns is None:
+            sent_ns = time.monotonic_ns()
+        self.metrics.record_ns('send', frame['encoded_ns'], sent_ns)
+        self.metrics.record_ns('capture_to_send', frame['capture_ns'], sent_ns)
+
+    # Legacy text format: one dict per landmark
+    def encode_json(self, hand_array, send_stop, track_ids=None, track_ages=None):
+        message = protocol.packet_to_message({'stop': send_stop, 'hands': hand_array, 'camera': self.camera,
+                                              'station': self.station,
+                                              'track_ids': track_ids, 'track_ages': track_ages})
+        return json.dumps(message).encode()
+
+    def close(self):
+        self.hands.close()
+        if self.roi_hands is not None:
+            self.roi_hands.close()
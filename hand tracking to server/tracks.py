@@ -0,0 +1,194 @@
+import numpy as np
+
+from gestures import WRIST
+
+# Stable hand ids across frames.
+#
+# MediaPipe lists the hands of a frame in no particular order, so the index
+# of a hand in multi_hand_landmarks can swap from one frame to the next when
+# two hands are visible. TrackAssociator matches the hands of each frame to
+# the tracks of the previous frames by wrist position and handedness and
+# gives every hand a persistent track id, so per-hand state (filters,
+# gesture debouncers, ROI crops) can be keyed by id:
+#
+#   tracks = TrackAssociator()
+#   track_ids = tracks.update(hands, handedness, capture_ns)
+#   hand_filter.update(hands, capture_ns, track_ids)
+#
+# The matching is an optimal assignment over the cost matrix (wrist distance
+# in normalized image units, plus a penalty when the handedness disagrees).
+# Pairs costing more than max_distance are not matched: the hand starts a new
+# track. A track that finds no hand survives max_missed frames, so a hand
+# that drops out for a frame or two keeps its id. With max_tracks (the
+# tracker uses max_num_hands + EXTRA_TRACKS) the tracks that have gone
+# longest without a hand are forgotten first, so jittery hands cannot pile up
+# tracks faster than they expire.
+
+MAX_DISTANCE = 0.2  # Wrist movement between two frames, relative to the frame size
+HANDEDNESS_PENALTY = 0.15  # Added to the cost when MediaPipe's left/right label changed
+MAX_MISSED = 5  # Frames a track survives without a hand
+EXTRA_TRACKS = 2  # Missed tracks kept beyond the hand count, see TrackAssociator(max_tracks=)
+
+
+class Track:
+    def __init__(self, track_id, hand, handedness, now_ns):
+        self.id = track_id
+        self.hand = hand  # Landmarks at the last match, (21, 3)
+        self.handedness = handedness
+        self.born_ns = now_ns
+        self.seen_ns = now_ns
+        self.age = 1  # Frames this track has been matched in (its lifetime counter)
+        self.missed = 0  # Frames in a row without a match
+
+    @property
+    def wrist(self):
+        return self.hand[WRIST, :2]
+
+    def summary(self, now_ns):
+        return {'id': self.id, 'handedness': self.handedness, 'age': self.age, 'missed': self.missed,
+                'lifetime_ms': (now_ns - self.born_ns) // 1_000_000}
+
+
+# Function to solve the assignment problem for a small cost matrix (rows x columns).
+# Returns the (row, column) pairs with the lowest total cost, leaving out pairs above max_cost.
+# Hungarian method (shortest augmenting paths), O(rows^2 * columns): the matrix is live
+# tracks x hands, and tracks outlive their hands for a few frames, so it can have a dozen rows.
+def assign(cost, max_cost=np.inf):
+    original = np.asarray(cost, dtype=np.float64)
+    if original.shape[0] == 0 or original.shape[1] == 0:
+        return []
+    transposed = original.shape[0] > original.shape[1]
+    cost = original.T if transposed else original  # The method needs rows <= columns
+
+    # Pairs above max_cost are never taken; capping them keeps them from steering the rest
+    capped = np.minimum(cost, max_cost + 1e-6).tolist()
+    rows, columns = cost.shape
+    u = [0.0] * (rows + 1)  # Row and column potentials, 1-based with 0 as the free slot
+    v = [0.0] * (columns + 1)
+    owner = [0] * (columns + 1)  # Row (1-based) assigned to each column, 0 for none
+    way = [0] * (columns + 1)
+    for row in range(1, rows + 1):
+        owner[0] = row
+        column = 0
+        min_slack = [np.inf] * (columns + 1)
+        used = [False] * (columns + 1)
+        while owner[column]:
+            used[column] = True
+            current_row = owner[column]
+            costs = capped[current_row - 1]
+            delta = np.inf
+            next_column = 0
+            for j in range(1, columns + 1):
+                if used[j]:
+                    continue
+                slack = costs[j - 1] - u[current_row] - v[j]
+                if slack < min_slack[j]:
+                    min_slack[j] = slack
+                    way[j] = column
+                if min_slack[j] < delta:
+                    delta = min_slack[j]
+                    next_column = j
+            for j in range(columns + 1):
+                if used[j]:
+                    u[owner[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_slack[j] -= delta
+            column = next_column
+        while column:  # Flip the augmenting path
+            previous = way[column]
+            owner[column] = owner[previous]
+            column = previous
+
+    pairs = [(owner[j] - 1, j - 1) for j in range(1, columns + 1) if owner[j]]
+    if transposed:
+        pairs = [(column, row) for row, column in pairs]
+    return sorted((row, column) for row, column in pairs if original[row, column] <= max_cost)
+
+
+class TrackAssociator:
+    def __init__(self, max_distance=MAX_DISTANCE, handedness_penalty=HANDEDNESS_PENALTY, max_missed=MAX_MISSED,
+                 max_tracks=None):
+        self.max_distance = max_distance
+        self.handedness_penalty = handedness_penalty
+        self.max_missed = max_missed
+        self.max_tracks = max_tracks  # None for no limit
+
+        self.tracks = []  # Live tracks, oldest first
+        self.next_id = 1  # 0 is never a track id
+        self.tracks_started = 0
+        self.tracks_ended = 0
+
+    # Match one frame's hands, (n_hands, 21, 3), to the tracks. handedness is an (n,)
+    # array of gestures.LEFT / RIGHT, or None when unknown. Returns the (n,) track ids in hand order.
+    def update(self, hands, handedness=None, now_ns=0):
+        hands = np.asarray(hands, dtype=np.float32).reshape(-1, 21, 3)
+        if handedness is None or len(handedness) != len(hands):
+            handedness = [None] * len(hands)
+
+        cost = np.zeros((len(self.tracks), len(hands)), dtype=np.float32)
+        for row, track in enumerate(self.tracks):
+            cost[row] = np.linalg.norm(hands[:, WRIST, :2] - track.wrist, axis=1)
+            for column, side in enumerate(handedness):
+                if side is not None and track.handedness is not None and side != track.handedness:
+                    cost[row, column] += self.handedness_penalty
+
+        track_ids = np.zeros(len(hands), dtype=np.uint32)
+        matched = set()
+        for row, column in assign(cost, self.max_distance):
+            track = self.tracks[row]
+            track.hand = hands[column].copy()
+            track.handedness = handedness[column] if handedness[column] is not None else track.handedness
+            track.seen_ns = now_ns
+            track.age += 1
+            track.missed = 0
+            track_ids[column] = track.id
+            matched.add(row)
+
+        live = []
+        for row, track in enumerate(self.tracks):
+            if row not in matched:
+                track.missed += 1
+                if track.missed > self.max_missed:
+                    self.tracks_ended += 1
+                    continue
+            live.append(track)
+
+        for column in np.flatnonzero(track_ids == 0):
+            side = int(handedness[column]) if handedness[column] is not None else None
+            track = Track(self.next_id, hands[column].copy(), side, now_ns)
+            self.next_id += 1
+            self.tracks_started += 1
+            live.append(track)
+            track_ids[column] = track.id
+
+        if self.max_tracks is not None and len(live) > self.max_tracks:
+            # Only missed tracks are dropped, the ones matched in this frame keep their ids
+            stale = sorted((track for track in live if track.missed), key=lambda track: -track.missed)
+            dropped = {track.id for track in stale[:len(live) - self.max_tracks]}
+            live = [track for track in live if track.id not in dropped]
+            self.tracks_ended += len(dropped)
+
+        self.tracks = live
+        return track_ids
+
+    # Lifetime counter (frames matched so far) for each of the given track ids
+    def ages(self, track_ids):
+        by_id = {track.id: track for track in self.tracks}
+        return np.array([by_id[i].age if i in by_id else 0 for i in track_ids], dtype=np.uint32)
+
+    # Last landmarks of every live track, including those missed for a few frames, (n, 21, 3)
+    def last_hands(self):
+        if not self.tracks:
+            return np.zeros((0, 21, 3), dtype=np.float32)
+        return np.stack([track.hand for track in self.tracks])
+
+    def summary(self, now_ns):
+        return [track.summary(now_ns) for track in self.tracks]
+
+    def stats(self):
+        return {'live': len(self.tracks), 'started': self.tracks_started, 'ended': self.tracks_ended}
+
+    def reset(self):
+        self.tracks_ended += len(self.tracks)
+        self.tracks = []
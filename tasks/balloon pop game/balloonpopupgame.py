@@ -1,9 +1,14 @@
 import cv2
 import random
 import mediapipe as mp
-import numpy as np
 import time
 import os
+import sys
+
+# Shared gesture code lives next to the hand tracker
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "hand tracking to server"))
+import gestures
+import idle
 
 # Set up MediaPipe Hands
 mp_hands = mp.solutions.hands
@@ -19,6 +24,9 @@ start_time = time.time()
 # Initialize webcam
 cap = cv2.VideoCapture(0)
 
+# Drops to low-rate inference after a few seconds without a hand
+idle_policy = idle.IdlePolicy()
+
 # Screen resolution for game window
 screen_res = (1280, 720)
 
@@ -38,15 +46,8 @@ if bg_image is None or balloon_img is None:
 bg_image = cv2.resize(bg_image, screen_res)  # Resize to screen resolution
 balloon_img = cv2.resize(balloon_img, (175, 175))  # Resize balloon image
 
-# Function to detect pinch gesture
-def is_pinch(landmarks):
-    index_finger = landmarks[mp_hands.HandLandmark.INDEX_FINGER_TIP]
-    thumb = landmarks[mp_hands.HandLandmark.THUMB_TIP]
-
-    # Calculate Euclidean distance
-    distance = np.sqrt((index_finger.x - thumb.x) ** 2 + (index_finger.y - thumb.y) ** 2)
-
-    return distance < 0.08  # Adjust threshold if needed
+# Thumb-to-index distance that counts as a pinch (adjust threshold if needed)
+PINCH_THRESHOLD = 0.08
 
 # Balloons list
 balloons = [{'x': random.randint(balloon_radius, screen_res[0] - balloon_radius), 
@@ -76,8 +77,14 @@ while True:
 
     # Flip frame horizontally for natural hand movement
     frame = cv2.flip(frame, 1)
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb_frame)
+
+    # Skip the model on most frames while nobody is in front of the camera
+    if idle_policy.should_infer(frame):
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = hands.process(rgb_frame)
+    else:
+        results = idle.NO_HANDS
+    idle_policy.update(len(results.multi_hand_landmarks or []))
 
     # Use the background image
     game_frame = bg_image.copy()
@@ -97,13 +104,16 @@ while True:
 
     # Hand tracking
     if results.multi_hand_landmarks:
-        for hand_landmarks in results.multi_hand_landmarks:
+        # Pinch state for every hand in one pass
+        hand_array, hand_gestures = gestures.from_results(results, PINCH_THRESHOLD)
+
+        for i, hand_landmarks in enumerate(results.multi_hand_landmarks):
             mp_drawing.draw_landmarks(game_frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
 
-            index_x = int(hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP].x * screen_res[0])
-            index_y = int(hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP].y * screen_res[1])
+            index_x = int(hand_array[i, gestures.INDEX_FINGER_TIP, 0] * screen_res[0])
+            index_y = int(hand_array[i, gestures.INDEX_FINGER_TIP, 1] * screen_res[1])
 
-            if is_pinch(hand_landmarks.landmark):
+            if hand_gestures['pinch'][i]:
                 for balloon in balloons:
                     balloon_position = (balloon['x'], balloon['y'])
                     if abs(balloon_position[0] - index_x) < balloon_radius and abs(balloon_position[1] - index_y) < balloon_radius:
@@ -1,30 +1,17 @@
 import cv2
 import mediapipe as mp
+import os
+import sys
+
+# Shared gesture code lives next to the hand tracker
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "hand tracking to server"))
+import gestures
 
 # Initialize Mediapipe Hand Detection
 mp_hands = mp.solutions.hands
 mp_drawing = mp.solutions.drawing_utils
 hands = mp_hands.Hands(min_detection_confidence=0.5, min_tracking_confidence=0.5)
 
-# Function to count fingers
-def count_fingers(landmarks):
-    fingers = []
-    # Thumb
-    if landmarks[4].x < landmarks[3].x:
-        fingers.append(1)
-    else:
-        fingers.append(0)
-
-    # Other four fingers
-    tip_ids = [8, 12, 16, 20]
-    for tip in tip_ids:
-        if landmarks[tip].y < landmarks[tip - 2].y:
-            fingers.append(1)
-        else:
-            fingers.append(0)
-    
-    return sum(fingers)
-
 # Start Webcam
 cap = cv2.VideoCapture(0)
 
@@ -38,22 +25,21 @@ while cap.isOpened():
     result = hands.process(rgb_frame)
 
     if result.multi_hand_landmarks:
-        for hand_landmarks in result.multi_hand_landmarks:
+        # Finger count and left/right for every hand in one pass
+        hand_array, hand_gestures = gestures.from_results(result)
+
+        for i, hand_landmarks in enumerate(result.multi_hand_landmarks):
             # Draw landmarks
             mp_drawing.draw_landmarks(frame, hand_landmarks, mp_hands.HAND_CONNECTIONS)
             
-            # Get Landmark Positions
-            landmarks = hand_landmarks.landmark
-            finger_count = count_fingers(landmarks)
+            finger_count = int(hand_gestures['finger_count'][i])
 
             # Stop sign detection (Open palm)
             if finger_count == 5:
                 cv2.putText(frame, "STOP", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
 
             # Left/Right Detection
-            thumb_tip_x = landmarks[4].x
-            index_tip_x = landmarks[8].x
-            if thumb_tip_x < index_tip_x:
+            if hand_gestures['pointing'][i] == gestures.RIGHT:
                 cv2.putText(frame, "RIGHT", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
             else:
                 cv2.putText(frame, "LEFT", (50, 150), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 0, 0), 2)
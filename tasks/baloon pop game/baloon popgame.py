@@ -3,6 +3,13 @@ import random
 import mediapipe as mp
 import numpy as np
 import time
+import os
+import sys
+
+# Shared gesture code lives next to the hand tracker
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "hand tracking to server"))
+import gestures
+import idle
 
 # Set up MediaPipe Hands
 mp_hands = mp.solutions.hands
@@ -18,16 +25,14 @@ start_time = time.time()  # Record the start time
 # Initialize the webcam
 cap = cv2.VideoCapture(0)
 
+# Drops to low-rate inference after a few seconds without a hand
+idle_policy = idle.IdlePolicy()
+
 # Get the screen resolution (optional to set your screen size)
 screen_res = (640, 480)  # Use default webcam resolution (you can change this)
 
-# Function to detect pinch gesture
-def is_pinch(landmarks):
-    # Checking distance between index tip (8) and thumb tip (4)
-    index_finger = landmarks[8]
-    thumb = landmarks[4]
-    distance = ((index_finger.x - thumb.x) ** 2 + (index_finger.y - thumb.y) ** 2) ** 0.5
-    return distance < 0.05  # Threshold for pinch gesture detection
+# Distance between index tip (8) and thumb tip (4) that counts as a pinch
+PINCH_THRESHOLD = 0.05
 
 # Function to draw a more realistic balloon
 def draw_balloon(x, y, color):
@@ -59,9 +64,14 @@ while True:
     # Flip the frame horizontally
     frame = cv2.flip(frame, 1)
 
-    # Convert the frame to RGB for MediaPipe
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = hands.process(rgb_frame)
+    # Skip the model on most frames while nobody is in front of the camera
+    if idle_policy.should_infer(frame):
+        # Convert the frame to RGB for MediaPipe
+        rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        results = hands.process(rgb_frame)
+    else:
+        results = idle.NO_HANDS
+    idle_policy.update(len(results.multi_hand_landmarks or []))
 
     # Move balloons up with varying speeds
     for balloon in balloons:
@@ -79,14 +89,18 @@ while True:
 
     # Check if a pinch gesture is detected and pop balloons
     if results.multi_hand_landmarks:
-        for landmarks in results.multi_hand_landmarks:
+        # Pinch state for every hand in one pass
+        hand_array, hand_gestures = gestures.from_results(results, PINCH_THRESHOLD)
+
+        for i, landmarks in enumerate(results.multi_hand_landmarks):
             mp_drawing.draw_landmarks(frame, landmarks, mp_hands.HAND_CONNECTIONS)
 
-            if is_pinch(landmarks.landmark):
+            if hand_gestures['pinch'][i]:
+                index_x, index_y = hand_array[i, gestures.INDEX_FINGER_TIP, :2]
                 for balloon in balloons:
                     # Pop the balloon if it's within a certain area around the fingers
-                    if abs(balloon['x'] - landmarks.landmark[8].x * screen_res[0]) < balloon_radius and \
-                       abs(balloon['y'] - landmarks.landmark[8].y * screen_res[1]) < balloon_radius:
+                    if abs(balloon['x'] - index_x * screen_res[0]) < balloon_radius and \
+                       abs(balloon['y'] - index_y * screen_res[1]) < balloon_radius:
                         score += 1
                         balloons.remove(balloon)
                         balloons.append({'x': random.randint(balloon_radius, screen_res[0] - balloon_radius),
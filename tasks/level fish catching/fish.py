@@ -5,6 +5,15 @@ import cv2
 import mediapipe as mp
 from datetime import datetime
 import json
+import os
+import time
+
+# Shared gesture code lives next to the hand tracker
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "hand tracking to server"))
+import gestures
+import smoothing
+import idle
+from capture import LatestFrameCapture
 
 # Screen dimensions
 SCREEN_WIDTH = 1280
@@ -33,8 +42,17 @@ hands = mp_hands.Hands(
 )
 mp_drawing = mp.solutions.drawing_utils
 
-# Initialize webcam
-cap = cv2.VideoCapture(0)
+# Initialize webcam (read on its own thread, so the game never waits for the camera)
+cap = LatestFrameCapture(0).start()
+
+# hands.process runs at most this often; the frames rendered in between use the
+# filtered hand position extrapolated to the render time
+INFERENCE_FPS = 20
+INFERENCE_INTERVAL_NS = 1_000_000_000 // INFERENCE_FPS
+hand_filter = smoothing.LandmarkFilter()
+
+# Drops to low-rate inference after a few seconds without a hand
+idle_policy = idle.IdlePolicy()
 
 # Fish class
 class Fish:
@@ -93,21 +111,16 @@ class Hand:
         self.is_closed_fist = False
         
         # Track if hand is moving upward
-        self.previous_y = None
         self.is_moving_up = False
-        self.movement_threshold = 0.02  # Minimum vertical movement to consider
+        self.movement_threshold = 0.6  # Minimum upward speed in screen heights per second
 
-    def update(self, pos, is_closed_fist, current_y):
+    def update(self, pos, is_closed_fist, vertical_speed):
         # Update the hand's position based on the input coordinates
         self.rect.center = pos
         self.is_closed_fist = is_closed_fist
         
-        # Determine if hand is moving upward
-        if self.previous_y is not None:
-            y_change = current_y - self.previous_y
-            self.is_moving_up = y_change < -self.movement_threshold
-        
-        self.previous_y = current_y
+        # Determine if hand is moving upward (filtered speed, so one jittery frame does not count)
+        self.is_moving_up = vertical_speed < -self.movement_threshold
 
 
 # Function to load motor progress (Level & Tasks)
@@ -165,32 +178,6 @@ def save_motor_data(score):
 
 
 
-# Function to detect if hand is in a closed fist position
-def is_closed_fist(hand_landmarks):
-    # Get fingertip y-coordinates (except thumb)
-    index_tip = hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_TIP].y
-    middle_tip = hand_landmarks.landmark[mp_hands.HandLandmark.MIDDLE_FINGER_TIP].y
-    ring_tip = hand_landmarks.landmark[mp_hands.HandLandmark.RING_FINGER_TIP].y
-    pinky_tip = hand_landmarks.landmark[mp_hands.HandLandmark.PINKY_TIP].y
-    
-    # Get finger base and pip (middle joint) y-coordinates for comparison
-    index_pip = hand_landmarks.landmark[mp_hands.HandLandmark.INDEX_FINGER_PIP].y
-    middle_pip = hand_landmarks.landmark[mp_hands.HandLandmark.MIDDLE_FINGER_PIP].y
-    ring_pip = hand_landmarks.landmark[mp_hands.HandLandmark.RING_FINGER_PIP].y
-    pinky_pip = hand_landmarks.landmark[mp_hands.HandLandmark.PINKY_PIP].y
-    
-    # Determine if fingertips are below their respective pip joints (folded fingers)
-    index_folded = index_tip > index_pip
-    middle_folded = middle_tip > middle_pip
-    ring_folded = ring_tip > ring_pip
-    pinky_folded = pinky_tip > pinky_pip
-    
-    # If all fingers are folded, it's a closed fist
-    return index_folded and middle_folded and ring_folded and pinky_folded
-
-
-
-
 # Function to restart the game
 def restart_game():
     global fishes, score, start_time, current_level
@@ -276,6 +263,9 @@ game_state = "playing"  # Possible states: "playing", "game_over"
 # Main loop
 clock = pygame.time.Clock()
 running = True
+frame = None
+hand_closed = False
+last_inference_ns = 0
 while running:
     # Handle events
     for event in pygame.event.get():
@@ -283,44 +273,56 @@ while running:
             running = False
     
     # Normal game logic when playing
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    # Flip the frame horizontally for a mirror effect
-    frame = cv2.flip(frame, 1)
-
-    # Convert the frame from BGR (OpenCV default) to RGB (MediaPipe requires RGB)
-    rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-    # Process the frame with MediaPipe Hands to detect hand landmarks
-    results = hands.process(rgb_frame)
-
-    # Draw hand landmarks on the frame (for visual feedback)
-    hand_closed = False
+    # Run hand tracking on a new camera frame once the inference interval has passed
+    if time.monotonic_ns() - last_inference_ns >= INFERENCE_INTERVAL_NS:
+        ret, new_frame, capture_ns = cap.read(timeout=0)
+        if not ret and not cap.running:
+            break  # Camera closed
+
+        # Skip the model on most frames while nobody is in front of the camera
+        if ret and not idle_policy.should_infer(new_frame):
+            ret = False
+            frame = cv2.flip(new_frame, 1)
+            hand_filter.reset()
+            hand_closed = False
+
+        if ret:
+            last_inference_ns = time.monotonic_ns()
+
+            # Flip the frame horizontally for a mirror effect
+            frame = cv2.flip(new_frame, 1)
+
+            # Convert the frame from BGR (OpenCV default) to RGB (MediaPipe requires RGB)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+            # Process the frame with MediaPipe Hands to detect hand landmarks
+            results = hands.process(rgb_frame)
+
+            # Fist state for every hand in one pass; landmarks go through the filter
+            hand_array, hand_gestures = gestures.from_results(results)
+            hand_filter.update(hand_array, capture_ns)
+            idle_policy.update(len(hand_array))
+            hand_closed = bool(hand_gestures['closed_fist'][-1]) if len(hand_array) else False
+
+            # Draw hand landmarks on the frame (for visual feedback)
+            for hand_landmarks in results.multi_hand_landmarks or []:
+                mp_drawing.draw_landmarks(
+                    frame,
+                    hand_landmarks,
+                    mp_hands.HAND_CONNECTIONS
+                )
+
+    # Wrist position predicted for this render frame
     hand_position = (SCREEN_WIDTH // 2, SCREEN_HEIGHT // 2)  # Default position
-    hand_y = 0
-    
-    if results.multi_hand_landmarks:
-        for hand_landmarks in results.multi_hand_landmarks:
-            # Draw hand landmarks on the frame
-            mp_drawing.draw_landmarks(
-                frame,
-                hand_landmarks,
-                mp_hands.HAND_CONNECTIONS
-            )
-            
-            # Check if hand is in a closed fist position
-            hand_closed = is_closed_fist(hand_landmarks)
-            
-            # Get wrist position
-            wrist = hand_landmarks.landmark[mp_hands.HandLandmark.WRIST]
-            hand_x = int(wrist.x * SCREEN_WIDTH)
-            hand_y = int(wrist.y * SCREEN_HEIGHT)
-            hand_position = (hand_x, hand_y)
+    vertical_speed = 0.0
+    predicted = hand_filter.predict(time.monotonic_ns())
+    if len(predicted):
+        wrist_x, wrist_y = predicted[-1, gestures.WRIST, :2]
+        hand_position = (int(wrist_x * SCREEN_WIDTH), int(wrist_y * SCREEN_HEIGHT))
+        vertical_speed = float(hand_filter.velocities()[-1, gestures.WRIST, 1])
     
     # Update hand position and closed status
-    hand.update(hand_position, hand_closed, hand_y / SCREEN_HEIGHT)
+    hand.update(hand_position, hand_closed, vertical_speed)
     
     # Check for fish catching
     # Only catch fish if the hand is in a closed fist position AND moving upwards
@@ -389,7 +391,8 @@ while running:
     clock.tick(60)  # Limit the frame rate to 60 FPS
 
     # Display the webcam feed in a separate window (with hand landmarks)
-    cv2.imshow("Fish Catcher Game", frame)
+    if frame is not None:
+        cv2.imshow("Fish Catcher Game", frame)
     if cv2.waitKey(1) & 0xFF == ord('q'):  # Press 'q' to quit (keeping this as an emergency exit)
         break
 